@@ -0,0 +1,57 @@
+import sys
+import time
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import fsm_compiler.parser as parser
+
+STATEMENT_COUNTS = [100, 400, 1600]
+
+def generate_fsm_function(statement_count:int) -> str:
+    """FSM function whose body is mostly ordinary C/C++ statements"""
+    lines = []
+    for i in range(statement_count // 8):
+        lines.append("a{0} = b{0} + c * -d[{0}] / (e - f) + table[i] % 7;".format(i))
+        lines.append("print(\"step %d; {{value}}\", a{0}, foo(b, c), bar(x.y, z::w));".format(i))
+        lines.append("int v{0} = foo(a{0}, b, c) * 3 + (d << 2) - ~e;".format(i))
+        lines.append("for (int i = 0; i < n; i++) {{ if (s[i] == ';') {{ count += i; }} else {{ count--; }} }}".format(i))
+        lines.append("x.y.z = origin == point || !flag && mask & 0xff;".format(i))
+        lines.append("IF (a{0} == 1 && b || c != d << 2) {{ result = compute(a{0}, b); }} ELSE {{ x++; }}".format(i))
+        lines.append("c = a{0} > 0 ? compute(a{0}, b) : -1;".format(i))
+        lines.append("GLOBAL int g{0} = a{0} * 3;".format(i))
+    return "FSM long_function() {\n    " + "\n    ".join(lines) + "\n}\n"
+
+def measure(input_str:str, grammar:str, algorithm:str, repetitions:int) -> float:
+    """average seconds per parse"""
+    parser.parse_to_AST(input_str, grammar=grammar, parser=algorithm) # warm up, construct parser
+
+    time_start = time.perf_counter()
+    for _ in range(repetitions):
+        parser.parse_to_AST(input_str, grammar=grammar, parser=algorithm)
+    return (time.perf_counter() - time_start) / repetitions
+
+def main():
+    print("{:>10} {:>10} {:>14} {:>14} {:>14} {:>9}".format(
+        "statements", "bytes", "earley [ms]", "lalr [ms]", "coarse [ms]", "speedup"
+    ))
+    for statement_count in STATEMENT_COUNTS:
+        input_str = generate_fsm_function(statement_count)
+        repetitions = max(1, 800 // statement_count)
+
+        assert parser.parse_to_AST(input_str, parser="lalr") == parser.parse_to_AST(input_str, grammar="coarse", parser="lalr")
+
+        time_earley = measure(input_str, "basic", "earley", repetitions)
+        time_lalr = measure(input_str, "basic", "lalr", repetitions)
+        time_coarse = measure(input_str, "coarse", "lalr", repetitions)
+
+        # speedup of the coarse grammar over the fastest full grammar
+        print("{:>10} {:>10} {:>14.2f} {:>14.2f} {:>14.2f} {:>8.1f}x".format(
+            statement_count, len(input_str),
+            time_earley * 1000, time_lalr * 1000, time_coarse * 1000, time_lalr / time_coarse
+        ))
+
+if __name__ == "__main__":
+    main()
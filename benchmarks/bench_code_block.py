@@ -0,0 +1,70 @@
+import sys
+import gc
+import time
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+from fsm_compiler.ast_types import CodeBlock
+
+CHAIN_LENGTHS = [1000, 4000, 16000]
+REPETITIONS = 3
+
+# A chain of nodes is collapsed one node at a time, `node_curr.code_block += node_next.code_block`.
+# Front to back, the first node absorbs the next node of one line. Back to front, each node absorbs
+# the next node, which has already absorbed the rest of the chain.
+
+def collapse_lists(blocks:list[list[str]], back_to_front:bool) -> list[str]:
+    """the code blocks as lists, like before `CodeBlock`, the concatenation copies the lines"""
+    if back_to_front:
+        code_block = []
+        for block in reversed(blocks):
+            code_block = list(block) + code_block
+    else:
+        code_block = list(blocks[0])
+        for block in blocks[1:]:
+            code_block += block
+    return code_block
+
+def collapse_code_blocks(blocks:list[CodeBlock], back_to_front:bool) -> tuple[str, ...]:
+    """the code blocks as `CodeBlock`s, the lines are flattened at the end, like the emission"""
+    if back_to_front:
+        code_block = CodeBlock()
+        for block in reversed(blocks):
+            code_block = block + code_block
+    else:
+        code_block = blocks[0]
+        for block in blocks[1:]:
+            code_block += block
+    return code_block.lines
+
+def measure_time(function) -> float:
+    best = float("inf")
+    for _ in range(REPETITIONS):
+        gc.disable()
+        try:
+            time_start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - time_start)
+        finally:
+            gc.enable()
+    return best
+
+def main():
+    print("{:>8} {:>14} | {:>10} {:>14} {:>8}".format("nodes", "order", "list [ms]", "CodeBlock [ms]", "speedup"))
+    for chain_length in CHAIN_LENGTHS:
+        lines = [["x{}++;".format(i)] for i in range(chain_length)]
+        code_blocks = [CodeBlock(line) for line in lines]
+        for back_to_front in [False, True]:
+            assert tuple(collapse_lists(lines, back_to_front)) == collapse_code_blocks(code_blocks, back_to_front)
+            seconds_list = measure_time(lambda: collapse_lists(lines, back_to_front))
+            seconds_code_block = measure_time(lambda: collapse_code_blocks(code_blocks, back_to_front))
+            print("{:>8} {:>14} | {:>10.1f} {:>14.1f} {:>7.1f}x".format(
+                chain_length, "back to front" if back_to_front else "front to back",
+                seconds_list * 1000, seconds_code_block * 1000, seconds_list / seconds_code_block
+            ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import sys
+import gc
+import time
+import pathlib
+import dataclasses
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import fsm_compiler.parser as parser
+import fsm_compiler.assembler as assembler
+import fsm_compiler.code_gen as code_gen
+from fsm_compiler.graph import FSMGraph
+from fsm_compiler.ast_types import FSMMachine, FSMNode
+import generators
+
+NODE_COUNT = 100000
+SMALL_NODE_COUNT = 200 # the search of the FSMNode optimization revisits the nodes after the branches, and restarts after every collapse
+STATEMENT_COUNT = 2000
+REPETITIONS = 3
+
+def generate_raw_fsm(parse_result, node_count:int) -> FSMMachine:
+    """raw FSM with about `node_count` nodes, the statements of the parse result are repeated or truncated"""
+    lines = parse_result.statements.lines
+    node_count_once = len(collect_nodes(parse_result.to_fsm().starting_node))
+    if node_count < node_count_once:
+        lines = lines[:len(lines) * node_count // node_count_once]
+    else:
+        lines = lines * -(-node_count // node_count_once)
+    parse_result = dataclasses.replace(parse_result, statements=dataclasses.replace(parse_result.statements, lines=lines))
+    fsm_return = parse_result.to_fsm()
+    return FSMMachine(fsm_return.global_variables, [], fsm_return.starting_node, parse_result.function_name)
+
+def collect_nodes(starting_node:FSMNode) -> list[FSMNode]:
+    """every node reachable from the starting node, by chasing the pointers of the FSMNodes"""
+    nodes = [starting_node]
+    visited = {starting_node}
+    for node in nodes:
+        for transition in node.transitions:
+            if transition.target_node not in visited:
+                visited.add(transition.target_node)
+                nodes.append(transition.target_node)
+    return nodes
+
+def in_degrees_of_nodes(fsm:FSMMachine) -> dict[FSMNode, int]:
+    """the count of the transitions to each node, on the FSMNodes"""
+    degrees = {}
+    for node in collect_nodes(fsm.starting_node):
+        for transition in node.transitions:
+            degrees[transition.target_node] = degrees.get(transition.target_node, 0) + 1
+    return degrees
+
+def measure_time(function, setup=lambda: None) -> float:
+    """best seconds of the function, `setup()` returns its argument, which is not timed"""
+    best = float("inf")
+    for _ in range(REPETITIONS):
+        argument = setup()
+        gc.disable()
+        try:
+            time_start = time.perf_counter()
+            function(argument)
+            best = min(best, time.perf_counter() - time_start)
+        finally:
+            gc.enable()
+    return best
+
+def main():
+    parse_result = parser.parse_to_AST(generators.generate_flat_body(STATEMENT_COUNT), "basic", "lalr", lean=True)
+    fsm = generate_raw_fsm(parse_result, NODE_COUNT)
+    graph = FSMGraph.from_fsm(fsm)
+    small_fsm = generate_raw_fsm(parse_result, SMALL_NODE_COUNT)
+    small_graph = FSMGraph.from_fsm(small_fsm)
+    optimized_fsm = graph.collapse_consecutive_states().to_fsm()
+    optimized_graph = FSMGraph.from_fsm(optimized_fsm)
+
+    rows = [
+        ("reachable nodes", graph.node_count,
+            measure_time(lambda _: collect_nodes(fsm.starting_node)), measure_time(lambda _: graph.reachable())),
+        ("in-degrees", graph.node_count,
+            measure_time(lambda _: in_degrees_of_nodes(fsm)), measure_time(lambda _: graph.in_degrees())),
+        ("predecessors", graph.node_count, None, measure_time(lambda _: graph.predecessors())),
+        ("L1 consecutive states", small_graph.node_count,
+            measure_time(assembler.optimize_FSM_consecutive_states, lambda: small_graph.to_fsm().starting_node),
+            measure_time(lambda _: small_graph.collapse_consecutive_states())),
+        ("L1 consecutive states", graph.node_count,
+            None, measure_time(lambda _: graph.collapse_consecutive_states())),
+        ("C++ code gen", optimized_graph.node_count,
+            measure_time(lambda _: code_gen.generate_code_from_FSM(optimized_fsm)),
+            measure_time(lambda _: code_gen.generate_code_from_graph(optimized_graph))),
+        ("FSMGraph.from_fsm", graph.node_count, None, measure_time(lambda _: FSMGraph.from_fsm(fsm))),
+        ("FSMGraph.to_fsm", graph.node_count, None, measure_time(lambda _: graph.to_fsm())),
+    ]
+
+    print("{:>22} {:>8} {:>14} {:>14} {:>8}".format("", "nodes", "FSMNode [ms]", "FSMGraph [ms]", "speedup"))
+    for name, node_count, seconds_nodes, seconds_graph in rows:
+        if seconds_nodes is None:
+            print("{:>22} {:>8} {:>14} {:>14.1f} {:>8}".format(name, node_count, "-", seconds_graph * 1000, "-"))
+        else:
+            print("{:>22} {:>8} {:>14.1f} {:>14.1f} {:>7.1f}x".format(
+                name, node_count, seconds_nodes * 1000, seconds_graph * 1000, seconds_nodes / seconds_graph
+            ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import sys
+import os
+import time
+import pathlib
+import tempfile
+import statistics
+import subprocess
+
+import logging
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = pathlib.Path(__file__).parent.parent.absolute()
+
+REPETITIONS = 10
+
+CODE_IMPORT_LARK = "import lark"
+CODE_IMPORT = "import fsm_compiler"
+CODE_FIRST_PARSE = "import fsm_compiler; fsm_compiler.parse_to_AST('FSM f() { a; }')"
+
+def measure(code:str, env:dict[str, str]) -> float:
+    """time a fresh interpreter running the code, in seconds"""
+    time_start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env, check=True)
+    return time.perf_counter() - time_start
+
+def main():
+    baseline_env = dict(os.environ)
+    baseline_env.pop("FSM_COMPILER_CACHE_DIR", None)
+    baseline_env.pop("FSM_COMPILER_DISABLE_CACHE", None)
+    disabled_env = dict(baseline_env, FSM_COMPILER_DISABLE_CACHE="1")
+    
+    # interpreter startup and the `import lark` are paid in every case
+    lark_times = [measure(CODE_IMPORT_LARK, baseline_env) for _ in range(REPETITIONS)]
+    import_times = [measure(CODE_IMPORT, disabled_env) for _ in range(REPETITIONS)]
+
+    cold_times = []
+    warm_times = []
+    disabled_times = []
+    
+    for _ in range(REPETITIONS):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            env = dict(baseline_env, FSM_COMPILER_CACHE_DIR=cache_dir)
+            cold_times.append(measure(CODE_FIRST_PARSE, env))
+            warm_times.append(measure(CODE_FIRST_PARSE, env))
+            
+        disabled_times.append(measure(CODE_FIRST_PARSE, disabled_env))
+
+    print("import lark (baseline)    : {:8.1f} ms".format(statistics.median(lark_times) * 1000))
+    print("import fsm_compiler       : {:8.1f} ms".format(statistics.median(import_times) * 1000))
+    print("import and first parse")
+    print("    cache disabled        : {:8.1f} ms".format(statistics.median(disabled_times) * 1000))
+    print("    cold cache            : {:8.1f} ms".format(statistics.median(cold_times) * 1000))
+    print("    warm cache            : {:8.1f} ms".format(statistics.median(warm_times) * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import sys
+import time
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import fsm_compiler.scanner as scanner
+
+FUNCTION_COUNTS = [10, 40, 160]
+
+def generate_fsm_function(index:int) -> str:
+    return """
+FSM machine_{0}() {{
+    int count = 0;
+    WHILE (count < {0}) {{
+        IF (ready_{0}() && count % 2 == 0) {{ print("step %d", count); YIELD; }} ELSE {{ WAIT(10); }}
+        count++;
+    }}
+    GLOBAL int done_{0} = 1;
+}}
+""".format(index)
+
+def generate_translation_unit(function_count:int, edited:int|None=None) -> str:
+    functions = [generate_fsm_function(i) for i in range(function_count)]
+    if edited is not None:
+        functions[edited] = functions[edited].replace("WAIT(10);", "WAIT(20);")
+    return "#include \"fsm.h\"\n" + "".join(functions)
+
+def main():
+    print("{:>10} | {:>12} {:>16} {:>9}".format("functions", "full [ms]", "incremental [ms]", "speedup"))
+    for function_count in FUNCTION_COUNTS:
+        source = generate_translation_unit(function_count)
+        edited_source = generate_translation_unit(function_count, edited=function_count // 2)
+
+        compiler = scanner.IncrementalCompiler(parser="lalr")
+        compiler.compile_source(source)
+
+        time_start = time.perf_counter()
+        list(scanner.compile_fsm_functions(scanner.find_fsm_functions(edited_source), parser="lalr"))
+        time_full = time.perf_counter() - time_start
+
+        time_start = time.perf_counter()
+        report = compiler.compile_source(edited_source)
+        time_incremental = time.perf_counter() - time_start
+        assert len(report.rebuilt) == 1 and len(report.reused) == function_count - 1
+
+        print("{:>10} | {:>12.1f} {:>16.1f} {:>8.1f}x".format(
+            function_count, time_full * 1000, time_incremental * 1000, time_full / time_incremental
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import sys
+import gc
+import pathlib
+import tracemalloc
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import fsm_compiler.parser as parser
+import fsm_compiler.assembler as assembler
+import fsm_compiler.ast_types as ast_types
+
+FUNCTION_COUNTS = [10, 50, 200]
+STATEMENT_COUNT = 40
+
+def generate_fsm_function(index:int, statement_count:int) -> str:
+    """FSM function whose conditions, logging calls and WAITs repeat, like the FSMs of a real project"""
+    templates = [
+        "IF (state == {0}) {{ log_info(\"state changed\", state); }}",
+        "WHILE (ready() == 0) {{ YIELD; }}",
+        "WAIT(100);",
+        "WAIT_UNLESS(button_pressed(BUTTON_{0}));",
+        "IF (error_code != 0) {{ log_error(\"error\", error_code); RETURN; }} ELSE {{ counter++; }}",
+        "DO {{ send_byte(buffer[counter++]); }} WHILE (counter < length);",
+    ]
+    lines = [templates[i % len(templates)].format(i % 4) for i in range(statement_count)]
+    return "FSM function_{}() {{\n    ".format(index) + "\n    ".join(lines) + "\n}\n"
+
+def iter_texts(fsm:ast_types.FSMMachine):
+    for node in assembler.traverse_FSM(fsm.starting_node):
+        yield from node.code_block
+        yield node.entry_condition
+        for transition in node.transitions:
+            yield from transition.code_block
+            yield transition.condition
+
+def measure(parse_results:list[ast_types.ParseResult]) -> tuple[int, int, int]:
+    """memory allocated by keeping the FSMs alive, and by their distinct str objects in bytes, and the count of the text
+    
+    The FSMs are not optimized, the text is interned when the statements are lowered, and the optimizations 
+    only move the text between the nodes.
+    """
+    gc.collect()
+    tracemalloc.start()
+    fsms = [assembler.convert_to_raw_state_machine(parse_result) for parse_result in parse_results]
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    texts = [text for fsm in fsms for text in iter_texts(fsm)]
+    text_size = sum(sys.getsizeof(text) for text in {id(text): text for text in texts}.values())
+    return current, text_size, len(texts)
+
+def main():
+    print("{:>10} {:>8} | {:>12} {:>12} {:>8} | {:>12} {:>12} {:>8}".format(
+        "functions", "texts", "str plain", "str intern", "saved", "FSMs plain", "FSMs intern", "saved"
+    ))
+    for function_count in FUNCTION_COUNTS:
+        sources = [generate_fsm_function(i, STATEMENT_COUNT) for i in range(function_count)]
+        parse_results = [parser.parse_to_AST(source, parser="lalr", lean=True) for source in sources]
+
+        # lower without interning, each text is converted to a new str
+        intern_text, ast_types.intern_text = ast_types.intern_text, str
+        try:
+            current_plain, text_size_plain, text_count = measure(parse_results)
+        finally:
+            ast_types.intern_text = intern_text
+        current_intern, text_size_intern, _ = measure(parse_results)
+
+        print("{:>10} {:>8} | {:>9.2f} MB {:>9.2f} MB {:>7.1f}% | {:>9.2f} MB {:>9.2f} MB {:>7.1f}%".format(
+            function_count, text_count,
+            text_size_plain / 2**20, text_size_intern / 2**20, (1 - text_size_intern / text_size_plain) * 100,
+            current_plain / 2**20, current_intern / 2**20, (1 - current_intern / current_plain) * 100,
+        ))
+
+if __name__ == "__main__":
+    main()
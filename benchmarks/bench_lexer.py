@@ -0,0 +1,72 @@
+import sys
+import time
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import lark
+
+import fsm_compiler.parser as parser
+
+STATEMENT_COUNTS = [40, 160, 640]
+
+# the former WORD, which excludes the keywords by a negative lookahead at every identifier
+KEYWORD_TABLE_WORD = "WORD        : /[a-zA-Z0-9_]+/"
+LOOKAHEAD_WORD = "WORD        : /(?!\\b(FSM|FOR|WHILE|DO|IF|ELSE|if|else|for|while|do|switch|case|default|YIELD|WAIT|WAIT_UNLESS|GLOBAL|true|false)\\b)[a-zA-Z0-9_]+/"
+
+def lookahead_grammar() -> str:
+    """basic grammar with the former WORD terminal"""
+    with open(parser.PATH_LARK_BASIC_PARSER, "r") as f:
+        grammar = f.read()
+    assert KEYWORD_TABLE_WORD in grammar
+    return grammar.replace(KEYWORD_TABLE_WORD, LOOKAHEAD_WORD)
+
+def generate_fsm_function(statement_count:int) -> str:
+    """FSM function with identifier-heavy statements and keywords"""
+    lines = []
+    for i in range(statement_count // 4):
+        lines.append("counter_{0} = previous_value + next_value * scale_factor;".format(i))
+        lines.append("IF (is_ready && counter_{0} != limit) {{ controller.update(counter_{0}); }} ELSE {{ YIELD; }}".format(i))
+        lines.append("WHILE (queue.empty() == false) {{ WAIT(signal_{0}); }}".format(i))
+        lines.append("unsigned int index_{0} = lookup_table[counter_{0}];".format(i))
+    return "FSM identifier_function() {\n    " + "\n    ".join(lines) + "\n}\n"
+
+def measure(function, repetitions:int) -> float:
+    """average seconds per call"""
+    time_start = time.perf_counter()
+    for _ in range(repetitions):
+        function()
+    return (time.perf_counter() - time_start) / repetitions
+
+def main():
+    keyword_table = parser.get_lark_parser("basic")
+    lookahead_lexer = lark.Lark(lookahead_grammar(), start="fsm_func", parser="earley", lexer="basic", propagate_positions=True)
+    lookahead_dynamic = lark.Lark(lookahead_grammar(), start="fsm_func", parser="earley", lexer="dynamic", propagate_positions=True)
+
+    print("{:>10} {:>8} | {:>16} {:>16} | {:>16} {:>16}".format(
+        "statements", "tokens", "lex, lookahead", "lex, keywords", "parse, before", "parse, after"
+    ))
+    print("{:>10} {:>8} | {:>33} | {:>33}".format("", "", "[tokens/s]", "[tokens/s]"))
+    for statement_count in STATEMENT_COUNTS:
+        input_str = generate_fsm_function(statement_count)
+        repetitions = max(1, 640 // statement_count)
+
+        tokens = list(keyword_table.lex(input_str))
+        assert [t.value for t in tokens] == [t.value for t in lookahead_lexer.lex(input_str)]
+        assert keyword_table.parse(input_str) == lookahead_dynamic.parse(input_str)
+
+        time_lex_lookahead = measure(lambda: list(lookahead_lexer.lex(input_str)), repetitions * 10)
+        time_lex_keywords = measure(lambda: list(keyword_table.lex(input_str)), repetitions * 10)
+        time_parse_before = measure(lambda: lookahead_dynamic.parse(input_str), repetitions)
+        time_parse_after = measure(lambda: keyword_table.parse(input_str), repetitions)
+
+        print("{:>10} {:>8} | {:>16.0f} {:>16.0f} | {:>16.0f} {:>16.0f}".format(
+            statement_count, len(tokens),
+            len(tokens) / time_lex_lookahead, len(tokens) / time_lex_keywords,
+            len(tokens) / time_parse_before, len(tokens) / time_parse_after,
+        ))
+
+if __name__ == "__main__":
+    main()
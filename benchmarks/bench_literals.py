@@ -0,0 +1,77 @@
+import sys
+import time
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import lark
+
+import fsm_compiler.parser as parser
+
+STATEMENT_COUNTS = [20, 80, 320]
+MESSAGE_REPEAT = 3
+
+# the former rules, which lex every character of a literal as a token
+SINGLE_TOKEN_RULES = {
+    "literal     : STRING    -> literal_string\n": "literal     : string    -> literal_string\n",
+    "            | CHAR      -> literal_char\n": "            | char      -> literal_char\n",
+}
+PER_CHARACTER_RULES = """
+string      : "\\"" STRCHAR* "\\""    -> string
+char        : "'" STRCHAR "'"       -> char
+STRCHAR     : /([^"\\\\]|(\\\\.))/
+"""
+
+def per_character_grammar() -> str:
+    """basic grammar with the former per-character string and char rules"""
+    with open(parser.PATH_LARK_BASIC_PARSER, "r") as f:
+        grammar = f.read()
+    for single_token, per_character in SINGLE_TOKEN_RULES.items():
+        assert single_token in grammar
+        grammar = grammar.replace(single_token, per_character)
+    return grammar + PER_CHARACTER_RULES
+
+def generate_fsm_function(statement_count:int) -> str:
+    """FSM function dominated by print-style logging"""
+    message = "state %d reached, value=\\\"%s\\\" " * MESSAGE_REPEAT
+    lines = []
+    for i in range(statement_count // 2):
+        lines.append("print(\"{}\", {}, '\\n');".format(message, i))
+        lines.append("IF (mode == 'x') {{ log(\"{}\"); YIELD; }}".format(message))
+    return "FSM logging_function() {\n    " + "\n    ".join(lines) + "\n}\n"
+
+def count_tokens(lark_parser:lark.Lark, input_str:str) -> int:
+    tree = lark_parser.parse(input_str)
+    return sum(1 for _ in tree.scan_values(lambda v: isinstance(v, lark.Token)))
+
+def measure(lark_parser:lark.Lark, input_str:str, repetitions:int) -> float:
+    """average seconds per parse"""
+    time_start = time.perf_counter()
+    for _ in range(repetitions):
+        lark_parser.parse(input_str)
+    return (time.perf_counter() - time_start) / repetitions
+
+def main():
+    single_token = parser.get_lark_parser("basic")
+    per_character = lark.Lark(per_character_grammar(), start="fsm_func", propagate_positions=True)
+
+    print("{:>10} {:>10} {:>16} {:>16} {:>16} {:>16} {:>9}".format(
+        "statements", "bytes", "tokens [char]", "tokens [single]", "char [ms]", "single [ms]", "speedup"
+    ))
+    for statement_count in STATEMENT_COUNTS:
+        input_str = generate_fsm_function(statement_count)
+        repetitions = max(1, 160 // statement_count)
+
+        time_per_character = measure(per_character, input_str, repetitions)
+        time_single_token = measure(single_token, input_str, repetitions)
+
+        print("{:>10} {:>10} {:>16} {:>16} {:>16.2f} {:>16.2f} {:>8.1f}x".format(
+            statement_count, len(input_str),
+            count_tokens(per_character, input_str), count_tokens(single_token, input_str),
+            time_per_character * 1000, time_single_token * 1000, time_per_character / time_single_token
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import sys
+import gc
+import pathlib
+import tracemalloc
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import fsm_compiler.parser as parser
+
+FUNCTION_COUNTS = [10, 50, 200]
+STATEMENT_COUNT = 40
+
+def generate_fsm_function(index:int, statement_count:int) -> str:
+    """FSM function with a mix of statements and string literals"""
+    lines = []
+    for i in range(statement_count // 4):
+        lines.append("print(\"function {0}, step {1}: value=%d\", a{1});".format(index, i))
+        lines.append("IF (a{0} == 1 && b || c != d) {{ x = foo(a{0}, b, c); }} ELSE {{ x++; }}".format(i))
+        lines.append("WHILE (a{0} < 10) {{ a{0} += 1; YIELD; }}".format(i))
+        lines.append("GLOBAL int v{0} = a{0} * 3;".format(i))
+    return "FSM function_{}() {{\n    ".format(index) + "\n    ".join(lines) + "\n}\n"
+
+def measure(sources:list[str], lean:bool) -> tuple[int, int]:
+    """memory allocated by keeping the parse results alive, and the peak memory during parsing, in bytes"""
+    gc.collect()
+    tracemalloc.start()
+    results = [parser.parse_to_AST(source, parser="lalr", lean=lean) for source in sources]
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return current, peak
+
+def main():
+    parser.get_lark_parser("basic", "lalr") # construct the parser before tracing
+
+    print("{:>10} | {:>14} {:>14} {:>8} | {:>14} {:>14} {:>8}".format(
+        "functions", "retained full", "retained lean", "ratio", "peak full", "peak lean", "ratio"
+    ))
+    for function_count in FUNCTION_COUNTS:
+        sources = [generate_fsm_function(i, STATEMENT_COUNT) for i in range(function_count)]
+
+        current_full, peak_full = measure(sources, lean=False)
+        current_lean, peak_lean = measure(sources, lean=True)
+
+        print("{:>10} | {:>11.1f} MB {:>11.1f} MB {:>7.1f}x | {:>11.1f} MB {:>11.1f} MB {:>7.1f}x".format(
+            function_count,
+            current_full / 2**20, current_lean / 2**20, current_full / current_lean,
+            peak_full / 2**20, peak_lean / 2**20, peak_full / peak_lean,
+        ))
+
+if __name__ == "__main__":
+    main()
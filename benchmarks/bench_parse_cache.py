@@ -0,0 +1,57 @@
+import sys
+import time
+import pathlib
+import tempfile
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import fsm_compiler.parser as parser
+import fsm_compiler.cache as cache
+
+FUNCTION_COUNT = 20
+STATEMENT_COUNTS = [20, 80, 320]
+
+def generate_fsm_function(index:int, statement_count:int) -> str:
+    """FSM function with a mix of statements"""
+    lines = []
+    for i in range(statement_count // 4):
+        lines.append("print(\"function {0}, step {1}: value=%d\", a{1});".format(index, i))
+        lines.append("IF (a{0} == 1 && b || c != d) {{ x = foo(a{0}, b, c); }} ELSE {{ x++; }}".format(i))
+        lines.append("WHILE (a{0} < 10) {{ a{0} += 1; YIELD; }}".format(i))
+        lines.append("GLOBAL int v{0} = a{0} * 3;".format(i))
+    return "FSM function_{}() {{\n    ".format(index) + "\n    ".join(lines) + "\n}\n"
+
+def measure(sources:list[str], parse_cache:cache.ParseResultCache) -> float:
+    """seconds to parse all the sources"""
+    time_start = time.perf_counter()
+    for source in sources:
+        parser.parse_to_AST(source, parse_cache=parse_cache)
+    return time.perf_counter() - time_start
+
+def main():
+    parser.get_lark_parser() # construct the parser before timing
+
+    print("{:>10} | {:>12} {:>12} {:>9} | {:>12} {:>12}".format(
+        "statements", "miss [ms]", "hit [ms]", "speedup", "source", "cached"
+    ))
+    for statement_count in STATEMENT_COUNTS:
+        sources = [generate_fsm_function(i, statement_count) for i in range(FUNCTION_COUNT)]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            parse_cache = cache.ParseResultCache(pathlib.Path(temp_dir))
+
+            time_miss = measure(sources, parse_cache)
+            time_hit = measure(sources, parse_cache)
+            assert parse_cache.stats() == {"hits": FUNCTION_COUNT, "misses": FUNCTION_COUNT, "evictions": 0}
+
+            cached_size = sum(path.stat().st_size for path in pathlib.Path(temp_dir).rglob("*.pickle"))
+
+        print("{:>10} | {:>12.1f} {:>12.1f} {:>8.1f}x | {:>9.1f} KB {:>9.1f} KB".format(
+            statement_count,
+            time_miss / FUNCTION_COUNT * 1000, time_hit / FUNCTION_COUNT * 1000, time_miss / time_hit,
+            sum(map(len, sources)) / FUNCTION_COUNT / 2**10, cached_size / FUNCTION_COUNT / 2**10,
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import sys
+import time
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import fsm_compiler.parser as parser
+
+STATEMENT_COUNTS = [50, 200, 800]
+
+def generate_fsm_function(statement_count:int) -> str:
+    """FSM function with a long body of mixed statements"""
+    lines = []
+    for i in range(statement_count // 4):
+        lines.append("a{0} = b{0} + c * -d[{0}] / (e - f);".format(i))
+        lines.append("IF (a{0} == 1 && b || c != d << 2) {{ print(\"value\", a{0}); }} ELSE {{ x++; }}".format(i))
+        lines.append("WHILE (a{0} < 10) {{ a{0} += 1; YIELD; }}".format(i))
+        lines.append("int v{0} = foo(a{0}, b, c) * 3;".format(i))
+    return "FSM long_function() {\n    " + "\n    ".join(lines) + "\n}\n"
+
+def measure(input_str:str, algorithm:str, repetitions:int) -> float:
+    """average seconds per parse"""
+    parser.parse_to_AST(input_str, parser=algorithm) # warm up, construct parser
+    
+    time_start = time.perf_counter()
+    for _ in range(repetitions):
+        parser.parse_to_AST(input_str, parser=algorithm)
+    return (time.perf_counter() - time_start) / repetitions
+
+def main():
+    print("{:>10} {:>10} {:>14} {:>14} {:>9}".format("statements", "bytes", "earley [ms]", "lalr [ms]", "speedup"))
+    for statement_count in STATEMENT_COUNTS:
+        input_str = generate_fsm_function(statement_count)
+        repetitions = max(1, 400 // statement_count)
+        
+        assert parser.parse_to_AST(input_str, parser="earley") == parser.parse_to_AST(input_str, parser="lalr")
+        
+        time_earley = measure(input_str, "earley", repetitions)
+        time_lalr = measure(input_str, "lalr", repetitions)
+        
+        print("{:>10} {:>10} {:>14.2f} {:>14.2f} {:>8.1f}x".format(
+            statement_count, len(input_str), time_earley * 1000, time_lalr * 1000, time_earley / time_lalr
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import gc
+import sys
+import time
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import fsm_compiler.parser as parser
+import generators
+
+REPETITIONS = 5
+CASES = [
+    # grammar, parser, statements of the flat body
+    ("basic", "earley", 200),
+    ("basic", "lalr", 1600),
+    ("coarse", "lalr", 1600),
+]
+
+def measure(input_str:str, grammar:str, algorithm:str, propagate_positions:bool) -> tuple[float, float]:
+    """best seconds of parsing into the lark AST, and into the statements, the garbage collection is excluded"""
+    parser.parse_to_AST(input_str, grammar, algorithm, lean=True, propagate_positions=propagate_positions) # warm up, construct parser
+
+    best_lark = best_total = float("inf")
+    gc.disable()
+    try:
+        for _ in range(REPETITIONS):
+            time_start = time.perf_counter()
+            parser.parse_lark_ast(input_str, grammar, algorithm, propagate_positions)
+            best_lark = min(best_lark, time.perf_counter() - time_start)
+            gc.collect()
+
+            time_start = time.perf_counter()
+            parser.parse_to_AST(input_str, grammar, algorithm, lean=True, propagate_positions=propagate_positions)
+            best_total = min(best_total, time.perf_counter() - time_start)
+            gc.collect()
+    finally:
+        gc.enable()
+    return best_lark, best_total
+
+def main():
+    print("{:>14} {:>10} {:>10} | {:>18} {:>20} {:>8} | {:>20} {:>22} {:>8}".format(
+        "parser", "statements", "bytes", 
+        "lark AST meta [ms]", "lark AST tokens [ms]", "speedup", "statements meta [ms]", "statements tokens [ms]", "speedup"
+    ))
+    for grammar, algorithm, statement_count in CASES:
+        input_str = generators.generate_flat_body(statement_count)
+
+        res_meta = parser.parse_to_AST(input_str, grammar, algorithm, lean=True, propagate_positions=True)
+        res_tokens = parser.parse_to_AST(input_str, grammar, algorithm, lean=True, propagate_positions=False)
+        assert res_meta == res_tokens and res_meta.span == res_tokens.span
+
+        # `propagate_positions=True` is the meta of every tree, `False` is the first and last token of the trees
+        time_lark_meta, time_meta = measure(input_str, grammar, algorithm, True)
+        time_lark_tokens, time_tokens = measure(input_str, grammar, algorithm, False)
+
+        print("{:>14} {:>10} {:>10} | {:>18.2f} {:>20.2f} {:>7.2f}x | {:>20.2f} {:>22.2f} {:>7.2f}x".format(
+            "{}:{}".format(grammar, algorithm), statement_count, len(input_str),
+            time_lark_meta * 1000, time_lark_tokens * 1000, time_lark_meta / time_lark_tokens,
+            time_meta * 1000, time_tokens * 1000, time_meta / time_tokens,
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import sys
+import gc
+import time
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import fsm_compiler.parser as parser
+import fsm_compiler.assembler as assembler
+from fsm_compiler.ast_types import FSMNode, FSMTransition
+import generators
+
+STATEMENT_COUNTS = [100, 200, 400, 800]
+OPTIMIZATION_LEVELS = [5, 10]
+
+class ScanningPredecessorIndex(assembler.PredecessorIndex):
+    """the transitions to a node are found by scanning the whole fsm, like before the index"""
+    def transitions_to(self, fsm_node:FSMNode) -> list[FSMTransition]:
+        return assembler.trace_back_transition(fsm_node, self.starting_node)
+
+def optimize(parse_result, optimization_level:int, index_type:type) -> tuple[float, int]:
+    """seconds of optimizing the raw fsm, and the count of the optimized nodes"""
+    fsm = assembler.convert_to_raw_state_machine(parse_result)
+    gc.disable()
+    try:
+        time_start = time.perf_counter()
+        predecessors = index_type(fsm.starting_node)
+        for level in (1, 2, 3, 4, 5, 10):
+            if level <= optimization_level:
+                assembler.OPTIMIZATION_STRATEGIES[level](fsm.starting_node, predecessors)
+        seconds = time.perf_counter() - time_start
+    finally:
+        gc.enable()
+    return seconds, len(assembler.traverse_FSM(fsm.starting_node))
+
+def main():
+    print("{:>10} {:>6} {:>6} {:>8} | {:>12} {:>12} {:>8}".format(
+        "statements", "level", "nodes", "result", "scan [ms]", "index [ms]", "speedup"
+    ))
+    for statement_count in STATEMENT_COUNTS:
+        parse_result = parser.parse_to_AST(generators.generate_flat_body(statement_count), "basic", "lalr", lean=True)
+        node_count = len(assembler.traverse_FSM(assembler.convert_to_raw_state_machine(parse_result).starting_node))
+        for optimization_level in OPTIMIZATION_LEVELS:
+            seconds_scan, result_scan = optimize(parse_result, optimization_level, ScanningPredecessorIndex)
+            seconds_index, result_index = optimize(parse_result, optimization_level, assembler.PredecessorIndex)
+            assert result_scan == result_index
+
+            print("{:>10} {:>6} {:>6} {:>8} | {:>12.1f} {:>12.1f} {:>7.1f}x".format(
+                statement_count, optimization_level, node_count, result_index,
+                seconds_scan * 1000, seconds_index * 1000, seconds_scan / seconds_index
+            ))
+
+if __name__ == "__main__":
+    main()
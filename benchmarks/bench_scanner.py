@@ -0,0 +1,79 @@
+import sys
+import time
+import pathlib
+import tempfile
+import tracemalloc
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import fsm_compiler.scanner as scanner
+
+FILE_SIZES_MB = [1, 8, 32]
+FSM_FUNCTION_INTERVAL = 200 # ordinary functions between FSM functions
+
+ORDINARY_FUNCTION = """
+// helper {0}, not an FSM() {{
+static int helper_{0}(int a, const char *s) {{
+    const char *text = "FSM fake() {{ }}";
+    for (int i = 0; i < a; ++i) {{ if (s[i] == '}}') {{ return table[i] * {0}; }} }}
+    return a + {0};
+}}
+"""
+
+FSM_FUNCTION = """
+FSM machine_{0}() {{
+    WHILE (ready_{0}()) {{ print("{{ step }}", {0}); YIELD; }}
+    WAIT(10);
+}}
+"""
+
+def generate_translation_unit(path:pathlib.Path, size:int) -> int:
+    """write a C/C++ file of about `size` bytes, return the number of FSM functions"""
+    fsm_count = 0
+    with open(path, "w") as f:
+        written, index = 0, 0
+        while written < size:
+            if index % FSM_FUNCTION_INTERVAL == 0:
+                written += f.write(FSM_FUNCTION.format(index))
+                fsm_count += 1
+            written += f.write(ORDINARY_FUNCTION.format(index))
+            index += 1
+    return fsm_count
+
+def measure(scan) -> tuple[float, int, int]:
+    """seconds, peak python memory in bytes, and the number of functions found"""
+    time_start = time.perf_counter()
+    count = sum(1 for _ in scan())
+    seconds = time.perf_counter() - time_start
+    
+    # tracing slows down the scan, so the memory is measured separately
+    tracemalloc.start()
+    sum(1 for _ in scan())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, count
+
+def main():
+    print("{:>8} {:>10} | {:>12} {:>12} | {:>12} {:>12}".format(
+        "size", "functions", "read [MB/s]", "read peak", "mmap [MB/s]", "mmap peak"
+    ))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = pathlib.Path(temp_dir) / "translation_unit.cpp"
+        for size_mb in FILE_SIZES_MB:
+            fsm_count = generate_translation_unit(path, size_mb * 2**20)
+
+            # read the whole file as str, then scan it
+            time_read, peak_read, count_read = measure(lambda: scanner.find_fsm_functions(path.read_text()))
+            time_mmap, peak_mmap, count_mmap = measure(lambda: scanner.scan_fsm_file(path))
+            assert count_read == count_mmap == fsm_count
+
+            print("{:>5} MB {:>10} | {:>12.1f} {:>9.1f} MB | {:>12.1f} {:>9.1f} MB".format(
+                size_mb, fsm_count,
+                size_mb / time_read, peak_read / 2**20,
+                size_mb / time_mmap, peak_mmap / 2**20,
+            ))
+
+if __name__ == "__main__":
+    main()
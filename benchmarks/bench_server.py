@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import pathlib
+import tempfile
+import subprocess
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+from fsm_compiler.client import CompileClient
+import generators
+
+PROJECT_ROOT = pathlib.Path(__file__).parent.parent
+FUNCTION_COUNT = 20
+REPETITIONS = 5
+ROUND_TRIPS = 100
+
+def generate_source(function_count:int, edit:int=0) -> str:
+    """C/C++ source of FSM functions, `edit` changes the code of the first function"""
+    functions = generators.generate_many_small(function_count)
+    functions[0] = functions[0].replace("WAIT(10)", "WAIT({})".format(10 + edit))
+    return "#include \"fsm.h\"\n\n" + "\n\n".join(functions) + "\n"
+
+def run_cli(args:list[str], env:dict[str, str]|None=None) -> float:
+    """best seconds of the command line, each run is a new process"""
+    best = float("inf")
+    for _ in range(REPETITIONS):
+        time_start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "fsm_compiler", *args], cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, check=True)
+        best = min(best, time.perf_counter() - time_start)
+    return best
+
+def wait_for_server(socket_path:pathlib.Path, timeout:float=60) -> None:
+    time_end = time.monotonic() + timeout
+    while True:
+        try:
+            with CompileClient(socket_path) as client:
+                client.stats()
+            return
+        except OSError:
+            if time.monotonic() > time_end:
+                raise
+            time.sleep(0.05)
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        source_path = directory / "fsm.cpp"
+        source_path.write_text(generate_source(FUNCTION_COUNT))
+        socket_path = directory / "server.sock"
+
+        rows = []
+        env_no_cache = dict(os.environ, FSM_COMPILER_DISABLE_CACHE="1")
+        rows.append(("cold CLI, no cache", run_cli(["compile", str(source_path)], env_no_cache)))
+        rows.append(("cold CLI", run_cli(["compile", str(source_path)])))
+
+        server = subprocess.Popen([sys.executable, "-m", "fsm_compiler", "serve", str(socket_path)], cwd=PROJECT_ROOT)
+        try:
+            wait_for_server(socket_path)
+            rows.append(("client CLI", run_cli(["compile", "--server", str(socket_path), str(source_path)])))
+
+            with CompileClient(socket_path) as client:
+                source = source_path.read_text()
+                client.compile(source)
+
+                time_start = time.perf_counter()
+                for _ in range(ROUND_TRIPS):
+                    client.compile(source)
+                rows.append(("round trip, unchanged", (time.perf_counter() - time_start) / ROUND_TRIPS))
+
+                # one of the functions is edited before every request, the other ones are memoized
+                sources = [generate_source(FUNCTION_COUNT, edit) for edit in range(1, ROUND_TRIPS + 1)]
+                time_start = time.perf_counter()
+                for source in sources:
+                    client.compile(source)
+                rows.append(("round trip, one edit", (time.perf_counter() - time_start) / ROUND_TRIPS))
+
+                logger.info("server stats %s", client.stats())
+                client.shutdown()
+            server.wait(timeout=10)
+        finally:
+            if server.poll() is None:
+                server.kill()
+
+    print("{} FSM functions per file".format(FUNCTION_COUNT))
+    print("{:>24} {:>12} {:>9}".format("", "time [ms]", "speedup"))
+    for name, seconds in rows:
+        print("{:>24} {:>12.2f} {:>8.1f}x".format(name, seconds * 1000, rows[1][1] / seconds))
+
+if __name__ == "__main__":
+    main()
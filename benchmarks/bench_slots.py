@@ -0,0 +1,133 @@
+import sys
+import gc
+import time
+import pathlib
+import dataclasses
+import tracemalloc
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import fsm_compiler.parser as parser
+import fsm_compiler.ast_types as ast_types
+import generators
+
+NODE_COUNT = 50000
+STATEMENT_COUNT = 2000
+REPETITIONS = 5
+
+# the nodes and transitions before they were slotted, each instance has a `__dict__`
+
+@dataclasses.dataclass
+class DictFSMNode():
+    code_block: list[str]
+    transitions: list["DictFSMTransition"]
+    collapsible: bool = True
+    entry_condition: str = ""
+    node_id: int = 0
+
+    def __hash__(self):
+        return id(self)
+
+    def __eq__(self, value: object) -> bool:
+        return id(self) == id(value)
+
+@dataclasses.dataclass
+class DictFSMTransition:
+    code_block: list[str]
+    condition: str
+    target_node: DictFSMNode
+
+    def __hash__(self):
+        return id(self)
+
+    def __eq__(self, value: object) -> bool:
+        return id(self) == id(value)
+
+def generate_raw_fsm(node_count:int) -> ast_types.FSMNode:
+    """starting node of a raw FSM with at least `node_count` nodes, the statements of one parse are repeated"""
+    parse_result = parser.parse_to_AST(generators.generate_flat_body(STATEMENT_COUNT), "basic", "lalr", lean=True)
+    fsm_return = parse_result.to_fsm()
+    repeat = -(-node_count // len(collect_nodes(fsm_return.starting_node)))
+
+    lines = parse_result.statements.lines * repeat
+    parse_result = dataclasses.replace(parse_result, statements=dataclasses.replace(parse_result.statements, lines=lines))
+    return parse_result.to_fsm().starting_node
+
+def collect_nodes(starting_node) -> list:
+    """every node reachable from the starting node, the attributes of every node and transition are read"""
+    nodes = [starting_node]
+    visited = {starting_node}
+    for node in nodes:
+        if node.collapsible and node.entry_condition:
+            pass
+        for transition in node.transitions:
+            if transition.condition or transition.code_block:
+                pass
+            if transition.target_node not in visited:
+                visited.add(transition.target_node)
+                nodes.append(transition.target_node)
+    return nodes
+
+def copy_fsm(starting_node:ast_types.FSMNode, node_type:type, transition_type:type):
+    """copy of the FSM with the given node and transition types, the text is shared"""
+    nodes = collect_nodes(starting_node)
+    copies = {node: node_type(node.code_block, [], node.collapsible, node.entry_condition, node.node_id) for node in nodes}
+    for node in nodes:
+        copies[node].transitions = [
+            transition_type(transition.code_block, transition.condition, copies[transition.target_node])
+            for transition in node.transitions
+        ]
+    return copies[starting_node]
+
+def measure_memory(starting_node:ast_types.FSMNode, node_type:type, transition_type:type) -> int:
+    """memory allocated by keeping the copy alive, in bytes"""
+    gc.collect()
+    tracemalloc.start()
+    copy = copy_fsm(starting_node, node_type, transition_type)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del copy
+    return current
+
+def measure_time(function) -> float:
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(REPETITIONS):
+            time_start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - time_start)
+    finally:
+        gc.enable()
+    return best
+
+def main():
+    starting_node = generate_raw_fsm(NODE_COUNT)
+    nodes = collect_nodes(starting_node)
+    print("{} nodes, {} transitions".format(len(nodes), sum(len(node.transitions) for node in nodes)))
+
+    types = {
+        "dict": (DictFSMNode, DictFSMTransition),
+        "slots": (ast_types.FSMNode, ast_types.FSMTransition),
+    }
+    rows = {}
+    for name, (node_type, transition_type) in types.items():
+        copy = copy_fsm(starting_node, node_type, transition_type)
+        rows[name] = (
+            measure_memory(starting_node, node_type, transition_type),
+            measure_time(lambda: copy_fsm(starting_node, node_type, transition_type)),
+            measure_time(lambda: collect_nodes(copy)),
+        )
+
+    print("{:>8} {:>12} {:>12} {:>12}".format("", "memory [MB]", "build [ms]", "walk [ms]"))
+    for name, (memory, build, walk) in rows.items():
+        print("{:>8} {:>12.2f} {:>12.1f} {:>12.1f}".format(name, memory / 2**20, build * 1000, walk * 1000))
+    print("{:>8} {:>11.1f}x {:>11.1f}x {:>11.1f}x".format(
+        "ratio", *(dict_value / slots_value for dict_value, slots_value in zip(rows["dict"], rows["slots"]))
+    ))
+
+if __name__ == "__main__":
+    main()
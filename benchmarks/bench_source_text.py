@@ -0,0 +1,72 @@
+import sys
+import gc
+import pathlib
+import tracemalloc
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import fsm_compiler.parser as parser
+import fsm_compiler.ast_types as ast_types
+
+FUNCTION_COUNT = 20
+BLOCK_SIZES = [1, 10, 100]
+
+def generate_fsm_function(index:int, block_size:int) -> str:
+    """FSM function whose statements are C/C++ loops of `block_size` lines, which are kept as text"""
+    body = " ".join("sum += table[i + {0}] * {0};".format(i) for i in range(block_size))
+    lines = []
+    for i in range(10):
+        lines.append("for (int i = 0; i < n{0}; ++i) {{ {1} }}".format(i, body))
+        lines.append("WAIT_UNLESS(sum > {0} && ready(\"function {1}\"));".format(i, index))
+    return "FSM function_{}() {{\n    ".format(index) + "\n    ".join(lines) + "\n}\n"
+
+def materialize(statement):
+    """replace the source text of the statements by str, i.e. the former eager slicing"""
+    for name, value in vars(statement).items():
+        if isinstance(value, ast_types.SourceText):
+            setattr(statement, name, str(value))
+        elif isinstance(value, ast_types.Statement):
+            materialize(value)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, ast_types.IfCase):
+                    item.condition = str(item.condition)
+                    materialize(item.statements)
+                else:
+                    materialize(item)
+
+def measure(sources:list[str], eager:bool) -> int:
+    """memory allocated by keeping the lean parse results alive, in bytes"""
+    gc.collect()
+    tracemalloc.start()
+    results = []
+    for source in sources:
+        results.append(parser.parse_to_AST(source, parser="lalr", lean=True))
+        if eager:
+            materialize(results[-1])
+    del source
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+def main():
+    parser.get_lark_parser("basic", "lalr") # construct the parser before tracing
+
+    print("{:>10} {:>12} | {:>14} {:>14} {:>8}".format("block size", "source", "eager slicing", "source text", "ratio"))
+    for block_size in BLOCK_SIZES:
+        # the sources are allocated before tracing, they are kept alive by the caller anyway
+        sources = [generate_fsm_function(i, block_size) for i in range(FUNCTION_COUNT)]
+
+        current_eager = measure(sources, eager=True)
+        current_lazy = measure(sources, eager=False)
+
+        print("{:>10} {:>9.1f} MB | {:>11.2f} MB {:>11.2f} MB {:>7.1f}x".format(
+            block_size, sum(map(len, sources)) / 2**20,
+            current_eager / 2**20, current_lazy / 2**20, current_eager / current_lazy
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import gc
+import sys
+import json
+import time
+import pathlib
+import argparse
+import platform
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import lark
+
+import fsm_compiler.parser as parser
+import generators
+
+RESULT_FORMAT = 1
+PARSERS = ["basic:earley", "basic:lalr", "coarse:lalr"]
+PHASES = ["parse_lark_ast", "parse_fsm_function"]
+MIN_REPETITION_SECONDS = 0.1
+
+def generate_cases(scale:int) -> dict[str, list[str]]:
+    """the benchmark cases, each one is a list of FSM functions"""
+    return {
+        "flat_body": [generators.generate_flat_body(80 * scale)],
+        "nested": [generators.generate_nested(16 * scale)],
+        "literal_heavy": [generators.generate_literal_heavy(40 * scale)],
+        "many_small": generators.generate_many_small(40 * scale),
+    }
+
+def measure(sources:list[str], grammar:str, algorithm:str, repetitions:int) -> dict[str, float]:
+    """best seconds of each phase, over all the sources, the garbage collection is excluded
+    
+    Each repetition parses the sources as many times as it takes `MIN_REPETITION_SECONDS`, so the 
+    short phases are not dominated by the timer resolution and noise.
+    """
+    parser.parse_lark_ast(sources[0], grammar, algorithm) # warm up, construct parser
+    time_start = time.perf_counter()
+    parser.parse_fsm_function(sources[0], parser.parse_lark_ast(sources[0], grammar, algorithm))
+    loops = 1
+    while (time.perf_counter() - time_start) * loops * len(sources) < MIN_REPETITION_SECONDS and loops < 1000:
+        loops *= 2
+    
+    best = dict.fromkeys(PHASES, float("inf"))
+    gc.disable()
+    try:
+        for _ in range(repetitions):
+            time_lark = time_build = 0.0
+            for _ in range(loops):
+                time_start = time.perf_counter()
+                trees = [parser.parse_lark_ast(source, grammar, algorithm) for source in sources]
+                time_lark += time.perf_counter() - time_start
+
+                time_start = time.perf_counter()
+                for source, tree in zip(sources, trees):
+                    parser.parse_fsm_function(source, tree)
+                time_build += time.perf_counter() - time_start
+                del trees
+
+            best["parse_lark_ast"] = min(best["parse_lark_ast"], time_lark / loops)
+            best["parse_fsm_function"] = min(best["parse_fsm_function"], time_build / loops)
+            gc.collect()
+    finally:
+        gc.enable()
+    return best
+
+def run(cases:dict[str, list[str]], parsers:list[str], repetitions:int) -> dict:
+    results = []
+    for case, sources in cases.items():
+        for grammar_parser in parsers:
+            grammar, algorithm = grammar_parser.split(":")
+            results.append({
+                "case": case,
+                "grammar": grammar,
+                "parser": algorithm,
+                "functions": len(sources),
+                "bytes": sum(map(len, sources)),
+                "seconds": measure(sources, grammar, algorithm, repetitions),
+            })
+            logger.info("%s %s done", case, grammar_parser)
+
+    return {
+        "format": RESULT_FORMAT,
+        "python": platform.python_version(),
+        "lark": lark.__version__,
+        "platform": platform.platform(),
+        "repetitions": repetitions,
+        "results": results,
+    }
+
+def _result_key(result:dict) -> tuple[str, str, str]:
+    return result["case"], result["grammar"], result["parser"]
+
+def compare(current:dict, baseline:dict, tolerance:float) -> list[str]:
+    """print the ratio of each phase to the baseline, return the regressions slower than `1 + tolerance`"""
+    baseline_results = {_result_key(result): result for result in baseline["results"]}
+
+    regressions = []
+    print("{:>14} {:>14} | {:>16} {:>8} | {:>18} {:>8}".format(
+        "case", "parser", "lark AST [ms]", "ratio", "statements [ms]", "ratio"
+    ))
+    for result in current["results"]:
+        key = _result_key(result)
+        baseline_result = baseline_results.get(key)
+        if baseline_result is not None and baseline_result["bytes"] != result["bytes"]:
+            logger.warning("Skip %s, the input differs from the baseline", key)
+            baseline_result = None
+
+        columns = []
+        for phase in PHASES:
+            seconds = result["seconds"][phase]
+            if baseline_result is None:
+                columns += [seconds * 1000, "-"]
+                continue
+            ratio = seconds / baseline_result["seconds"][phase]
+            columns += [seconds * 1000, "{:.2f}x".format(ratio)]
+            if ratio > 1 + tolerance:
+                regressions.append("{} {}:{} {} {:.2f}x slower".format(key[0], key[1], key[2], phase, ratio))
+
+        print("{:>14} {:>14} | {:>16.2f} {:>8} | {:>18.2f} {:>8}".format(key[0], "{}:{}".format(*key[1:]), *columns))
+    return regressions
+
+def main(argv:list[str]|None=None) -> int:
+    argument_parser = argparse.ArgumentParser(description="benchmark the parser front end on synthetic FSM functions")
+    argument_parser.add_argument("--output", type=pathlib.Path, help="write the results as JSON to this file")
+    argument_parser.add_argument("--baseline", type=pathlib.Path, help="compare to the JSON results of an earlier run")
+    argument_parser.add_argument("--tolerance", type=float, default=0.25,
+                                 help="a phase slower than the baseline by more than this fraction is a regression, by default 0.25")
+    argument_parser.add_argument("--parsers", nargs="+", default=PARSERS, help="grammar:parser pairs, by default %(default)s")
+    argument_parser.add_argument("--scale", type=int, default=1, help="multiply the size of the inputs")
+    argument_parser.add_argument("--repetitions", type=int, default=5, help="the best time of the repetitions is reported")
+    args = argument_parser.parse_args(argv)
+
+    current = run(generate_cases(args.scale), args.parsers, args.repetitions)
+    if args.output is not None:
+        args.output.write_text(json.dumps(current, indent=2))
+
+    baseline = {"results": []} if args.baseline is None else json.loads(args.baseline.read_text())
+    regressions = compare(current, baseline, args.tolerance)
+    for regression in regressions:
+        print("REGRESSION", regression)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
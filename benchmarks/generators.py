@@ -0,0 +1,51 @@
+"""Synthetic FSM functions for the benchmarks
+
+Every generator is deterministic, so the same arguments always produce the same code, and the
+results of different runs can be compared. The code is accepted by all the grammars, i.e. the
+Earley and LALR(1) basic grammar and the coarse grammar.
+"""
+
+def generate_flat_body(statement_count:int) -> str:
+    """FSM function with a long flat body of mixed statements"""
+    templates = [
+        "a{0} = b{0} + c * -d[{0}] / (e - f);",
+        "print(\"step %d\", a{0}, foo(b, c));",
+        "int v{0} = foo(a{0}, b, c) * 3;",
+        "IF (a{0} == 1 && b || c != d << 2) {{ x = bar(a{0}); }} ELSE {{ x++; }}",
+        "WHILE (a{0} < 10) {{ a{0} += 1; YIELD; }}",
+        "for (int i = 0; i < n; i++) {{ sum += table[i]; }}",
+        "GLOBAL int g{0} = a{0} * 3;",
+        "WAIT(delay_{0});",
+    ]
+    lines = [templates[i % len(templates)].format(i) for i in range(statement_count)]
+    return "FSM flat_body() {\n    " + "\n    ".join(lines) + "\n}\n"
+
+def generate_nested(depth:int) -> str:
+    """FSM function with `depth` levels of alternately nested IF and FOR statements"""
+    openings = [
+        "IF (a < {0}) {{ x += {0};",
+        "FOR (int i{0} = 0; i{0} < n; ++i{0}) {{ y -= {0};",
+    ]
+    lines = [openings[level % 2].format(level) for level in range(depth)]
+    lines.append("YIELD;")
+    lines += ["}"] * depth
+    return "FSM nested() {\n" + "\n".join(lines) + "\n}\n"
+
+def generate_literal_heavy(statement_count:int, literal_length:int=200) -> str:
+    """FSM function whose statements are mostly long string and char literals"""
+    text = ("FSM IF (a) { WAIT(b); } // \\\" ;" * (literal_length // 30 + 1))[:literal_length]
+    if text.endswith("\\"):
+        text = text[:-1] + " "
+    lines = []
+    for i in range(statement_count):
+        lines.append("print(\"{0}\", '{1}', '\\'', \"{2}\");".format(text, chr(ord("a") + i % 26), i))
+        if i % 8 == 7:
+            lines.append("YIELD;")
+    return "FSM literal_heavy() {\n    " + "\n    ".join(lines) + "\n}\n"
+
+def generate_many_small(function_count:int) -> list[str]:
+    """many small FSM functions, each one is parsed separately"""
+    return [
+        "FSM small_{0}() {{ GLOBAL int count_{0} = 0; IF (ready_{0}()) {{ count_{0}++; YIELD; }} WAIT(10); }}".format(i)
+        for i in range(function_count)
+    ]
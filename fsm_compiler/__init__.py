@@ -1,3 +1,39 @@
-from .parser import CHARACTERS, parse_to_AST, generate_AST_from_code
-from .assembler import generate_FSM_from_AST, optimize_FSM
-from .code_gen import generate_code_from_FSM, generate_graphviz_dot_visualization_from_FSM, generate_mermaid_visualization_from_FSM
\ No newline at end of file
+import importlib
+
+# the modules are imported on first access of their names, so `import fsm_compiler` is cheap, e.g. for
+# the compile client, and generating the code of serialized FSMs does not import the parser and lark
+_LAZY_IMPORTS = {
+    "generate_FSM_from_AST": "assembler",
+    "optimize_FSM": "assembler",
+    "generate_code_from_FSM": "code_gen",
+    "generate_graphviz_dot_visualization_from_FSM": "code_gen",
+    "generate_mermaid_visualization_from_FSM": "code_gen",
+    "generate_code_from_graph": "code_gen",
+    "FSMGraph": "graph",
+    "CHARACTERS": "parser",
+    "parse_to_AST": "parser",
+    "generate_AST_from_code": "parser",
+    "ParseProfile": "parser",
+    "find_fsm_functions": "scanner",
+    "scan_fsm_file": "scanner",
+    "compile_fsm_file": "scanner",
+    "IncrementalCompiler": "scanner",
+    "CompileServer": "server",
+    "CompileClient": "client",
+}
+
+# the submodules, `fsm_compiler.ast_types` works without `import fsm_compiler.ast_types` like before the lazy imports
+_SUBMODULES = ["assembler", "ast_types", "cache", "client", "code_gen", "code_template", "graph", "parser", "scanner", "server"]
+
+# `from fsm_compiler import *` resolves the names through `__getattr__`
+__all__ = list(_LAZY_IMPORTS)
+
+def __getattr__(name:str):
+    if name in _LAZY_IMPORTS:
+        return getattr(importlib.import_module("." + _LAZY_IMPORTS[name], __name__), name)
+    if name in _SUBMODULES:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY_IMPORTS) | set(_SUBMODULES))
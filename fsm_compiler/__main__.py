@@ -0,0 +1,102 @@
+import sys
+import pathlib
+import argparse
+import logging
+logger = logging.getLogger(__name__)
+
+from .client import OUTPUT_KINDS, CompileClient, CompileServerError
+
+# the compile command with `--server` only imports the client, so it does not pay for importing lark
+
+def compile_files(args:argparse.Namespace) -> list[dict]:
+    """compile the files in this process, the functions are the ones of `CompileClient.compile()`"""
+    from .scanner import scan_fsm_file, compile_fsm_functions
+    from .server import generate_outputs
+    from . import cache
+
+    functions = []
+    for path in args.files:
+        for result in compile_fsm_functions(
+            scan_fsm_file(path), args.grammar, args.parser, args.optimization_level, cache.get_parse_result_cache()
+        ):
+            functions.append({
+                "function_name": result.source.function_name,
+                "line": result.source.line,
+                "outputs": generate_outputs(result.fsm, args.output),
+            })
+    return functions
+
+def compile_files_on_server(args:argparse.Namespace) -> list[dict]:
+    functions = []
+    with CompileClient(args.server) as client:
+        for path in args.files:
+            functions += client.compile(
+                path.read_text(encoding="utf-8"), args.optimization_level, args.output, args.grammar, args.parser
+            )
+    return functions
+
+def grammar_parser_pair(text:str) -> tuple[str, str]:
+    """argparse type of the `grammar:parser` pairs of the serve command, e.g. `basic:lalr`"""
+    from .parser import LARK_GRAMMARS # the serve command imports the parser anyway
+
+    grammar, separator, parser = text.partition(":")
+    if not separator or ":" in parser:
+        raise argparse.ArgumentTypeError("expecting grammar:parser, e.g. basic:lalr, got {!r}".format(text))
+    if parser not in ("earley", "lalr"):
+        raise argparse.ArgumentTypeError("unknown parser {!r}, expecting earley or lalr".format(parser))
+    if (grammar, parser) not in LARK_GRAMMARS:
+        raise argparse.ArgumentTypeError("unknown grammar and parser {!r}, expecting one of {}".format(
+            text, ", ".join("{}:{}".format(*pair) for pair in LARK_GRAMMARS)
+        ))
+    return grammar, parser
+
+def main(argv:list[str]|None=None) -> int:
+    argument_parser = argparse.ArgumentParser(prog="python -m fsm_compiler", description="compile the FSM functions of C/C++ files")
+    commands = argument_parser.add_subparsers(dest="command", required=True)
+
+    compile_command = commands.add_parser("compile", help="print the generated code of every FSM function of the files")
+    compile_command.add_argument("files", nargs="+", type=pathlib.Path)
+    compile_command.add_argument("-O", "--optimization-level", type=int, default=5, help="by default %(default)s")
+    compile_command.add_argument("--output", action="append", choices=OUTPUT_KINDS, 
+                                 help="the generated code, repeat it for more than one, by default cpp")
+    compile_command.add_argument("--grammar", default="basic", help="by default %(default)s")
+    compile_command.add_argument("--parser", default="earley", choices=("earley", "lalr"), help="by default %(default)s")
+    compile_command.add_argument("--server", type=pathlib.Path, help="compile on the compile server listening on this socket")
+
+    serve_command = commands.add_parser("serve", help="run the compile server until a shutdown request")
+    serve_command.add_argument("socket", type=pathlib.Path)
+    serve_command.add_argument("--parsers", nargs="+", type=grammar_parser_pair, default=[("basic", "earley")],
+                               help="grammar:parser pairs constructed before the first request, by default basic:earley")
+    args = argument_parser.parse_args(argv)
+    if args.command == "compile" and args.output is None:
+        args.output = ["cpp"]
+    if args.command == "compile" and args.server is None:
+        from .parser import LARK_GRAMMARS # the local compile imports the parser anyway, the server checks its own
+        if (args.grammar, args.parser) not in LARK_GRAMMARS:
+            argument_parser.error("unknown grammar and parser {}:{}, expecting one of {}".format(
+                args.grammar, args.parser, ", ".join("{}:{}".format(*pair) for pair in LARK_GRAMMARS)
+            ))
+
+    if args.command == "serve":
+        from .server import serve
+        from . import cache
+        serve(args.socket, tuple(args.parsers), cache.get_parse_result_cache())
+        return 0
+
+    if args.server is not None:
+        compile, errors = compile_files_on_server, (CompileServerError, OSError)
+    else:
+        from lark.exceptions import UnexpectedInput
+        compile, errors = compile_files, (UnexpectedInput, OSError)
+    try:
+        functions = compile(args)
+    except errors as e:
+        print(e, file=sys.stderr)
+        return 1
+    for function in functions:
+        for kind in args.output:
+            print(function["outputs"][kind])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import collections
 import logging
 logger = logging.getLogger(__name__)
 
@@ -16,26 +17,28 @@ def traverse_FSM(fsm_starting_node:FSMNode) -> set[FSMNode]:
     set[FSMNode]
         return a set of all accessible node
     """
-    ret_val: set[FSMNode] = set()
+    ret_val: set[FSMNode] = {fsm_starting_node}
     
-    search_queue: list[FSMNode] = []
-    
-    search_queue.append(fsm_starting_node)
+    # the nodes are added when they are queued, so each node is queued once
+    search_queue: collections.deque[FSMNode] = collections.deque([fsm_starting_node])
     while len(search_queue) != 0:
-        node_curr = search_queue.pop(0) 
-        
-        ret_val.add(node_curr)
+        node_curr = search_queue.popleft() 
         
         for transition in node_curr.transitions:
             node_next: FSMNode = transition.target_node
             
             if node_next not in ret_val:
+                ret_val.add(node_next)
                 search_queue.append(node_next)
     
     return ret_val
 
-def trace_back_transition(fsm_node: FSMNode, fsm_starting_node: FSMNode) -> list[FSMTransition]:
+def trace_back_transition(
+    fsm_node: FSMNode, fsm_starting_node: FSMNode, predecessors: "PredecessorIndex|None"=None
+) -> list[FSMTransition]:
     """get all transition to `fsm_node`
+    
+    Without `predecessors`, every transition of the fsm is scanned
 
     Parameters
     ----------
@@ -43,12 +46,16 @@ def trace_back_transition(fsm_node: FSMNode, fsm_starting_node: FSMNode) -> list
         the node that is being searched for transition
     fsm_starting_node : FSMNode
         the start of the fsm
+    predecessors : PredecessorIndex | None, optional
+        the index of the incoming transitions of the fsm, by default None
 
     Returns
     -------
     list[FSMTransition]
         a list of transition that targetted to the `fsm_node`. the order is random
     """
+    if predecessors is not None:
+        return predecessors.transitions_to(fsm_node)
                 
     return [
         transition
@@ -57,6 +64,140 @@ def trace_back_transition(fsm_node: FSMNode, fsm_starting_node: FSMNode) -> list
         if id(transition.target_node) == id(fsm_node)
     ]
     
+class PredecessorIndex():
+    """Incoming transitions of the nodes reachable from the starting node, see `trace_back_transition()`
+    
+    The index is built once, then the optimizations report their changes of the fsm, so a query is 
+    O(in-degree) instead of a traversal of the whole fsm:
+        - `retarget()` changes the target node of a transition
+        - `update_transitions()` after the transitions of a node are replaced, or changed in place
+    
+    The transitions are indexed by their lists, a list shared by two nodes counts its transitions twice, 
+    like `trace_back_transition()` without the index. A node without incoming transitions is not reachable 
+    anymore, so its transitions are removed too. The optimizations only bypass nodes, i.e. the predecessors 
+    of a removed node inherit its successors, so the removed nodes never form an unreachable cycle.
+    """
+    def __init__(self, fsm_starting_node:FSMNode):
+        self.starting_node = fsm_starting_node
+        self._incoming: dict[FSMNode, dict[FSMTransition, int]] = {}
+        self._node_transitions: dict[FSMNode, list[FSMTransition]] = {} # the indexed list of each reachable node
+        self._lists: dict[int, list] = {} # id of the list: [list, copy of the indexed transitions, count of nodes]
+        self._unreferenced: list[FSMNode] = []
+        
+        self._add_node(fsm_starting_node)
+    
+    def transitions_to(self, fsm_node:FSMNode) -> list[FSMTransition]:
+        """the transitions to the node, the order is random"""
+        incoming = self._incoming.get(fsm_node)
+        if incoming is None:
+            return []
+        return [transition for transition, count in incoming.items() for _ in range(count)]
+    
+    def in_degree(self, fsm_node:FSMNode) -> int:
+        incoming = self._incoming.get(fsm_node)
+        return 0 if incoming is None else sum(incoming.values())
+    
+    def retarget(self, transition:FSMTransition, target_node:FSMNode):
+        """change the target node of the transition"""
+        incoming = self._incoming.get(transition.target_node)
+        count = 0 if incoming is None else incoming.get(transition, 0)
+        if count > 0:
+            self._remove_transition(transition, count)
+        transition.target_node = target_node
+        if count > 0:
+            self._add_transition(transition, count)
+        self._remove_unreferenced()
+    
+    def update_transitions(self, fsm_node:FSMNode):
+        """index the transitions of the node, after `fsm_node.transitions` is replaced or changed in place"""
+        transitions_old = self._node_transitions.get(fsm_node)
+        if transitions_old is None:
+            return # not reachable
+        
+        # the transitions are added before the replaced ones are removed, so the nodes which are still reachable 
+        # are not removed in between
+        self._update_list(fsm_node.transitions)
+        if fsm_node.transitions is not transitions_old:
+            self._node_transitions[fsm_node] = fsm_node.transitions
+            self._add_list_reference(fsm_node.transitions)
+            self._update_list(transitions_old)
+            self._remove_list_reference(transitions_old)
+        self._remove_unreferenced()
+    
+    def _add_transition(self, transition:FSMTransition, count:int):
+        incoming = self._incoming.get(transition.target_node)
+        if incoming is None:
+            incoming = self._incoming[transition.target_node] = {}
+        incoming[transition] = incoming.get(transition, 0) + count
+        if transition.target_node not in self._node_transitions:
+            self._add_node(transition.target_node)
+    
+    def _remove_transition(self, transition:FSMTransition, count:int):
+        incoming = self._incoming[transition.target_node]
+        incoming[transition] -= count
+        if incoming[transition] == 0:
+            del incoming[transition]
+            if len(incoming) == 0:
+                del self._incoming[transition.target_node]
+                self._unreferenced.append(transition.target_node)
+    
+    def _add_node(self, fsm_node:FSMNode):
+        # the nodes are added with a stack, not recursively, since an fsm can be arbitrarily long
+        stack = [fsm_node]
+        while len(stack) != 0:
+            node = stack.pop()
+            if node in self._node_transitions:
+                continue
+            self._node_transitions[node] = node.transitions
+            
+            entry = self._lists.get(id(node.transitions))
+            if entry is None:
+                entry = self._lists[id(node.transitions)] = [node.transitions, list(node.transitions), 0]
+            entry[2] += 1
+            for transition in entry[1]:
+                incoming = self._incoming.get(transition.target_node)
+                if incoming is None:
+                    incoming = self._incoming[transition.target_node] = {}
+                incoming[transition] = incoming.get(transition, 0) + 1
+                if transition.target_node not in self._node_transitions:
+                    stack.append(transition.target_node)
+    
+    def _add_list_reference(self, transitions:list[FSMTransition]):
+        entry = self._lists.get(id(transitions))
+        if entry is None:
+            entry = self._lists[id(transitions)] = [transitions, list(transitions), 0]
+        entry[2] += 1
+        for transition in entry[1]:
+            self._add_transition(transition, 1)
+    
+    def _remove_list_reference(self, transitions:list[FSMTransition]):
+        entry = self._lists[id(transitions)]
+        entry[2] -= 1
+        for transition in entry[1]:
+            self._remove_transition(transition, 1)
+        if entry[2] == 0:
+            del self._lists[id(transitions)]
+    
+    def _update_list(self, transitions:list[FSMTransition]):
+        """index the changes of the list in place"""
+        entry = self._lists.get(id(transitions))
+        if entry is None or entry[1] == transitions:
+            return
+        indexed = collections.Counter(entry[1])
+        current = collections.Counter(transitions)
+        entry[1] = list(transitions)
+        for transition, count in (current - indexed).items():
+            self._add_transition(transition, count * entry[2])
+        for transition, count in (indexed - current).items():
+            self._remove_transition(transition, count * entry[2])
+    
+    def _remove_unreferenced(self):
+        while len(self._unreferenced) != 0:
+            node = self._unreferenced.pop()
+            if node is self.starting_node or node in self._incoming or node not in self._node_transitions:
+                continue
+            self._remove_list_reference(self._node_transitions.pop(node))
+
 def check_wait_statement_usage(fsm_starting_node: FSMNode) -> bool:
     """Check if WAIT(int ms) statement is used
     
@@ -120,13 +261,11 @@ def get_ending_node_of_FSM(fsm_starting_node:FSMNode) -> FSMNode|None:
     Returns
     -------
     FSMNode|None
-        return the ending node of ths fsm
+        return the ending node of ths fsm, the one with the lowest `node_id` if there are several
         return None if something is wrong
     """
-    for state in traverse_FSM(fsm_starting_node):
-        if len(state.transitions) == 0:
-            return state
-    return None
+    ending_nodes = [state for state in traverse_FSM(fsm_starting_node) if len(state.transitions) == 0]
+    return min(ending_nodes, key=lambda state: state.node_id, default=None)
     
 def generate_FSM_from_AST(parse_result: ParseResult, optimization_level:int=5) -> FSMMachine:
     """Generate fsm from parsed AST, and optimize the returning fsm
@@ -165,7 +304,7 @@ def generate_FSM_from_AST(parse_result: ParseResult, optimization_level:int=5) -
 #        Context-free Optimization Strategy          #
 # -------------------------------------------------- #
 
-def optimize_FSM_consecutive_states(fsm_starting_node:FSMNode) -> bool:
+def optimize_FSM_consecutive_states(fsm_starting_node:FSMNode, predecessors:PredecessorIndex|None=None) -> bool:
     """optimize consecutive states
     
     collapse if 
@@ -179,12 +318,16 @@ def optimize_FSM_consecutive_states(fsm_starting_node:FSMNode) -> bool:
     ----------
     fsm_starting_node : FSMNode
         Starting Node
+    predecessors : PredecessorIndex | None, optional
+        the incoming transitions of the fsm, the changes are reported to it, by default a new index
 
     Returns
     -------
     bool
         If the fsm is modified at all
     """
+    if predecessors is None:
+        predecessors = PredecessorIndex(fsm_starting_node)
     
     # implement fix-point algorithm
     
@@ -193,15 +336,12 @@ def optimize_FSM_consecutive_states(fsm_starting_node:FSMNode) -> bool:
         has_modified = False
         has_modified_master = False
         
-        searched_nodes: set[FSMNode] = set()
+        # the nodes are marked when they are queued, so each node is searched once
+        searched_nodes: set[FSMNode] = {fsm_starting_node}
     
-        search_queue: list[FSMNode] = []
-        
-        search_queue.append(fsm_starting_node)
+        search_queue: collections.deque[FSMNode] = collections.deque([fsm_starting_node])
         while len(search_queue) != 0:
-            node_curr = search_queue.pop(0) 
-            
-            searched_nodes.add(node_curr)
+            node_curr = search_queue.popleft() 
             
             # collapse if 
             #   - it only have one transition to next node, and
@@ -218,14 +358,11 @@ def optimize_FSM_consecutive_states(fsm_starting_node:FSMNode) -> bool:
                 assert len(transition.code_block) == 0 # the generated fsm will never have mealy transition
                 
                 if transition.condition == "" and node_next.collapsible:
-                    # collapse curr and next nodes
-                    if len(node_curr.code_block) == 0:
-                        node_curr.code_block = node_next.code_block
-                    else:
-                        if len(node_next.code_block) > 0:
-                            node_curr.code_block += node_next.code_block
+                    # collapse curr and next nodes, the concatenation of the code blocks is O(1)
+                    node_curr.code_block += node_next.code_block
                     
                     node_curr.transitions = node_next.transitions
+                    predecessors.update_transitions(node_curr)
                     
                     has_modified = True
                     has_modified_master = True
@@ -233,17 +370,19 @@ def optimize_FSM_consecutive_states(fsm_starting_node:FSMNode) -> bool:
                 
                 else: 
                     if node_next not in searched_nodes:
+                        searched_nodes.add(node_next)
                         search_queue.append(node_next)
             else:
                 for transition in node_curr.transitions:
                     node_next: FSMNode = transition.target_node
                     
                     if node_next not in searched_nodes:
+                        searched_nodes.add(node_next)
                         search_queue.append(node_next)
     
     return has_modified_master
     
-def optimize_FSM_chained_empty_state(fsm_starting_node:FSMNode) -> bool:
+def optimize_FSM_chained_empty_state(fsm_starting_node:FSMNode, predecessors:PredecessorIndex|None=None) -> bool:
     """optimize chained empty state
     
     collapse if
@@ -260,12 +399,16 @@ def optimize_FSM_chained_empty_state(fsm_starting_node:FSMNode) -> bool:
     ----------
     fsm_starting_node : FSMNode
         Starting Node
+    predecessors : PredecessorIndex | None, optional
+        the incoming transitions of the fsm, the changes are reported to it, by default a new index
 
     Returns
     -------
     bool
         If the fsm is modified at all
     """
+    if predecessors is None:
+        predecessors = PredecessorIndex(fsm_starting_node)
     
     # implement fix-point algorithm
     
@@ -274,15 +417,12 @@ def optimize_FSM_chained_empty_state(fsm_starting_node:FSMNode) -> bool:
         has_modified = False
         has_modified_master = False
         
-        searched_nodes: set[FSMNode] = set()
+        # the nodes are marked when they are queued, so each node is searched once
+        searched_nodes: set[FSMNode] = {fsm_starting_node}
     
-        search_queue: list[FSMNode] = []
-        
-        search_queue.append(fsm_starting_node)
+        search_queue: collections.deque[FSMNode] = collections.deque([fsm_starting_node])
         while len(search_queue) != 0:
-            node_curr = search_queue.pop(0) 
-            
-            searched_nodes.add(node_curr)
+            node_curr = search_queue.popleft() 
             
             # collapse if 
             #   - current node is collapsible
@@ -302,7 +442,7 @@ def optimize_FSM_chained_empty_state(fsm_starting_node:FSMNode) -> bool:
                 #   - the transition to next node does not have transition condition
                 #   - the next node does not have entry condition
                 
-                traced_back_transitions = trace_back_transition(node_curr, fsm_starting_node)
+                traced_back_transitions = trace_back_transition(node_curr, fsm_starting_node, predecessors)
                 transition: FSMTransition = node_curr.transitions[0]
                 node_next: FSMNode = transition.target_node
                 assert len(transition.code_block) == 0 # the generated fsm will never have mealy transition
@@ -315,7 +455,7 @@ def optimize_FSM_chained_empty_state(fsm_starting_node:FSMNode) -> bool:
                     and len(traced_back_transitions) == 1
                 ):
                     # collapse curr and next nodes
-                    traced_back_transitions[0].target_node = node_next
+                    predecessors.retarget(traced_back_transitions[0], node_next)
                     
                     has_modified = True
                     has_modified_master = True
@@ -323,17 +463,19 @@ def optimize_FSM_chained_empty_state(fsm_starting_node:FSMNode) -> bool:
                 
                 else: 
                     if node_next not in searched_nodes:
+                        searched_nodes.add(node_next)
                         search_queue.append(node_next)
             else:
                 for transition in node_curr.transitions:
                     node_next: FSMNode = transition.target_node
                     
                     if node_next not in searched_nodes:
+                        searched_nodes.add(node_next)
                         search_queue.append(node_next)
     
     return has_modified_master
 
-def optimize_FSM_chained_branching(fsm_starting_node:FSMNode) -> bool:
+def optimize_FSM_chained_branching(fsm_starting_node:FSMNode, predecessors:PredecessorIndex|None=None) -> bool:
     """optimize chained branching
     
     collapse if
@@ -354,12 +496,16 @@ def optimize_FSM_chained_branching(fsm_starting_node:FSMNode) -> bool:
     ----------
     fsm_starting_node : FSMNode
         Starting Node
+    predecessors : PredecessorIndex | None, optional
+        the incoming transitions of the fsm, the changes are reported to it, by default a new index
 
     Returns
     -------
     bool
         If the fsm is modified at all
     """
+    if predecessors is None:
+        predecessors = PredecessorIndex(fsm_starting_node)
     
     # implement fix-point algorithm
     
@@ -368,15 +514,12 @@ def optimize_FSM_chained_branching(fsm_starting_node:FSMNode) -> bool:
         has_modified = False
         has_modified_master = False
         
-        searched_nodes: set[FSMNode] = set()
+        # the nodes are marked when they are queued, so each node is searched once
+        searched_nodes: set[FSMNode] = {fsm_starting_node}
     
-        search_queue: list[FSMNode] = []
-        
-        search_queue.append(fsm_starting_node)
+        search_queue: collections.deque[FSMNode] = collections.deque([fsm_starting_node])
         while len(search_queue) != 0:
-            node_curr = search_queue.pop(0) 
-            
-            searched_nodes.add(node_curr)
+            node_curr = search_queue.popleft() 
             
             # collapse if 
             # - current has a else condition (the last transition without transition condition) to the next node
@@ -390,6 +533,7 @@ def optimize_FSM_chained_branching(fsm_starting_node:FSMNode) -> bool:
             elif len(node_curr.transitions) == 1:
                 node_next: FSMNode = node_curr.transitions[0].target_node
                 if node_next not in searched_nodes:
+                    searched_nodes.add(node_next)
                     search_queue.append(node_next)
             else:
                 if node_curr.transitions[-1].condition == "": # else statement
@@ -408,6 +552,7 @@ def optimize_FSM_chained_branching(fsm_starting_node:FSMNode) -> bool:
                     ):
                         node_curr.transitions.pop(-1)
                         node_curr.transitions += node_next.transitions
+                        predecessors.update_transitions(node_curr)
                         
                         has_modified = True
                         has_modified_master = True
@@ -416,11 +561,12 @@ def optimize_FSM_chained_branching(fsm_starting_node:FSMNode) -> bool:
                 for transition in node_curr.transitions:
                     node_next: FSMNode = transition.target_node
                     if node_next not in searched_nodes:
+                        searched_nodes.add(node_next)
                         search_queue.append(node_next)
     
     return has_modified_master
 
-def optimize_FSM_chained_merging(fsm_starting_node:FSMNode) -> bool:
+def optimize_FSM_chained_merging(fsm_starting_node:FSMNode, predecessors:PredecessorIndex|None=None) -> bool:
     """optimize chained merging
     
     WARNING, this might collapse uncollapsible nodes.
@@ -444,12 +590,16 @@ def optimize_FSM_chained_merging(fsm_starting_node:FSMNode) -> bool:
     ----------
     fsm_starting_node : FSMNode
         Starting Node
+    predecessors : PredecessorIndex | None, optional
+        the incoming transitions of the fsm, the changes are reported to it, by default a new index
 
     Returns
     -------
     bool
         If the fsm is modified at all
     """
+    if predecessors is None:
+        predecessors = PredecessorIndex(fsm_starting_node)
     
     # implement fix-point algorithm
     
@@ -458,15 +608,12 @@ def optimize_FSM_chained_merging(fsm_starting_node:FSMNode) -> bool:
         has_modified = False
         has_modified_master = False
         
-        searched_nodes: set[FSMNode] = set()
+        # the nodes are marked when they are queued, so each node is searched once
+        searched_nodes: set[FSMNode] = {fsm_starting_node}
     
-        search_queue: list[FSMNode] = []
-        
-        search_queue.append(fsm_starting_node)
+        search_queue: collections.deque[FSMNode] = collections.deque([fsm_starting_node])
         while len(search_queue) != 0:
-            node_curr = search_queue.pop(0) 
-            
-            searched_nodes.add(node_curr)
+            node_curr = search_queue.popleft() 
             
             # collapse if
             #     - current node has empty code block
@@ -498,22 +645,23 @@ def optimize_FSM_chained_merging(fsm_starting_node:FSMNode) -> bool:
                     and len(node_next.transitions) >= 1
                     and node_next.entry_condition == ""
                 ):
-                    back_transitions = trace_back_transition(node_curr, fsm_starting_node)
+                    back_transitions = trace_back_transition(node_curr, fsm_starting_node, predecessors)
                     
                     if len(back_transitions) > 0: 
                         # not starting node, by pass current node
                         for back_transition in back_transitions:
-                            back_transition.target_node = node_next
+                            predecessors.retarget(back_transition, node_next)
                         
                     else:
                         # this is the starting node, merge starting node and next node
                         node_curr.transitions = node_next.transitions
                         node_curr.collapsible = node_next.collapsible
                         node_curr.code_block = node_next.code_block
+                        predecessors.update_transitions(node_curr)
                         
-                        node_next_back_transitions = trace_back_transition(node_next, fsm_starting_node)
+                        node_next_back_transitions = trace_back_transition(node_next, fsm_starting_node, predecessors)
                         for back_transition in node_next_back_transitions:
-                            back_transition.target_node = node_curr
+                            predecessors.retarget(back_transition, node_curr)
                         
                     
                     has_modified = True
@@ -522,18 +670,20 @@ def optimize_FSM_chained_merging(fsm_starting_node:FSMNode) -> bool:
                 
                 else: 
                     if node_next not in searched_nodes:
+                        searched_nodes.add(node_next)
                         search_queue.append(node_next)
             else:
                 for transition in node_curr.transitions:
                     node_next: FSMNode = transition.target_node
                     
                     if node_next not in searched_nodes:
+                        searched_nodes.add(node_next)
                         search_queue.append(node_next)
     
     return has_modified_master
 
 
-def is_truly_collapsible(fsm_node:FSMNode, fsm_starting_node:FSMNode) -> bool:
+def is_truly_collapsible(fsm_node:FSMNode, fsm_starting_node:FSMNode, predecessors:PredecessorIndex|None=None) -> bool:
     """determine if the node is truly collapsible, ignore the collapsible field
 
     The node is collapsible if
@@ -549,13 +699,15 @@ def is_truly_collapsible(fsm_node:FSMNode, fsm_starting_node:FSMNode) -> bool:
         Determined Node
     fsm_starting_node : FSMNode
         Starting Node
+    predecessors : PredecessorIndex | None, optional
+        the incoming transitions of the fsm, by default None, i.e. the whole fsm is scanned
 
     Returns
     -------
     bool
         determine if the node is truly collapsible
     """
-    traced_back_transitions = trace_back_transition(fsm_node, fsm_starting_node)
+    traced_back_transitions = trace_back_transition(fsm_node, fsm_starting_node, predecessors)
     
     return (
         len(traced_back_transitions) == 1
@@ -566,7 +718,7 @@ def is_truly_collapsible(fsm_node:FSMNode, fsm_starting_node:FSMNode) -> bool:
     )
 
 
-def optimize_FSM_consecutive_uncollapsible_states(fsm_starting_node:FSMNode) -> bool:
+def optimize_FSM_consecutive_uncollapsible_states(fsm_starting_node:FSMNode, predecessors:PredecessorIndex|None=None) -> bool:
     """optimize consecutive uncollapsible states
     
     This optimization strategy is primary aim for less optimized structure created by BREAK, CONTINUE, 
@@ -594,12 +746,16 @@ def optimize_FSM_consecutive_uncollapsible_states(fsm_starting_node:FSMNode) ->
     ----------
     fsm_starting_node : FSMNode
         Starting Node
+    predecessors : PredecessorIndex | None, optional
+        the incoming transitions of the fsm, the changes are reported to it, by default a new index
 
     Returns
     -------
     bool
         If the fsm is modified at all
     """
+    if predecessors is None:
+        predecessors = PredecessorIndex(fsm_starting_node)
     
     # implement fix-point algorithm
     
@@ -608,15 +764,12 @@ def optimize_FSM_consecutive_uncollapsible_states(fsm_starting_node:FSMNode) ->
         has_modified = False
         has_modified_master = False
         
-        searched_nodes: set[FSMNode] = set()
+        # the nodes are marked when they are queued, so each node is searched once
+        searched_nodes: set[FSMNode] = {fsm_starting_node}
     
-        search_queue: list[FSMNode] = []
-        
-        search_queue.append(fsm_starting_node)
+        search_queue: collections.deque[FSMNode] = collections.deque([fsm_starting_node])
         while len(search_queue) != 0:
-            node_curr = search_queue.pop(0) 
-            
-            searched_nodes.add(node_curr)
+            node_curr = search_queue.popleft() 
             
             # collapse if 
             #   - it only have one transition to next node, and
@@ -632,15 +785,12 @@ def optimize_FSM_consecutive_uncollapsible_states(fsm_starting_node:FSMNode) ->
                 node_next: FSMNode = transition.target_node
                 assert len(transition.code_block) == 0 # the generated fsm will never have mealy transition
                 
-                if transition.condition == "" and is_truly_collapsible(node_next, fsm_starting_node):
-                    # collapse curr and next nodes
-                    if len(node_curr.code_block) == 0:
-                        node_curr.code_block = node_next.code_block
-                    else:
-                        if len(node_next.code_block) > 0:
-                            node_curr.code_block += node_next.code_block
+                if transition.condition == "" and is_truly_collapsible(node_next, fsm_starting_node, predecessors):
+                    # collapse curr and next nodes, the concatenation of the code blocks is O(1)
+                    node_curr.code_block += node_next.code_block
                     
                     node_curr.transitions = node_next.transitions
+                    predecessors.update_transitions(node_curr)
                     
                     has_modified = True
                     has_modified_master = True
@@ -648,18 +798,20 @@ def optimize_FSM_consecutive_uncollapsible_states(fsm_starting_node:FSMNode) ->
                 
                 else: 
                     if node_next not in searched_nodes:
+                        searched_nodes.add(node_next)
                         search_queue.append(node_next)
             else:
                 for transition in node_curr.transitions:
                     node_next: FSMNode = transition.target_node
                     
                     if node_next not in searched_nodes:
+                        searched_nodes.add(node_next)
                         search_queue.append(node_next)
     
     return has_modified_master
 
 
-def optimize_FSM_mealy_machine_conversion(fsm_starting_node:FSMNode) -> bool:
+def optimize_FSM_mealy_machine_conversion(fsm_starting_node:FSMNode, predecessors:PredecessorIndex|None=None) -> bool:
     """optimize Add Mealy transition to futher optimize fsm
     
     This optimization will add transition mealy transition, do not pass the resulting fsm to previous optimizers
@@ -677,12 +829,16 @@ def optimize_FSM_mealy_machine_conversion(fsm_starting_node:FSMNode) -> bool:
     ----------
     fsm_starting_node : FSMNode
         Starting Node
+    predecessors : PredecessorIndex | None, optional
+        the incoming transitions of the fsm, the changes are reported to it, by default a new index
 
     Returns
     -------
     bool
         If the fsm is modified at all
     """
+    if predecessors is None:
+        predecessors = PredecessorIndex(fsm_starting_node)
     
     # implement fix-point algorithm
     
@@ -691,15 +847,12 @@ def optimize_FSM_mealy_machine_conversion(fsm_starting_node:FSMNode) -> bool:
         has_modified = False
         has_modified_master = False
         
-        searched_nodes: set[FSMNode] = set()
+        # the nodes are marked when they are queued, so each node is searched once
+        searched_nodes: set[FSMNode] = {fsm_starting_node}
     
-        search_queue: list[FSMNode] = []
-        
-        search_queue.append(fsm_starting_node)
+        search_queue: collections.deque[FSMNode] = collections.deque([fsm_starting_node])
         while len(search_queue) != 0:
-            node_curr = search_queue.pop(0) 
-            
-            searched_nodes.add(node_curr)
+            node_curr = search_queue.popleft() 
             
             # collapse if 
             # - the next node is truely collapsible
@@ -714,7 +867,7 @@ def optimize_FSM_mealy_machine_conversion(fsm_starting_node:FSMNode) -> bool:
                 for transition in node_curr.transitions:
                     node_next: FSMNode = transition.target_node
                     
-                    traced_back_transitions = trace_back_transition(node_next, fsm_starting_node)
+                    traced_back_transitions = trace_back_transition(node_next, fsm_starting_node, predecessors)
     
                     if (
                         len(node_next.transitions) == 1
@@ -723,13 +876,14 @@ def optimize_FSM_mealy_machine_conversion(fsm_starting_node:FSMNode) -> bool:
                         and id(node_next) != id(fsm_starting_node)
                     ):
                         transition.code_block += node_next.code_block
-                        transition.target_node = node_next.transitions[0].target_node
+                        predecessors.retarget(transition, node_next.transitions[0].target_node)
                         
                         has_modified = True
                         has_modified_master = True
                         break
                     else:
                         if node_next not in searched_nodes:
+                            searched_nodes.add(node_next)
                             search_queue.append(node_next)
     
     return has_modified_master
@@ -748,12 +902,15 @@ OPTIMIZATION_STRATEGIES = {
 }
     
 def optimize_FSM(fsm_starting_node:FSMNode, opt_level:int=5) -> None:
+    # the optimizations share the index of the incoming transitions, and keep it up to date
+    predecessors = PredecessorIndex(fsm_starting_node)
+    
     opt_level_moore = min(opt_level, 5)
     is_changed = True
     while (is_changed):
         is_changed = False
         for level in range(1, opt_level_moore + 1):
-            while OPTIMIZATION_STRATEGIES[level](fsm_starting_node):
+            while OPTIMIZATION_STRATEGIES[level](fsm_starting_node, predecessors):
                 is_changed = True
 
     # level 10 and above
@@ -762,5 +919,5 @@ def optimize_FSM(fsm_starting_node:FSMNode, opt_level:int=5) -> None:
     while (is_changed):
         is_changed = False
         for level in range(10, opt_level_mealy + 1):
-            while OPTIMIZATION_STRATEGIES[level](fsm_starting_node):
+            while OPTIMIZATION_STRATEGIES[level](fsm_starting_node, predecessors):
                 is_changed = True
\ No newline at end of file
@@ -1,11 +1,18 @@
+import sys
+import itertools
 import logging
 logger = logging.getLogger(__name__)
 
-from dataclasses import dataclass
-
-import lark
+from dataclasses import dataclass, field
+from collections.abc import Iterable, Sequence
+from typing import TYPE_CHECKING
 
 from . import code_template
+
+if TYPE_CHECKING:
+    # the statements only reference the lark AST, so the FSM types, the assembler and the code generators 
+    # are importable without lark
+    import lark
     
 PRETTY_PRINT_INDENTATION_WIDTH = 2
 
@@ -19,32 +26,139 @@ def __get_indentation(indentation:int) -> str:
 class FSMTransition:    # forward declaration
     pass
 
-@dataclass
+class CodeBlock(Sequence):
+    """Immutable lines of code of a node or a transition, a rope of the lines
+    
+    `block + other` is O(1), the result references both blocks instead of copying their lines, so collapsing 
+    a chain of n nodes is O(n) and never modifies a block shared by another node. The lines are flattened 
+    once, when they are first read, i.e. when the code is emitted. The blocks are compared by their lines.
+    """
+    __slots__ = ("_lines", "_parts", "_length")
+    
+    def __init__(self, lines:Iterable[str]=()):
+        self._lines = tuple(lines)
+        self._parts = None
+        self._length = len(self._lines)
+    
+    @classmethod
+    def of(cls, code_block:Iterable[str]) -> "CodeBlock":
+        """the code block itself, or a code block of the lines"""
+        return code_block if isinstance(code_block, CodeBlock) else cls(code_block)
+    
+    @property
+    def lines(self) -> tuple[str, ...]:
+        """the flattened lines, the concatenated blocks are walked with an explicit stack"""
+        if self._lines is None:
+            lines = []
+            stack = [self]
+            while stack:
+                block = stack.pop()
+                if block._lines is not None:
+                    lines += block._lines
+                else:
+                    left, right = block._parts
+                    stack.append(right)
+                    stack.append(left)
+            self._lines = tuple(lines)
+            self._parts = None
+        return self._lines
+    
+    def __add__(self, other:Iterable[str]) -> "CodeBlock":
+        if type(other) is not CodeBlock:
+            other = CodeBlock.of(other)
+        if other._length == 0:
+            return self
+        if self._length == 0:
+            return other
+        block = object.__new__(CodeBlock)
+        block._lines = None
+        block._parts = (self, other)
+        block._length = self._length + other._length
+        return block
+    
+    def __radd__(self, other:Iterable[str]) -> "CodeBlock":
+        return CodeBlock.of(other) + self
+    
+    def __len__(self) -> int:
+        return self._length
+    
+    def __iter__(self):
+        return iter(self.lines)
+    
+    def __getitem__(self, index):
+        return self.lines[index]
+    
+    def __eq__(self, value:object) -> bool:
+        if not isinstance(value, CodeBlock):
+            return NotImplemented
+        return self is value or (self._length == value._length and self.lines == value.lines)
+    
+    def __hash__(self) -> int:
+        return hash(self.lines)
+    
+    def __repr__(self) -> str:
+        return "CodeBlock({!r})".format(list(self.lines))
+    
+    def __reduce__(self):
+        # flattened, pickling the nested blocks of a long chain would exceed the recursion limit
+        return (CodeBlock, (self.lines,))
+
+# the nodes and transitions are compared and hashed by identity (`eq=False` keeps the ones of `object`), 
+# the optimizations keep them in sets and dicts. They are slotted, a raw FSM has several nodes per statement.
+# The code blocks are `CodeBlock`s, a list is converted on construction. A list assigned later is accepted too,
+# the readers convert it by `CodeBlock.of()`
+
+_node_serial_numbers = itertools.count()
+
+def _set_pickled_state(fsm_object:"FSMNode|FSMTransition", state:dict|tuple) -> dict:
+    """`__setstate__` of the slotted FSM classes, return the fields of the state
+
+    The state is `(None, fields)` as the classes are slotted. The pickles of the previous releases, whose 
+    classes were not slotted, have the `__dict__` of the object instead, and a list as code block.
+    """
+    if isinstance(state, tuple):
+        _, state = state
+    for name, value in state.items():
+        object.__setattr__(fsm_object, name, value)
+    fsm_object.code_block = CodeBlock.of(fsm_object.code_block)
+    return state
+
+@dataclass(eq=False, slots=True)
 class FSMNode():
-    """if `entry_condition` is "", then it will never prevent from entry"""
-    code_block: list[str]
+    """if `entry_condition` is "", then it will never prevent from entry
+    
+    `node_id` names the node in the generated code and the visualizations. `lower_to_fsm()` numbers the nodes 
+    from 0 in the order they are created, so the same source always gets the same ids. Until then, the id is 
+    a serial number, which is unique in the process.
+    """
+    code_block: CodeBlock
     transitions: list[FSMTransition]
     collapsible: bool = True # invariant: if this node is pointed by multiple nodes, then this one is not collapsible
     entry_condition: str = ""
+    node_id: int = field(default_factory=_node_serial_numbers.__next__)
     
-    def __hash__(self):
-        return id(self)
+    def __post_init__(self):
+        if type(self.code_block) is not CodeBlock:
+            self.code_block = CodeBlock(self.code_block)
     
-    def __eq__(self, value: object) -> bool:
-        return id(self) == id(value)
+    def __setstate__(self, state:dict|tuple):
+        if "node_id" not in _set_pickled_state(self, state):
+            # pickled before the node ids
+            self.node_id = next(_node_serial_numbers)
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class FSMTransition:
     """if `condition` is "", then it will always transition"""
-    code_block: list[str]
+    code_block: CodeBlock
     condition: str
     target_node: FSMNode
     
-    def __hash__(self):
-        return id(self)
+    def __post_init__(self):
+        if type(self.code_block) is not CodeBlock:
+            self.code_block = CodeBlock(self.code_block)
     
-    def __eq__(self, value: object) -> bool:
-        return id(self) == id(value)
+    def __setstate__(self, state:dict|tuple):
+        _set_pickled_state(self, state)
 
 @dataclass
 class FSMGlobalVar:
@@ -72,11 +186,87 @@ class TO_FSM_Return:
 #                        AST                         #
 # -------------------------------------------------- #
 
+@dataclass(frozen=True, slots=True)
+class SourceSpan():
+    """position of a statement in the source code, offsets are 0-based, lines and columns are 1-based"""
+    start_pos: int
+    end_pos: int
+    line: int
+    column: int
+    end_line: int
+    end_column: int
+    
+    @classmethod
+    def from_meta(cls, meta:"lark.tree.Meta") -> "SourceSpan":
+        return cls(meta.start_pos, meta.end_pos, meta.line, meta.column, meta.end_line, meta.end_column)
+
+class SourceText():
+    """text of the source code, `source[start_pos:end_pos]`, which is copied only when it is converted to str
+
+    All the text of the statements reference the same source code. The text compares equal to the
+    str of the same content, and it is converted to str by `str()` and `format()`.
+    """
+    __slots__ = ("source", "start_pos", "end_pos")
+
+    def __init__(self, source:str, start_pos:int, end_pos:int):
+        self.source = source
+        self.start_pos = start_pos
+        self.end_pos = end_pos
+
+    def __str__(self) -> str:
+        return self.source[self.start_pos : self.end_pos]
+
+    def __format__(self, format_spec:str) -> str:
+        return format(str(self), format_spec)
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+    def __len__(self) -> int:
+        return self.end_pos - self.start_pos
+
+    def __bool__(self) -> bool:
+        return self.end_pos > self.start_pos
+
+    def __contains__(self, value:str) -> bool:
+        return self.source.find(value, self.start_pos, self.end_pos) != -1
+
+    def __eq__(self, value:object) -> bool:
+        if isinstance(value, str):
+            return len(value) == len(self) and self.source.startswith(value, self.start_pos, self.end_pos)
+        if isinstance(value, SourceText):
+            return len(value) == len(self) and str(self) == str(value)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+def intern_text(text:str|SourceText) -> str:
+    """the interned str of `text`, the identical code and conditions of the FSMs share one str
+    
+    The same conditions, e.g. `a == 0`, and the generated `__IS_TIME_PASSED(...)` repeat many times in 
+    the FSMs, so the text is interned when it is converted to str by lowering the statements to FSM.
+    """
+    return sys.intern(str(text))
+
 @dataclass
 class Statement():
-    lark_ast: lark.Tree
+    lark_ast: "lark.Tree|None" = field(compare=False) # the raw AST is not a part of the statement's value, it is None in lean mode
+    span: SourceSpan|None = field(default=None, compare=False, kw_only=True)
     
     def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
+        return lower_to_fsm(self, fsm_name)
+    
+    def sub_statements(self) -> list["Statement"]:
+        """nested statements, they are lowered to FSM before this statement"""
+        return []
+    
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
+        """lower this statement to FSM, `sub_fsm` is the FSM of `sub_statements()` in the same order
+        
+        The global variables are collected by `lower_to_fsm()`, so a statement only returns the global 
+        variables declared by itself.
+        """
         return None
     
     def print_pretty(self, indentation:int=0) -> str:
@@ -84,10 +274,10 @@ class Statement():
 
 @dataclass
 class StatementLine(Statement):
-    block: str
+    block: str|SourceText
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
-        node = FSMNode(["{};".format(self.block)], [])
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
+        node = FSMNode([intern_text("{};".format(self.block))], [])
         return TO_FSM_Return(node, node, [], [], [], [])
     
     def print_pretty(self, indentation:int=0) -> str:
@@ -95,10 +285,10 @@ class StatementLine(Statement):
     
 @dataclass
 class StatementOrdinary(Statement):
-    block: str
+    block: str|SourceText
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
-        node = FSMNode([self.block], [])
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
+        node = FSMNode([intern_text(self.block)], [])
         return TO_FSM_Return(node, node, [], [], [], [])
     
     def print_pretty(self, indentation:int=0) -> str:
@@ -108,33 +298,24 @@ class StatementOrdinary(Statement):
 class StatementBlock(Statement):
     lines: list[Statement]
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
+    def sub_statements(self) -> list[Statement]:
+        return self.lines
+    
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
         node_start = FSMNode([], [])
-        ret_global_vars = []
-        
-        ret_return_nodes = []
-        ret_break_nodes = []
-        ret_continue_nodes = []
         
         node_end = node_start
-        for line in self.lines:
-            
-            # process statements
-            fsm_return_statement = line.to_fsm(fsm_name)
-
-            ret_global_vars    += fsm_return_statement.global_variables
-            ret_return_nodes   += fsm_return_statement.return_nodes
-            ret_break_nodes    += fsm_return_statement.break_nodes
-            ret_continue_nodes += fsm_return_statement.continue_nodes
-                
+        for fsm_return_statement in sub_fsm:
             # add basic transitions       
             node_end.transitions.append(FSMTransition([], "", fsm_return_statement.starting_node))
             
             node_end = fsm_return_statement.ending_node
             
         return TO_FSM_Return(
-            node_start, node_end, ret_global_vars, 
-            ret_return_nodes, ret_break_nodes, ret_continue_nodes
+            node_start, node_end, [], 
+            merge_fsm_nodes([fsm.return_nodes for fsm in sub_fsm]),
+            merge_fsm_nodes([fsm.break_nodes for fsm in sub_fsm]),
+            merge_fsm_nodes([fsm.continue_nodes for fsm in sub_fsm])
         )
             
     
@@ -143,22 +324,20 @@ class StatementBlock(Statement):
     
 @dataclass 
 class StatementWhile(Statement):
-    condition: str
+    condition: str|SourceText
     statements: Statement
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
+    def sub_statements(self) -> list[Statement]:
+        return [self.statements]
+    
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
         node_start = FSMNode([], [], False)
         node_end = FSMNode([], [])
-        ret_global_vars = []
-        ret_return_nodes = []
         
-        # process on all statements
-        fsm_return_statement = self.statements.to_fsm(fsm_name)
-        ret_global_vars  += fsm_return_statement.global_variables
-        ret_return_nodes += fsm_return_statement.return_nodes
+        fsm_return_statement, = sub_fsm
         
         # add basic transitions       
-        node_start.transitions.append(FSMTransition([], self.condition, fsm_return_statement.starting_node))
+        node_start.transitions.append(FSMTransition([], intern_text(self.condition), fsm_return_statement.starting_node))
         node_start.transitions.append(FSMTransition([], "", node_end))
         
         # Capture CONTINUE and BREAK statement
@@ -181,7 +360,7 @@ class StatementWhile(Statement):
         
         fsm_return_statement.ending_node.transitions.append(FSMTransition([], "", node_start))
         
-        return TO_FSM_Return(node_start, node_end, ret_global_vars, ret_return_nodes, [], [])
+        return TO_FSM_Return(node_start, node_end, [], fsm_return_statement.return_nodes, [], [])
         
     
     def print_pretty(self, indentation:int=0) -> str:
@@ -189,24 +368,22 @@ class StatementWhile(Statement):
  
 @dataclass 
 class StatementDoWhile(Statement):
-    condition: str
+    condition: str|SourceText
     statements: Statement
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
+    def sub_statements(self) -> list[Statement]:
+        return [self.statements]
+    
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
         node_start = FSMNode([], [], False)
         node_end = FSMNode([], [])
-        ret_global_vars = []
-        ret_return_nodes = []
         
-        # process on all statements
-        fsm_return_statement = self.statements.to_fsm(fsm_name)
-        ret_global_vars  += fsm_return_statement.global_variables
-        ret_return_nodes += fsm_return_statement.return_nodes
+        fsm_return_statement, = sub_fsm
                 
         # add basic transitions       
         node_start.transitions.append(FSMTransition([], "", fsm_return_statement.starting_node))
         
-        fsm_return_statement.ending_node.transitions.append(FSMTransition([], self.condition, node_start))
+        fsm_return_statement.ending_node.transitions.append(FSMTransition([], intern_text(self.condition), node_start))
         fsm_return_statement.ending_node.transitions.append(FSMTransition([], "", node_end))
         
         # Capture CONTINUE and BREAK statement
@@ -227,7 +404,7 @@ class StatementDoWhile(Statement):
             # multiple node will point to end node, then the end node will be uncollapsible
             node_end.collapsible = False
             
-        return TO_FSM_Return(node_start, node_end, ret_global_vars, ret_return_nodes, [], [])
+        return TO_FSM_Return(node_start, node_end, [], fsm_return_statement.return_nodes, [], [])
     
     def print_pretty(self, indentation:int=0) -> str:
         pass
@@ -235,36 +412,26 @@ class StatementDoWhile(Statement):
 @dataclass
 class StatementFor(Statement):
     initialization: Statement
-    condition: str
+    condition: str|SourceText
     update: Statement
     statements: Statement
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
+    def sub_statements(self) -> list[Statement]:
+        return [self.initialization, self.update, self.statements]
+    
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
         node_start = FSMNode([], [])
         
         node_loop_start = FSMNode([], [], False)
         node_end = FSMNode([], [])
-        ret_global_vars = []
-        ret_return_nodes = []
-        
-        # process on all statements
-        fsm_return_initialization = self.initialization.to_fsm(fsm_name)
-        ret_global_vars += fsm_return_initialization.global_variables
-        ret_return_nodes += fsm_return_initialization.return_nodes
-                
-        fsm_return_update = self.update.to_fsm(fsm_name)
-        ret_global_vars += fsm_return_update.global_variables
-        ret_return_nodes += fsm_return_update.return_nodes
         
-        fsm_return_statement = self.statements.to_fsm(fsm_name)
-        ret_global_vars  += fsm_return_statement.global_variables
-        ret_return_nodes += fsm_return_statement.return_nodes
+        fsm_return_initialization, fsm_return_update, fsm_return_statement = sub_fsm
         
         # add basic transitions       
         node_start.transitions.append(FSMTransition([], "", fsm_return_initialization.starting_node))
         fsm_return_initialization.ending_node.transitions.append(FSMTransition([], "", node_loop_start))
         
-        node_loop_start.transitions.append(FSMTransition([], self.condition, fsm_return_statement.starting_node))
+        node_loop_start.transitions.append(FSMTransition([], intern_text(self.condition), fsm_return_statement.starting_node))
         node_loop_start.transitions.append(FSMTransition([], "", node_end))
         
         fsm_return_statement.ending_node.transitions.append(FSMTransition([], "", fsm_return_update.starting_node))
@@ -309,7 +476,8 @@ class StatementFor(Statement):
             # multiple node will point to end node, then the end node will be uncollapsible
             node_end.collapsible = False
         
-        return TO_FSM_Return(node_start, node_end, ret_global_vars, ret_return_nodes, [], [])
+        ret_return_nodes = merge_fsm_nodes([fsm.return_nodes for fsm in sub_fsm])
+        return TO_FSM_Return(node_start, node_end, [], ret_return_nodes, [], [])
     
     def print_pretty(self, indentation:int=0) -> str:
         pass
@@ -317,60 +485,56 @@ class StatementFor(Statement):
 @dataclass
 class IfCase():
     """ indicating else case when condition == "" """
-    condition: str
+    condition: str|SourceText
     statements: Statement
 
 @dataclass
 class StatementIf(Statement):
     cases: list[IfCase]
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
+    def sub_statements(self) -> list[Statement]:
+        return [case.statements for case in self.cases]
+    
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
         node_start = FSMNode([], [])
         node_end = FSMNode([], [], False)
-        ret_global_vars = []
-        
-        ret_return_nodes = []
-        ret_break_nodes = []
-        ret_continue_nodes = []
         
         is_else_case_avaliable = False
         
-        for case in self.cases:
+        for case, fsm_return_statement in zip(self.cases, sub_fsm):
             if case.condition == "":
                 # this is else case
                 is_else_case_avaliable = True
             
-            fsm_return_statement = case.statements.to_fsm(fsm_name)
-            ret_global_vars    += fsm_return_statement.global_variables
-            ret_return_nodes   += fsm_return_statement.return_nodes
-            ret_break_nodes    += fsm_return_statement.break_nodes
-            ret_continue_nodes += fsm_return_statement.continue_nodes        
-                    
-                    
-            node_start.transitions.append(FSMTransition([], case.condition, fsm_return_statement.starting_node))
+            node_start.transitions.append(FSMTransition([], intern_text(case.condition), fsm_return_statement.starting_node))
             fsm_return_statement.ending_node.transitions.append(FSMTransition([], "", node_end))
             
         if not is_else_case_avaliable: 
             node_start.transitions.append(FSMTransition([], "", node_end))
         
-        return TO_FSM_Return(node_start, node_end, ret_global_vars, ret_return_nodes, ret_break_nodes, ret_continue_nodes)
+        return TO_FSM_Return(
+            node_start, node_end, [], 
+            merge_fsm_nodes([fsm.return_nodes for fsm in sub_fsm]),
+            merge_fsm_nodes([fsm.break_nodes for fsm in sub_fsm]),
+            merge_fsm_nodes([fsm.continue_nodes for fsm in sub_fsm])
+        )
     
     def print_pretty(self, indentation:int=0) -> str:
         pass
 
 @dataclass
 class StatementDeclaration(Statement):
-    datatype: str
-    variable: str
+    datatype: str|SourceText
+    variable: str|SourceText
     make_global: bool = False
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
         if self.make_global:
             node = FSMNode([], [])
-            global_var = FSMGlobalVar(self.datatype, self.variable)
+            global_var = FSMGlobalVar(intern_text(self.datatype), intern_text(self.variable))
             return TO_FSM_Return(node, node, [global_var], [], [], [])
         else:
-            node = FSMNode([code_template.DECLARE_LOCAL_VARIABLE(self.datatype, self.variable)], [])
+            node = FSMNode([intern_text(code_template.DECLARE_LOCAL_VARIABLE(self.datatype, self.variable))], [])
             return TO_FSM_Return(node, node, [], [], [], [])
     
     def print_pretty(self, indentation:int=0) -> str:
@@ -378,18 +542,18 @@ class StatementDeclaration(Statement):
 
 @dataclass
 class StatementDeclarationInit(Statement):
-    datatype: str
-    variable: str
-    expression: str
+    datatype: str|SourceText
+    variable: str|SourceText
+    expression: str|SourceText
     make_global: bool = False
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
         if self.make_global:
-            node = FSMNode([code_template.LOCAL_VARIABLE_ASSIGNMENT(self.variable, self.expression)], [])
-            global_var = FSMGlobalVar(self.datatype, self.variable)
+            node = FSMNode([intern_text(code_template.LOCAL_VARIABLE_ASSIGNMENT(self.variable, self.expression))], [])
+            global_var = FSMGlobalVar(intern_text(self.datatype), intern_text(self.variable))
             return TO_FSM_Return(node, node, [global_var], [], [], [])
         else:
-            node = FSMNode([code_template.DECLARE_LOCAL_VARIABLE_INIT(self.datatype, self.variable, self.expression)], [])
+            node = FSMNode([intern_text(code_template.DECLARE_LOCAL_VARIABLE_INIT(self.datatype, self.variable, self.expression))], [])
             return TO_FSM_Return(node, node, [], [], [], [])
     
     def print_pretty(self, indentation:int=0) -> str:
@@ -398,9 +562,9 @@ class StatementDeclarationInit(Statement):
 @dataclass
 class StatementWait(Statement):
     """ set `wait_time_ms` to "" to indicate YIELD """
-    wait_time_ms: str
+    wait_time_ms: str|SourceText
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
         fsm_name = "" if fsm_name is None else fsm_name
         
         if self.wait_time_ms == "":
@@ -410,8 +574,8 @@ class StatementWait(Statement):
             return TO_FSM_Return(node, node, [], [], [], [])
         else:
             # WAIT statement
-            node_register_time = FSMNode([code_template.REGISTER_TIME(fsm_name)], [])
-            node_entry_until = FSMNode([], [], False, code_template.IS_TIME_PASSED(fsm_name, self.wait_time_ms))
+            node_register_time = FSMNode([intern_text(code_template.REGISTER_TIME(fsm_name))], [])
+            node_entry_until = FSMNode([], [], False, intern_text(code_template.IS_TIME_PASSED(fsm_name, self.wait_time_ms)))
             
             node_register_time.transitions.append(FSMTransition([], "", node_entry_until))
             
@@ -423,10 +587,10 @@ class StatementWait(Statement):
 
 @dataclass
 class StatementWaitUnless(Statement):
-    condition: str  
+    condition: str|SourceText  
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
-        node = FSMNode([], [], False, self.condition)
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
+        node = FSMNode([], [], False, intern_text(self.condition))
         return TO_FSM_Return(node, node, [], [], [], [])
     
     def print_pretty(self, indentation:int=0) -> str:
@@ -435,7 +599,7 @@ class StatementWaitUnless(Statement):
 @dataclass
 class StatementBreak(Statement): 
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
         node = FSMNode([], [])
         return TO_FSM_Return(node, node, [], [], [node], [])
     
@@ -444,7 +608,7 @@ class StatementBreak(Statement):
     
 class StatementContinue(Statement): 
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
         node = FSMNode([], [])
         return TO_FSM_Return(node, node, [], [], [], [node])
     
@@ -453,7 +617,7 @@ class StatementContinue(Statement):
     
 class StatementReturn(Statement): 
     
-    def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
         node = FSMNode([], [])
         return TO_FSM_Return(node, node, [], [node], [], [])
     
@@ -466,6 +630,9 @@ class ParseResult(Statement):
     function_name: str
     statements: StatementBlock
     
+    def sub_statements(self) -> list[Statement]:
+        return [self.statements]
+    
     def to_fsm(self, fsm_name:str|None=None) -> TO_FSM_Return:
         """Generate Raw FSM
 
@@ -487,16 +654,13 @@ class ParseResult(Statement):
             - break_nodes: list[FSMNode] <- This should be empty
             - continue_nodes: list[FSMNode] <- This should be empty
         """
-        
-        fsm_name = self.function_name
-        
+        return lower_to_fsm(self, self.function_name)
+    
+    def combine_fsm(self, fsm_name:str|None, sub_fsm:list[TO_FSM_Return]) -> TO_FSM_Return:
         node_start = FSMNode([], [], False)
         node_end = FSMNode([], [], False) 
-        ret_global_vars = []
-        
-        fsm_return_statement = self.statements.to_fsm(fsm_name)
-        ret_global_vars += fsm_return_statement.global_variables
         
+        fsm_return_statement, = sub_fsm
             
         node_start.transitions.append(FSMTransition([], "", fsm_return_statement.starting_node))
         fsm_return_statement.ending_node.transitions.append(FSMTransition([], "", node_end))
@@ -523,7 +687,79 @@ class ParseResult(Statement):
                 return_node.transitions.append(FSMTransition([], "", node_end))     
             
         
-        return TO_FSM_Return(node_start, node_end, ret_global_vars, [], [], [])
+        return TO_FSM_Return(node_start, node_end, [], [], [], [])
     
     def print_pretty(self, indentation:int=0) -> str:
         pass
+
+# -------------------------------------------------- #
+#                   AST to FSM                       #
+# -------------------------------------------------- #
+
+def merge_fsm_nodes(node_lists:list[list[FSMNode]]) -> list[FSMNode]:
+    """concatenate the lists of nodes into the longest one, the order of the nodes is not kept
+    
+    The lists are only passed up to the outer statements, so reusing the longest list keeps the 
+    lowering linear for deeply nested statements.
+    """
+    ret = max(node_lists, key=len, default=[])
+    for nodes in node_lists:
+        if nodes is not ret:
+            ret += nodes
+    return ret
+
+def lower_to_fsm(statement:Statement, fsm_name:str|None=None) -> TO_FSM_Return:
+    """lower the statement to FSM with an explicit stack instead of recursion
+    
+    The statements are lowered in post-order, so the nesting depth is not limited by the recursion limit.  
+    The global variables of all the nested statements are returned by the outermost statement, in the 
+    order of the source code.
+    """
+    global_variables = []
+    results = []
+    stack = [(statement, False)]
+    while stack:
+        stmt, is_expanded = stack.pop()
+        sub_statements = stmt.sub_statements()
+        
+        if not is_expanded and sub_statements:
+            stack.append((stmt, True))
+            stack.extend((sub_stmt, False) for sub_stmt in reversed(sub_statements))
+            continue
+        
+        if sub_statements:
+            sub_fsm = results[-len(sub_statements):]
+            del results[-len(sub_statements):]
+        else:
+            sub_fsm = []
+            
+        fsm_return = stmt.combine_fsm(fsm_name, sub_fsm)
+        global_variables += fsm_return.global_variables
+        results.append(fsm_return)
+    
+    fsm_return, = results
+    fsm_return.global_variables = global_variables
+    number_fsm_nodes([
+        fsm_return.starting_node, fsm_return.ending_node, 
+        *fsm_return.return_nodes, *fsm_return.break_nodes, *fsm_return.continue_nodes
+    ])
+    return fsm_return
+
+def number_fsm_nodes(fsm_nodes:list[FSMNode]):
+    """number the nodes reachable from `fsm_nodes` from 0, in the order of their serial numbers, i.e. the order
+    they are created"""
+    nodes = []
+    visited = set()
+    for fsm_node in fsm_nodes:
+        if fsm_node not in visited:
+            visited.add(fsm_node)
+            nodes.append(fsm_node)
+    for node in nodes:
+        for transition in node.transitions:
+            if transition.target_node not in visited:
+                visited.add(transition.target_node)
+                nodes.append(transition.target_node)
+    
+    nodes.sort(key=lambda node: node.node_id)
+    for node_id, node in enumerate(nodes):
+        node.node_id = node_id
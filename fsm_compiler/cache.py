@@ -0,0 +1,414 @@
+import io
+import os
+import sys
+import types
+import pickle
+import importlib
+import pathlib
+import hashlib
+import tempfile
+import threading
+import functools
+import zlib
+import logging
+logger = logging.getLogger(__name__)
+
+import lark
+from lark.parsers import lalr_analysis
+
+from .ast_types import ParseResult
+
+# -------------------------------------------------- #
+#                  Cache Directory                   #
+# -------------------------------------------------- #
+
+ENV_CACHE_DIR = "FSM_COMPILER_CACHE_DIR"
+ENV_DISABLE_CACHE = "FSM_COMPILER_DISABLE_CACHE"
+
+CACHE_DIR_NAME = "fsm_compiler"
+GRAMMAR_CACHE_SUBDIR = "grammars"
+GRAMMAR_CACHE_FORMAT = 3
+PARSE_CACHE_SUBDIR = "parse_results"
+PARSE_CACHE_FORMAT = 1
+PARSE_CACHE_MAX_SIZE = 64 * 2**20 # bytes
+
+def get_cache_dir() -> pathlib.Path|None:
+    """Get the directory of the persistent cache
+
+    The directory is resolved in following order:
+        1. `$FSM_COMPILER_CACHE_DIR`, project or build specific cache directory
+        2. `$XDG_CACHE_HOME/fsm_compiler`
+        3. `~/.cache/fsm_compiler`
+
+    The cache files are pickles, and unpickling a file can execute arbitrary code, so the cache directory 
+    must only be writable by the current user. The missing directories are created readable and writable 
+    by the owner only, and the files which are not owned by the current user are never loaded, see 
+    `read_cache_file()`. Do not point `$FSM_COMPILER_CACHE_DIR` or `$XDG_CACHE_HOME` to a directory 
+    shared with other users.
+
+    Returns
+    -------
+    pathlib.Path|None
+        the cache directory, it might not exist yet.
+        return None if the cache is disabled by `$FSM_COMPILER_DISABLE_CACHE`
+    """
+    if os.environ.get(ENV_DISABLE_CACHE, "") not in ("", "0"):
+        return None
+
+    if os.environ.get(ENV_CACHE_DIR):
+        return pathlib.Path(os.environ[ENV_CACHE_DIR])
+
+    if os.environ.get("XDG_CACHE_HOME"):
+        return pathlib.Path(os.environ["XDG_CACHE_HOME"]) / CACHE_DIR_NAME
+
+    return pathlib.Path.home() / ".cache" / CACHE_DIR_NAME
+
+def make_private_dir(path:pathlib.Path):
+    """create the directory and its missing parents, accessible by the owner only (mode 0o700)"""
+    missing = []
+    while not path.exists():
+        missing.append(path)
+        path = path.parent
+    for directory in reversed(missing):
+        directory.mkdir(mode=0o700, exist_ok=True)
+
+def read_cache_file(path:pathlib.Path) -> bytes:
+    """read the cache file, raise PermissionError if the file is not owned by the current user
+
+    The cache files are unpickled, which can execute arbitrary code, so only the files of the current user 
+    are trusted. The owner is checked on the opened file, so the file cannot be swapped after the check.
+    """
+    with open(path, "rb") as f:
+        if hasattr(os, "getuid") and os.fstat(f.fileno()).st_uid != os.getuid():
+            raise PermissionError("{} is not owned by the current user".format(path))
+        return f.read()
+
+def write_cache_file_atomic(path:pathlib.Path, data:bytes) -> bool:
+    """write the cache file, so that concurrent readers never see a partial file
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        destination of the cache file
+    data : bytes
+        content of the cache file
+
+    Returns
+    -------
+    bool
+        If the file is written
+    """
+    try:
+        make_private_dir(path.parent)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        logger.warning("Failed to write cache file %s: %s", path, e)
+        return False
+
+    return True
+
+# -------------------------------------------------- #
+#                   Grammar Cache                    #
+# -------------------------------------------------- #
+
+def _option_fingerprint(value) -> str:
+    """stable representation of a lark option, objects (e.g. transformers) are represented by their types"""
+    if value is None or isinstance(value, (str, int, float, bool, list, tuple)):
+        return repr(value)
+    if isinstance(value, type):
+        return "{}.{}".format(value.__module__, value.__qualname__)
+    return "{}.{}".format(type(value).__module__, type(value).__qualname__)
+
+def grammar_cache_key(grammar_text:str, **options) -> str:
+    """Key of the cached grammar
+
+    The key depends on the cache format, grammar file, lark version, python version and lark options
+
+    Parameters
+    ----------
+    grammar_text : str
+        content of the grammar file
+
+    Returns
+    -------
+    str
+        sha256 hex digest
+    """
+    hasher = hashlib.sha256()
+    hasher.update(str(GRAMMAR_CACHE_FORMAT).encode("utf-8"))
+    hasher.update(grammar_text.encode("utf-8"))
+    hasher.update(lark.__version__.encode("utf-8"))
+    hasher.update(repr(sys.version_info[:2]).encode("utf-8"))
+    hasher.update(repr(sorted((k, _option_fingerprint(v)) for k, v in options.items())).encode("utf-8"))
+    return hasher.hexdigest()
+
+class _LarkPickler(pickle.Pickler):
+    """Pickler of the constructed lark parser
+    
+    The lark parser keeps a reference to the regular expression module (`re` or `regex`), 
+    which is pickled by name and re-imported during unpickling.
+    
+    The LALR parse table compares the actions (`Shift` and `Reduce`) by identity, 
+    so the actions are pickled as references to the singletons.
+    """
+    def reducer_override(self, obj):
+        if isinstance(obj, types.ModuleType):
+            return importlib.import_module, (obj.__name__,)
+        if isinstance(obj, lalr_analysis.Action):
+            return getattr, (lalr_analysis, obj.name)
+        return NotImplemented
+
+def dump_lark_parser(parser:lark.Lark) -> bytes:
+    """serialize the constructed lark parser, including the analyzed grammar and parser tables"""
+    buffer = io.BytesIO()
+    _LarkPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(parser)
+    return buffer.getvalue()
+
+def load_lark_parser(grammar_path:pathlib.Path, cache_dir:pathlib.Path|None=None, **options) -> lark.Lark:
+    """Construct the lark parser, reuse the constructed parser from the persistent cache when possible
+
+    Constructing a parser parses the EBNF grammar, compiles the rules and terminals, and analyzes 
+    the grammar for the parsing algorithm. The constructed `lark.Lark` is pickled into the cache 
+    directory, and it will be reused by the future processes.
+
+    Parameters
+    ----------
+    grammar_path : pathlib.Path
+        path of the `.lark` grammar file
+    cache_dir : pathlib.Path | None, optional
+        the cache directory, by default None, i.e. `get_cache_dir()`
+    **options
+        options passed to `lark.Lark`
+
+    Returns
+    -------
+    lark.Lark
+        the constructed parser
+    """
+    grammar_path = pathlib.Path(grammar_path)
+    with open(grammar_path, "r") as f:
+        grammar_text = f.read()
+
+    cache_dir = get_cache_dir() if cache_dir is None else pathlib.Path(cache_dir)
+    if cache_dir is None:
+        return lark.Lark(grammar_text, **options)
+
+    cache_file = cache_dir / GRAMMAR_CACHE_SUBDIR / "{}-{}.pickle".format(
+        grammar_path.stem, grammar_cache_key(grammar_text, **options)
+    )
+
+    try:
+        parser = pickle.loads(read_cache_file(cache_file))
+        if isinstance(parser, lark.Lark):
+            return parser
+        logger.warning("Unexpected grammar cache content %s", cache_file)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # corrupted, incompatible or untrusted cache, rebuild it
+        logger.warning("Failed to load grammar cache %s: %s", cache_file, e)
+
+    parser = lark.Lark(grammar_text, **options)
+    
+    try:
+        write_cache_file_atomic(cache_file, dump_lark_parser(parser))
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        logger.warning("Failed to serialize the parser of %s: %s", grammar_path, e)
+
+    return parser
+
+# -------------------------------------------------- #
+#                 Parse Result Cache                 #
+# -------------------------------------------------- #
+
+@functools.lru_cache(maxsize=None)
+def file_digest(path:pathlib.Path) -> str:
+    """sha256 hex digest of the file content, the files are hashed once per process"""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+@functools.lru_cache(maxsize=1)
+def package_fingerprint() -> str:
+    """sha256 hex digest of the source code of this package
+    
+    The package has no version number, so the digest of its modules stands in for the package version. 
+    It changes whenever the statements, or the way they are built, changes.
+    """
+    hasher = hashlib.sha256()
+    for path in sorted(pathlib.Path(__file__).parent.glob("*.py")):
+        hasher.update(path.name.encode("utf-8"))
+        hasher.update(file_digest(path).encode("utf-8"))
+    return hasher.hexdigest()
+
+class ParseResultCache():
+    """Persistent cache of the parse results, keyed by the source code, grammar and package
+    
+    The parse results are lean, i.e. without the lark AST, and stored as compressed pickles, one file per 
+    result. A hit updates the modification time of the file, and the least recently used files are 
+    evicted when the total size exceeds `max_size`.
+    
+    The total size is scanned from the directory by the first `store()`, and then kept up to date by 
+    `store()` and `evict()`, so the directory is only scanned again when the total exceeds `max_size`. 
+    The files stored by other processes are counted by the next scan.
+    
+    `hits`, `misses` and `evictions` count the lookups and evicted files of this instance, see `stats()`.
+    """
+    def __init__(self, cache_dir:pathlib.Path, max_size:int=PARSE_CACHE_MAX_SIZE):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_size = max_size
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size: int|None = None # the total size of the files, None until the directory is scanned
+        self._lock = threading.Lock()
+    
+    def key(self, source:str, grammar_paths:pathlib.Path|list[pathlib.Path], parser:str) -> str:
+        """Key of the parse result
+
+        The key depends on the cache format, source code, grammar files, parsing algorithm, package, 
+        lark version and python version
+
+        Parameters
+        ----------
+        source : str
+            the parsed C/C++ code
+        grammar_paths : pathlib.Path | list[pathlib.Path]
+            path of the `.lark` grammar file, or the paths of every grammar file loaded by the parsing, 
+            see `parser.get_grammar_paths()`
+        parser : str
+            parsing algorithm, "earley" or "lalr"
+
+        Returns
+        -------
+        str
+            sha256 hex digest
+        """
+        hasher = hashlib.sha256()
+        hasher.update(str(PARSE_CACHE_FORMAT).encode("utf-8"))
+        if isinstance(grammar_paths, (str, pathlib.Path)):
+            grammar_paths = [grammar_paths]
+        for grammar_path in grammar_paths:
+            hasher.update(file_digest(pathlib.Path(grammar_path)).encode("utf-8"))
+        hasher.update(parser.encode("utf-8"))
+        hasher.update(package_fingerprint().encode("utf-8"))
+        hasher.update(lark.__version__.encode("utf-8"))
+        hasher.update(repr(sys.version_info[:2]).encode("utf-8"))
+        hasher.update(source.encode("utf-8"))
+        return hasher.hexdigest()
+    
+    def path(self, key:str) -> pathlib.Path:
+        return self.cache_dir / PARSE_CACHE_SUBDIR / "{}.pickle".format(key)
+    
+    def load(self, key:str) -> ParseResult|None:
+        """the cached parse result, return None on a miss"""
+        path = self.path(key)
+        try:
+            parse_result = pickle.loads(zlib.decompress(read_cache_file(path)))
+            if not isinstance(parse_result, ParseResult):
+                raise TypeError("unexpected content {}".format(type(parse_result).__name__))
+            os.utime(path) # the file is recently used
+        except FileNotFoundError:
+            parse_result = None
+        except Exception as e:
+            # corrupted, incompatible or untrusted cache, it will be replaced
+            logger.warning("Failed to load parse result cache %s: %s", path, e)
+            parse_result = None
+        
+        with self._lock:
+            if parse_result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return parse_result
+    
+    def store(self, key:str, parse_result:ParseResult) -> bool:
+        """cache the lean parse result, and evict the least recently used results if the cache is full
+
+        Returns
+        -------
+        bool
+            If the parse result is cached
+        """
+        assert parse_result.lark_ast is None, "only the lean parse results are cached"
+        try:
+            data = zlib.compress(pickle.dumps(parse_result, protocol=pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, TypeError, RecursionError) as e:
+            logger.warning("Failed to serialize the parse result of %s: %s", parse_result.function_name, e)
+            return False
+        
+        path = self.path(key)
+        try:
+            replaced_size = path.stat().st_size
+        except OSError:
+            replaced_size = 0
+        if not write_cache_file_atomic(path, data):
+            return False
+        
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data) - replaced_size
+            full = self._size is None or self._size > self.max_size
+        if full:
+            self.evict()
+        return True
+    
+    def evict(self) -> int:
+        """delete the least recently used results until the cache fits in `max_size`, return the number of deleted files
+        
+        The directory is scanned, and the total size of the remaining files is kept for `store()`.
+        """
+        files = []
+        for path in (self.cache_dir / PARSE_CACHE_SUBDIR).glob("*.pickle"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue # deleted by another process
+            files.append((stat.st_mtime, stat.st_size, path))
+        
+        total_size = sum(size for _, size, _ in files)
+        evictions = 0
+        for _, size, path in sorted(files):
+            if total_size <= self.max_size:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            total_size -= size
+            evictions += 1
+        
+        with self._lock:
+            self.evictions += evictions
+            self._size = total_size
+        return evictions
+    
+    def stats(self) -> dict[str, int]:
+        """the counters, e.g. for logging"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+_PARSE_RESULT_CACHE: ParseResultCache|None = None
+
+def get_parse_result_cache() -> ParseResultCache|None:
+    """the parse result cache of this process, in the cache directory
+
+    Returns
+    -------
+    ParseResultCache|None
+        the parse result cache, return None if the cache is disabled, see `get_cache_dir()`
+    """
+    global _PARSE_RESULT_CACHE
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return None
+    if _PARSE_RESULT_CACHE is None or _PARSE_RESULT_CACHE.cache_dir != cache_dir:
+        _PARSE_RESULT_CACHE = ParseResultCache(cache_dir)
+    return _PARSE_RESULT_CACHE
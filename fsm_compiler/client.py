@@ -0,0 +1,105 @@
+import json
+import socket
+import pathlib
+import logging
+logger = logging.getLogger(__name__)
+
+# the client only depends on the standard library, so it is started in a few milliseconds, and the
+# compile server keeps lark, the parsers and the compile results warm
+
+OUTPUT_KINDS = ("cpp", "graphviz", "mermaid")
+
+class CompileServerError(RuntimeError):
+    """the compile server failed the request, e.g. the FSM function is not parsed"""
+
+class CompileClient():
+    """Client of the compile server, see `server.CompileServer`
+
+    The requests and responses are JSON objects, one per line, over a Unix domain socket. The
+    connection is opened on the first request, and it is kept open for the following requests, so a
+    request is a single round trip. A client is used by one thread at a time.
+    """
+    def __init__(self, socket_path:str|pathlib.Path, timeout:float|None=None):
+        self.socket_path = str(socket_path)
+        self.timeout = timeout
+        self._socket: socket.socket|None = None
+        self._file = None
+
+    def __enter__(self) -> "CompileClient":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+            self._socket = self._file = None
+
+    def request(self, request:dict) -> dict:
+        """send the request, return the response, raise CompileServerError if the request failed"""
+        if self._socket is None:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                connection.settimeout(self.timeout)
+                connection.connect(self.socket_path)
+            except OSError:
+                connection.close()
+                raise
+            self._socket, self._file = connection, connection.makefile("rwb")
+
+        self._file.write(json.dumps(request).encode("utf-8") + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            self.close()
+            raise ConnectionError("the compile server closed the connection")
+
+        response = json.loads(line)
+        if "error" in response:
+            raise CompileServerError(response["error"])
+        return response
+
+    def compile(
+        self, source:str, optimization_level:int=5, outputs:list[str]|tuple[str, ...]=("cpp",),
+        grammar:str="basic", parser:str="earley"
+    ) -> list[dict]:
+        """Compile every FSM function of the C/C++ source on the server
+
+        Parameters
+        ----------
+        source : str
+            the C/C++ source, e.g. the content of a file
+        optimization_level : int, optional
+            optimization level of the FSM, by default 5
+        outputs : list[str] | tuple[str, ...], optional
+            the generated code of each function, any of "cpp", "graphviz" and "mermaid", by default ("cpp",)
+        grammar : str, optional
+            "basic", "experimental" or "coarse", by default "basic"
+        parser : str, optional
+            parsing algorithm, "earley" or "lalr", by default "earley"
+
+        Returns
+        -------
+        list[dict]
+            one dict per FSM function, in the order of the source, with the "function_name", the "line"
+            of the function, and the "outputs", i.e. the generated code of each output kind
+        """
+        return self.request({
+            "command": "compile",
+            "source": source,
+            "optimization_level": optimization_level,
+            "outputs": list(outputs),
+            "grammar": grammar,
+            "parser": parser,
+        })["functions"]
+
+    def stats(self) -> dict[str, int]:
+        """the counters of the server, e.g. the compiled and the memoized functions"""
+        return self.request({"command": "stats"})["stats"]
+
+    def shutdown(self):
+        """stop the server after this request"""
+        self.request({"command": "shutdown"})
+        self.close()
@@ -4,6 +4,7 @@ logger = logging.getLogger(__name__)
 from .ast_types import *
 from . import assembler
 from . import code_template
+from .graph import FSMGraph
 
 from dataclasses import dataclass
 
@@ -39,7 +40,7 @@ def fsm_to_mermaid(fsm_starting_node:FSMNode, debug:bool=False, global_variables
     str
         return a string that illustrate the fsm in mermaid 
     """
-    states = assembler.traverse_FSM(fsm_starting_node)
+    states = sorted(assembler.traverse_FSM(fsm_starting_node), key=lambda state: state.node_id)
     
     ret_val = "```mermaid\nflowchart TB\n"
     
@@ -53,13 +54,13 @@ def fsm_to_mermaid(fsm_starting_node:FSMNode, debug:bool=False, global_variables
         if state.entry_condition == "":
             if len(state.code_block) == 0:
                 ret_val += '   {}{}_{}\n'.format(
-                    id(state), 
+                    state.node_id, 
                     state_shape[0], 
                     state_shape[1]
                 ) 
             else:
                 ret_val += '   {}{}"`{}`"{}\n'.format(
-                    id(state), 
+                    state.node_id, 
                     state_shape[0], 
                     purge_code_as_mermaid_commend("\n".join(state.code_block)), 
                     state_shape[1]
@@ -67,14 +68,14 @@ def fsm_to_mermaid(fsm_starting_node:FSMNode, debug:bool=False, global_variables
         else:
             if len(state.code_block) == 0:
                 ret_val += '   {}{}"`ENTRY: {}`"{}\n'.format(
-                    id(state), 
+                    state.node_id, 
                     state_shape[0], 
                     purge_code_as_mermaid_commend(state.entry_condition), 
                     state_shape[1]
                 ) 
             else:
                 ret_val += '   {}{}"`ENTRY: {}\n{}`"{}\n'.format(
-                    id(state), 
+                    state.node_id, 
                     state_shape[0], 
                     purge_code_as_mermaid_commend(state.entry_condition), 
                     purge_code_as_mermaid_commend("\n".join(state.code_block)), 
@@ -87,28 +88,28 @@ def fsm_to_mermaid(fsm_starting_node:FSMNode, debug:bool=False, global_variables
             if transition.condition == "":
                 if len(transition.code_block) == 0:
                     ret_val += '   {} --> {}\n'.format(
-                        id(state), 
-                        id(transition.target_node)
+                        state.node_id, 
+                        transition.target_node.node_id
                     ) 
                 else:
                     ret_val += '   {} -->|"`*------*\n{}`"| {}\n'.format(
-                        id(state), 
+                        state.node_id, 
                         purge_code_as_mermaid_commend("\n".join(transition.code_block)), 
-                        id(transition.target_node)
+                        transition.target_node.node_id
                     ) 
             else: 
                 if len(transition.code_block) == 0:
                     ret_val += '   {} -->|"`{}`"| {}\n'.format(
-                        id(state), 
+                        state.node_id, 
                         purge_code_as_mermaid_commend(transition.condition), 
-                        id(transition.target_node)
+                        transition.target_node.node_id
                     ) 
                 else:
                     ret_val += '   {} -->|"`{}\n*------*\n{}`"| {}\n'.format(
-                        id(state), 
+                        state.node_id, 
                         purge_code_as_mermaid_commend(transition.condition), 
                         purge_code_as_mermaid_commend("\n".join(transition.code_block)), 
-                        id(transition.target_node)
+                        transition.target_node.node_id
                     ) 
                     
     if global_variables is not None:
@@ -150,9 +151,9 @@ def fsm_to_graphviz_dot(fsm_starting_node:FSMNode, debug:bool=False, global_vari
         return a string that illustrate the fsm in graphviz, using DOT language 
     """
     
-    STATE_LABEL = lambda node: "s{}".format(id(node))
+    STATE_LABEL = lambda node: "s{}".format(node.node_id)
     
-    states = assembler.traverse_FSM(fsm_starting_node)
+    states = sorted(assembler.traverse_FSM(fsm_starting_node), key=lambda state: state.node_id)
     
     ret_val = "digraph {\n"
     
@@ -260,83 +261,90 @@ def generate_code_from_FSM(
     str
         C/C++ Code
     """    
+    return generate_code_from_graph(
+        FSMGraph.from_fsm(fsm), generate_fix_iteration_function, generate_minimum_timed_function
+    )
+
+def generate_code_from_graph(
+    graph:FSMGraph, 
+    generate_fix_iteration_function:bool=True, 
+    generate_minimum_timed_function:bool=True,
+) -> str:
+    """Generate Code from Given FSM graph, see `generate_code_from_FSM()`
     
-    state_to_int:dict[FSMNode, int] = {}
-    
-    starting_state = fsm.starting_node
-    ending_state = assembler.get_ending_node_of_FSM(starting_state)
-    
-    states = assembler.traverse_FSM(starting_state)
-    
-    state_counter = 10
-    for state in states:
-        if state == starting_state:
-            state_to_int[state] = 0
-        elif state == ending_state:
-            state_to_int[state] = 1
-        else:
-            state_to_int[state] = state_counter
-            state_counter += 1
-    
-    # sort the list of state by the numbers
-    states_list: list[tuple[int, FSMNode]] = [
-        (state_number, state)
-        for state, state_number in state_to_int.items()
-    ]
-    states_list.sort(key=lambda elmt: elmt[0])
-    
+    The states are generated in the order of their state numbers, ordered by `FSMNode.node_id` (lowering 
+    order), see `FSMGraph.state_numbers()`.
+
+    Parameters
+    ----------
+    graph : FSMGraph
+        Finite State Machine graph, see `FSMGraph.from_fsm()`
+    generate_fix_iteration_function : bool, optional
+        The FSM entry point that run the FSM for given fix number of times, 
+        by default True
+    generate_minimum_timed_function : bool, optional
+        The FSM entry that run the FSM for minimum given millisecond, 
+        by default True
+
+    Returns
+    -------
+    str
+        C/C++ Code
+    """
+    state_numbers = graph.state_numbers()
+    conditions, code_blocks = graph.conditions, graph.code_blocks
     
     # generate global statements
     global_stmt:list[code_template.CPP_CODE_RenderingTemplate] = []
     
-    for gvar in fsm.global_variables:
+    for gvar in graph.global_variables:
         global_stmt.append(
             code_template.CPP_CODE_GlobalStatements(code_template.DECLARE_GLOBAL_VARIABLE(gvar.var_type, gvar.var_name))
         )
         
-    for code_line in fsm.global_code_block:
+    for code_line in graph.global_code_block:
         global_stmt.append(
             code_template.CPP_CODE_GlobalStatements(code_line)
         )
     
-    # generate state statements
+    # generate state statements, sorted by the state numbers
     states_stmt:list[code_template.CPP_CODE_RenderingTemplate] = []
     
-    for _, state in states_list:
+    for node_id in sorted(range(graph.node_count), key=state_numbers.__getitem__):
         
         # generate state transition statements
         transitions_stmt:list[code_template.CPP_CODE_RenderingTemplate] = []
-        for transition in state.transitions:
+        for transition in graph.transitions(node_id):
             transitions_stmt.append(
                 code_template.CPP_CODE_Transition(
-                    transition.condition, 
-                    transition.code_block, 
-                    state_to_int[transition.target_node],
-                    fsm.fsm_name
+                    conditions[graph.transition_condition[transition]], 
+                    code_blocks[graph.transition_code_block[transition]], 
+                    state_numbers[graph.transition_target[transition]],
+                    graph.fsm_name
                 )
             )
             
         states_stmt.append(
             code_template.CPP_CODE_States(
-                state_to_int[state],
-                state.code_block, 
-                state.entry_condition, 
+                state_numbers[node_id],
+                code_blocks[graph.node_code_block[node_id]], 
+                conditions[graph.node_entry_condition[node_id]], 
                 transitions_stmt, 
-                fsm.fsm_name
+                graph.fsm_name
             )
         )
         
     aux_function_stms: list[code_template.CPP_CODE_RenderingTemplate] = []
     
     if generate_fix_iteration_function:
-        aux_function_stms.append(code_template.CPP_CODE_CppFunction_EntryFixedIteration(fsm.fsm_name))
+        aux_function_stms.append(code_template.CPP_CODE_CppFunction_EntryFixedIteration(graph.fsm_name))
     
     if generate_minimum_timed_function:
-        aux_function_stms.append(code_template.CPP_CODE_CppFunction_MinimumTimeIteration(fsm.fsm_name))
+        aux_function_stms.append(code_template.CPP_CODE_CppFunction_MinimumTimeIteration(graph.fsm_name))
         
     # generate fsm function
     cpp_function = code_template.CPP_CODE_CppFunction(
-        states_stmt, global_stmt, fsm.fsm_name, aux_function_stms
+        states_stmt, global_stmt, graph.fsm_name, aux_function_stms
     )
     
     return cpp_function.render()
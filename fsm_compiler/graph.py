@@ -0,0 +1,283 @@
+import array
+import itertools
+import logging
+logger = logging.getLogger(__name__)
+
+from dataclasses import dataclass, field
+
+from .ast_types import *
+from . import code_template
+
+# The FSM of `FSMNode`s is a graph of Python objects, every pass over it chases the pointers of
+# `FSMNode.transitions[*].target_node` and hashes the nodes. `FSMGraph` is the same FSM with integer
+# node ids and the transitions in CSR (compressed sparse row) arrays, so the analyses of large FSMs
+# are scans of flat arrays.
+
+def _index_array(values=()) -> array.array:
+    return array.array("l", values)
+
+class _TextTable():
+    """the distinct texts and their ids, id 0 is the empty text"""
+    __slots__ = ("texts", "ids")
+
+    def __init__(self, empty):
+        self.texts = [empty]
+        self.ids = {empty: 0}
+
+    def get_id(self, text) -> int:
+        text_id = self.ids.get(text)
+        if text_id is None:
+            text_id = self.ids[text] = len(self.texts)
+            self.texts.append(text)
+        return text_id
+
+@dataclass
+class FSMGraph():
+    """FSM with integer node ids and CSR transition arrays, see `FSMGraph.from_fsm()` and `FSMGraph.to_fsm()`
+
+    - The nodes are numbered in the breadth-first order from the starting node, which is node 0, and the
+      transitions of each node in their order. So the ids only depend on the structure of the FSM, and
+      the graphs of two equivalent FSMs are equal. The `FSMNode.node_id` of each node is kept in `node_ids`,
+      it orders the states in the generated code.
+    - The transitions of node `n` are `transition_offsets[n]` to `transition_offsets[n + 1] - 1`. They are
+      in the order of their priority: the first transition whose condition holds is taken.
+    - The conditions and the code blocks are stored once in `conditions` and `code_blocks`, and referenced
+      by their ids. Id 0 is the empty condition "" and the empty code block.
+    """
+    fsm_name: str
+    global_variables: list[FSMGlobalVar]
+    global_code_block: list[str]
+
+    conditions: list[str] = field(default_factory=lambda: [""])
+    code_blocks: list[tuple[str, ...]] = field(default_factory=lambda: [()])
+
+    node_code_block: array.array = field(default_factory=_index_array)
+    node_entry_condition: array.array = field(default_factory=_index_array)
+    node_collapsible: bytearray = field(default_factory=bytearray)
+    node_ids: array.array = field(default_factory=_index_array)
+
+    transition_offsets: array.array = field(default_factory=lambda: _index_array([0]))
+    transition_target: array.array = field(default_factory=_index_array)
+    transition_condition: array.array = field(default_factory=_index_array)
+    transition_code_block: array.array = field(default_factory=_index_array)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_code_block)
+
+    @property
+    def transition_count(self) -> int:
+        return len(self.transition_target)
+
+    @classmethod
+    def from_fsm(cls, fsm:FSMMachine) -> "FSMGraph":
+        """Convert the FSM, the nodes which are not reachable from the starting node are dropped
+
+        Parameters
+        ----------
+        fsm : FSMMachine
+            the FSM, it is not modified
+
+        Returns
+        -------
+        FSMGraph
+            the graph of the FSM
+        """
+        # number the nodes in the breadth-first order
+        nodes = [fsm.starting_node]
+        node_ids = {fsm.starting_node: 0}
+        for node in nodes:
+            for transition in node.transitions:
+                if transition.target_node not in node_ids:
+                    node_ids[transition.target_node] = len(nodes)
+                    nodes.append(transition.target_node)
+
+        conditions = _TextTable("")
+        code_blocks = _TextTable(())
+        graph = cls(fsm.fsm_name, list(fsm.global_variables), list(fsm.global_code_block))
+        for node in nodes:
+            graph.node_code_block.append(code_blocks.get_id(CodeBlock.of(node.code_block).lines))
+            graph.node_entry_condition.append(conditions.get_id(node.entry_condition))
+            graph.node_collapsible.append(node.collapsible)
+            graph.node_ids.append(node.node_id)
+            for transition in node.transitions:
+                graph.transition_target.append(node_ids[transition.target_node])
+                graph.transition_condition.append(conditions.get_id(transition.condition))
+                graph.transition_code_block.append(code_blocks.get_id(CodeBlock.of(transition.code_block).lines))
+            graph.transition_offsets.append(len(graph.transition_target))
+
+        graph.conditions = conditions.texts
+        graph.code_blocks = code_blocks.texts
+        return graph
+
+    def to_fsm(self) -> FSMMachine:
+        """Convert the graph to an FSM of new `FSMNode`s and `FSMTransition`s
+
+        Returns
+        -------
+        FSMMachine
+            the FSM, `FSMGraph.from_fsm(graph.to_fsm()) == graph`
+        """
+        conditions, code_blocks = self.conditions, self.code_blocks
+        nodes = [
+            FSMNode(CodeBlock(code_blocks[code_block_id]), [], bool(collapsible), conditions[condition_id], node_id)
+            for code_block_id, condition_id, collapsible, node_id in zip(
+                self.node_code_block, self.node_entry_condition, self.node_collapsible, self.node_ids
+            )
+        ]
+        offsets = self.transition_offsets
+        for node_id, node in enumerate(nodes):
+            node.transitions = [
+                FSMTransition(
+                    CodeBlock(code_blocks[self.transition_code_block[transition]]),
+                    conditions[self.transition_condition[transition]],
+                    nodes[self.transition_target[transition]]
+                )
+                for transition in range(offsets[node_id], offsets[node_id + 1])
+            ]
+
+        return FSMMachine(list(self.global_variables), list(self.global_code_block), nodes[0], self.fsm_name)
+
+    def transitions(self, node_id:int) -> range:
+        """the transition ids of the node, in the order of their priority"""
+        return range(self.transition_offsets[node_id], self.transition_offsets[node_id + 1])
+
+    def successors(self, node_id:int) -> array.array:
+        """the target node ids of the transitions of the node, in the order of their priority"""
+        return self.transition_target[self.transition_offsets[node_id]:self.transition_offsets[node_id + 1]]
+
+    # the scans below work on `tolist()` copies, the items of a list are read without allocating an int object
+
+    def transition_sources(self) -> array.array:
+        """the source node id of each transition"""
+        offsets = self.transition_offsets.tolist()
+        sources = []
+        for node_id in range(self.node_count):
+            sources += [node_id] * (offsets[node_id + 1] - offsets[node_id])
+        return _index_array(sources)
+
+    def in_degrees(self) -> array.array:
+        """the count of the transitions to each node"""
+        degrees = [0] * self.node_count
+        for target in self.transition_target.tolist():
+            degrees[target] += 1
+        return _index_array(degrees)
+
+    def predecessors(self) -> tuple[array.array, array.array]:
+        """the transitions to each node, in CSR arrays, i.e. the transpose of the graph
+
+        Returns
+        -------
+        tuple[array.array, array.array]
+            the offsets and the transition ids, the transitions to node `n` are `transitions[offsets[n]:offsets[n + 1]]`,
+            in the order of their ids. The source of a transition is in `transition_sources()`
+        """
+        offsets = list(itertools.accumulate(self.in_degrees(), initial=0))
+
+        positions = offsets[:-1]
+        transitions = [0] * self.transition_count
+        for transition, target in enumerate(self.transition_target.tolist()):
+            transitions[positions[target]] = transition
+            positions[target] += 1
+        return _index_array(offsets), _index_array(transitions)
+
+    def reachable(self, node_id:int=0) -> bytearray:
+        """mark of each node, 1 if it is reachable from the node, the node itself included"""
+        marks = bytearray(self.node_count)
+        marks[node_id] = 1
+        stack = [node_id]
+        offsets, targets = self.transition_offsets.tolist(), self.transition_target.tolist()
+        while stack:
+            node_id = stack.pop()
+            for target in targets[offsets[node_id]:offsets[node_id + 1]]:
+                if not marks[target]:
+                    marks[target] = 1
+                    stack.append(target)
+        return marks
+
+    def ending_node(self) -> int|None:
+        """the node without transitions with the lowest `node_ids`, None if the FSM never ends,
+        see `assembler.get_ending_node_of_FSM()`"""
+        offsets = self.transition_offsets
+        ending_nodes = [node_id for node_id in range(self.node_count) if offsets[node_id] == offsets[node_id + 1]]
+        return min(ending_nodes, key=self.node_ids.__getitem__, default=None)
+
+    def uses_wait(self) -> bool:
+        """if a WAIT statement is used, see `assembler.check_wait_statement_usage()`"""
+        generated_wait_statement = code_template.IS_TIME_PASSED("", "")[:-5] # __IS_TIME_PASSED
+        wait_conditions = {condition_id for condition_id, condition in enumerate(self.conditions) if generated_wait_statement in condition}
+        return any(condition_id in wait_conditions for condition_id in self.node_entry_condition)
+
+    def state_numbers(self) -> array.array:
+        """the state number of each node in the generated code, the starting node is 0, the ending node is 1,
+        and the other nodes are numbered from 10 in the order of their `node_ids`"""
+        ending_node = self.ending_node()
+        numbers = _index_array([0] * self.node_count)
+        state_counter = 10
+        for node_id in sorted(range(self.node_count), key=self.node_ids.__getitem__):
+            if node_id == 0:
+                numbers[node_id] = 0
+            elif node_id == ending_node:
+                numbers[node_id] = 1
+            else:
+                numbers[node_id] = state_counter
+                state_counter += 1
+        return numbers
+
+    def collapse_consecutive_states(self) -> "FSMGraph":
+        """Optimize consecutive states, `assembler.optimize_FSM_consecutive_states()` on the arrays
+
+        A node with only one transition, which has no condition, absorbs the code block and the transitions
+        of the collapsible target node, until its transition has a condition or its target is not collapsible.
+        It is a single pass, instead of restarting the search after each collapse. The node keeps its `node_ids`.
+
+        Returns
+        -------
+        FSMGraph
+            the optimized graph, equal to the graph of the FSM optimized by `assembler.optimize_FSM_consecutive_states()`.
+            The graph itself is not modified
+        """
+        offsets, targets = self.transition_offsets, self.transition_target
+        transition_conditions, transition_code_blocks = self.transition_condition, self.transition_code_block
+        conditions = _TextTable("")
+        code_blocks = _TextTable(())
+
+        graph = FSMGraph(self.fsm_name, list(self.global_variables), list(self.global_code_block))
+        new_ids = {0: 0}
+        nodes = [0]
+        for node_id in nodes:
+            # follow the chain of the collapsed nodes, the last one has the transitions of the node
+            chain = [node_id]
+            chained = {node_id}
+            last = node_id
+            while offsets[last + 1] - offsets[last] == 1 and transition_conditions[offsets[last]] == 0:
+                assert transition_code_blocks[offsets[last]] == 0 # the generated fsm will never have mealy transition
+                target = targets[offsets[last]]
+                if not self.node_collapsible[target] or target in chained:
+                    break
+                chain.append(target)
+                chained.add(target)
+                last = target
+
+            if len(chain) == 1:
+                code_block = self.code_blocks[self.node_code_block[node_id]]
+            else:
+                code_block = tuple(code for chained_id in chain for code in self.code_blocks[self.node_code_block[chained_id]])
+            graph.node_code_block.append(code_blocks.get_id(code_block))
+            graph.node_entry_condition.append(conditions.get_id(self.conditions[self.node_entry_condition[node_id]]))
+            graph.node_collapsible.append(self.node_collapsible[node_id])
+            graph.node_ids.append(self.node_ids[node_id])
+
+            for transition in range(offsets[last], offsets[last + 1]):
+                target = targets[transition]
+                if target not in new_ids:
+                    new_ids[target] = len(nodes)
+                    nodes.append(target)
+                graph.transition_target.append(new_ids[target])
+                graph.transition_condition.append(conditions.get_id(self.conditions[transition_conditions[transition]]))
+                graph.transition_code_block.append(code_blocks.get_id(self.code_blocks[transition_code_blocks[transition]]))
+            graph.transition_offsets.append(len(graph.transition_target))
+
+        graph.conditions = conditions.texts
+        graph.code_blocks = code_blocks.texts
+        return graph
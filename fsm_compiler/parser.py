@@ -1,14 +1,25 @@
+import re
+import time
+import pickle
 import pathlib
+import threading
+import contextlib
 import logging
 logger = logging.getLogger(__name__)
 
 import lark
 
+from typing import Iterator
+from dataclasses import dataclass, field
+
 from .ast_types import *
+from . import cache
 
 __CURRENT_FILE_ABSOLUTE_PATH = pathlib.Path(__file__).parent
 PATH_LARK_BASIC_PARSER = __CURRENT_FILE_ABSOLUTE_PATH / "lark_basic_parser.lark"
 PATH_LARK_EXPERIMENTAL_PARSER = __CURRENT_FILE_ABSOLUTE_PATH / "lark_experimental_parser.lark"
+PATH_LARK_BASIC_PARSER_LALR = __CURRENT_FILE_ABSOLUTE_PATH / "lark_basic_parser_lalr.lark"
+PATH_LARK_COARSE_PARSER = __CURRENT_FILE_ABSOLUTE_PATH / "lark_coarse_parser.lark"
 
 class CHARACTERS():
     OPEN_BRACKETS = ["(", "[", "{"]
@@ -19,22 +30,490 @@ class CHARACTERS():
 
     ESCAPE = "\\"
 
-with open(PATH_LARK_BASIC_PARSER, "r") as f:
-    LARK_BASIC_PARSER = lark.Lark(f, start="fsm_func", propagate_positions=True)
-    
-with open(PATH_LARK_EXPERIMENTAL_PARSER, "r") as f:
-    LARK_EXPERIMENTAL_PARSER = lark.Lark(f, start="fsm_func", propagate_positions=True)
-    
-    
-def generate_AST_from_code(input_str:str) -> ParseResult|None:
+# -------------------------------------------------- #
+#                    Coarse Lexer                    #
+# -------------------------------------------------- #
+
+def _coarse_token_pattern() -> str:
+    """tokens of an opaque chunk of C/C++ code, built from `CHARACTERS`
+
+    Each match skips the characters which cannot start a comment, literal, bracket or semicolon,
+    so the regular expression engine instead of python iterates over the ordinary code.
+    """
+    escape = re.escape(CHARACTERS.ESCAPE)
+
+    def quoted(quotation_mark:str) -> str:
+        quotation_mark = re.escape(quotation_mark)
+        return r"{0}(?:{1}.|[^{0}{1}\n])*{0}".format(quotation_mark, escape)
+
+    tokens = [
+        r"(?P<comment>//[^\n]*|/\*.*?\*/)",
+        r"(?P<literal>{}|{})".format(quoted(CHARACTERS.DOUBLE_QUOTATION_MARK), quoted(CHARACTERS.SINGLE_QUOTATION_MARK)),
+        r"(?P<open>[{}])".format(re.escape("".join(CHARACTERS.OPEN_BRACKETS))),
+        r"(?P<close>[{}])".format(re.escape("".join(CHARACTERS.CLOSING_BRACKETS))),
+        r"(?P<semicolon>;)",
+        r"(?P<other>.)",
+    ]
+    first_characters = ["/", CHARACTERS.DOUBLE_QUOTATION_MARK, CHARACTERS.SINGLE_QUOTATION_MARK, ";"]
+    first_characters += CHARACTERS.OPEN_BRACKETS + CHARACTERS.CLOSING_BRACKETS
+    return r"[^{}]*+(?:{})".format(re.escape("".join(first_characters)), "|".join(tokens))
+
+_COARSE_TOKEN = re.compile(_coarse_token_pattern(), re.DOTALL)
+_COARSE_SPACE = re.compile(r"(?:\s+|//[^\n]*|/\*.*?\*/)*", re.DOTALL)
+_COARSE_WORD = re.compile(r"[a-zA-Z0-9_]+")
+_MATCHING_BRACKETS = dict(zip(CHARACTERS.OPEN_BRACKETS, CHARACTERS.CLOSING_BRACKETS))
+
+class CoarseLexer(lark.lexer.Lexer):
+    """Lexer of the coarse grammar, `lark_coarse_parser.lark`
+
+    Only the FSM keywords, and the brackets and semicolons around the FSM statements are tokens. The
+    ordinary C/C++ code is lexed into opaque chunks, which balance the brackets and skip the comments
+    and literals, instead of being parsed into expressions:
+
+    - CHUNK, a statement up to its `;`, e.g. `x = foo(a, ";");`
+    - C_STATEMENT, a whole `if`/`for`/`while`/`do`/`switch` statement with its nested statements
+    - CONDITION, the content of the brackets of `FOR`, `WHILE`, `IF`, `WAIT` and `WAIT_UNLESS`
+    - GLOBAL_DECLARATION, a `GLOBAL` declaration up to its `;`, which is parsed again by the
+      declaration rules of the basic grammar, see `StatementBuilder.partialstmt_global`
+    """
+    # lark uses the lexer class as is, so the constructed parser can be pickled into the grammar cache
+    __future_interface__ = 2
+
+    KEYWORDS = {
+        "FOR": "_FOR", "WHILE": "_WHILE", "DO": "_DO", "IF": "_IF", "ELSE": "_ELSE",
+        "BREAK": "_BREAK", "CONTINUE": "_CONTINUE", "RETURN": "_RETURN",
+        "YIELD": "_YIELD", "WAIT": "_WAIT", "WAIT_UNLESS": "_WAIT_UNLESS",
+    }
+    C_STATEMENTS = frozenset({"if", "for", "while", "do", "switch"})
+    PUNCTUATIONS = {"(": "_LPAR", ")": "_RPAR", "{": "_LBRACE", "}": "_RBRACE", ";": "_SEMICOLON"}
+
+    def __init__(self, lexer_conf):
+        pass
+
+    def lex(self, lexer_state, parser_state) -> Iterator[lark.Token]:
+        return _CoarseLexing(lexer_state).tokens()
+
+class _CoarseLexing():
+    """the state of lexing one input by `CoarseLexer`"""
+    def __init__(self, lexer_state):
+        text = lexer_state.text
+        self.source = text.text
+        self.end = text.end
+        self.pos = text.start
+
+        # line of the last position a token started or ended at
+        line_counter = lexer_state.line_ctr
+        self._line_pos = line_counter.char_pos
+        self._line = line_counter.line
+        self._line_start_pos = line_counter.line_start_pos
+
+    def _line_column(self, pos:int) -> tuple[int, int]:
+        """1-based line and column of `pos`, the positions are increasing"""
+        newlines = self.source.count("\n", self._line_pos, pos)
+        if newlines:
+            self._line += newlines
+            self._line_start_pos = self.source.rindex("\n", self._line_pos, pos) + 1
+        self._line_pos = pos
+        return self._line, pos - self._line_start_pos + 1
+
+    def _token(self, token_type:str, start_pos:int, end_pos:int) -> lark.Token:
+        line, column = self._line_column(start_pos)
+        end_line, end_column = self._line_column(end_pos)
+        return lark.Token(
+            token_type, self.source[start_pos:end_pos], start_pos, line, column, end_line, end_column, end_pos
+        )
+
+    def _error(self, pos:int) -> lark.exceptions.UnexpectedCharacters:
+        line, column = self._line_column(pos)
+        return lark.exceptions.UnexpectedCharacters(self.source, pos, line, column)
+
+    def _skip_space(self) -> int:
+        """skip the white spaces and comments, return the position of the next character"""
+        self.pos = _COARSE_SPACE.match(self.source, self.pos, self.end).end()
+        return self.pos
+
+    def _word(self) -> str|None:
+        word = _COARSE_WORD.match(self.source, self.pos, self.end)
+        return None if word is None else word.group()
+
+    def _punctuation(self, character:str) -> lark.Token:
+        """the token of `character`, which must be the next character after the white spaces"""
+        pos = self._skip_space()
+        if not self.source.startswith(character, pos, self.end):
+            raise self._error(pos)
+        self.pos = pos + 1
+        return self._token(CoarseLexer.PUNCTUATIONS[character], pos, pos + 1)
+
+    def _keyword(self, word:str) -> lark.Token:
+        self.pos += len(word)
+        return self._token(CoarseLexer.KEYWORDS[word], self.pos - len(word), self.pos)
+
+    def _chunk(self, stop:str) -> int:
+        """skip the code up to the unmatched `stop` character, `;` or a closing bracket
+
+        Return the end of the code, without the trailing white spaces and comments. The position is
+        left at the `stop` character.
+        """
+        source, pattern = self.source, _COARSE_TOKEN
+        closing_brackets = []
+        pos = code_end = self.pos
+        while (token := pattern.match(source, pos, self.end)) is not None:
+            kind = token.lastgroup
+            character = token.group(kind)
+            # the skipped code before the token
+            code = source[pos:token.start(kind)].rstrip()
+            if code:
+                code_end = pos + len(code)
+
+            if not closing_brackets and character == stop:
+                self.pos = token.start(kind)
+                return code_end
+
+            pos = token.end()
+            if kind == "comment":
+                continue
+            if kind == "open":
+                closing_brackets.append(_MATCHING_BRACKETS[character])
+            elif kind == "close":
+                if not closing_brackets or closing_brackets.pop() != character:
+                    raise self._error(token.start(kind))
+            code_end = pos
+
+        raise self._error(self.end)
+
+    def _opaque(self, token_type:str, stop:str) -> lark.Token:
+        """the token of the code up to the unmatched `stop` character"""
+        start_pos = self._skip_space()
+        end_pos = self._chunk(stop)
+        if end_pos == start_pos:
+            raise self._error(start_pos)
+        return self._token(token_type, start_pos, end_pos)
+
+    def _c_statement_end(self) -> int:
+        """skip a whole C/C++ `if`/`for`/`while`/`do`/`switch` statement, return its end"""
+        # the statements to finish, "if" may continue with "else", and "do" with "while (...);"
+        pending = []
+        while True:
+            pos = self._skip_space()
+            word = self._word()
+            if word in ("if", "for", "while", "switch"):
+                self.pos += len(word)
+                self._punctuation("(")
+                self._chunk(")")
+                self.pos += 1
+                pending.append(word)
+                continue
+            if word == "do":
+                self.pos += len(word)
+                pending.append(word)
+                continue
+
+            # the nested statement
+            if self.source.startswith("{", pos, self.end):
+                self.pos += 1
+                self._chunk("}")
+            elif not self.source.startswith(";", pos, self.end):
+                self._chunk(";")
+            self.pos += 1
+
+            while pending:
+                statement_end = self.pos
+                self._skip_space()
+                word = pending.pop()
+                if word == "if" and self._word() == "else":
+                    self.pos += len("else")
+                    break
+                if word == "do":
+                    if self._word() != "while":
+                        raise self._error(self.pos)
+                    self.pos += len("while")
+                    self._punctuation("(")
+                    self._chunk(")")
+                    self.pos += 1
+                    self._punctuation(";")
+                    continue
+                self.pos = statement_end
+            else:
+                return self.pos
+
+    def _partial_statement(self, stop:str) -> Iterator[lark.Token]:
+        """tokens of a partial statement, which ends at the `stop` character"""
+        self._skip_space()
+        word = self._word()
+        if word in ("WAIT", "WAIT_UNLESS"):
+            yield self._keyword(word)
+            yield from self._condition()
+        elif word in ("BREAK", "CONTINUE", "RETURN", "YIELD"):
+            yield self._keyword(word)
+        elif word == "GLOBAL":
+            yield self._opaque("GLOBAL_DECLARATION", stop)
+        else:
+            yield self._opaque("CHUNK", stop)
+
+    def _condition(self) -> Iterator[lark.Token]:
+        yield self._punctuation("(")
+        yield self._opaque("CONDITION", ")")
+        yield self._punctuation(")")
+
+    def tokens(self) -> Iterator[lark.Token]:
+        source = self.source
+
+        # FSM name()
+        self._skip_space()
+        if self._word() != "FSM":
+            raise self._error(self.pos)
+        self.pos += len("FSM")
+        yield self._token("_FSM", self.pos - len("FSM"), self.pos)
+        self._skip_space()
+        name = self._word()
+        if name is None:
+            raise self._error(self.pos)
+        self.pos += len(name)
+        yield self._token("WORD", self.pos - len(name), self.pos)
+        yield self._punctuation("(")
+        yield self._punctuation(")")
+
+        while (pos := self._skip_space()) < self.end:
+            character = source[pos]
+            if character in "{};":
+                self.pos += 1
+                yield self._token(CoarseLexer.PUNCTUATIONS[character], pos, pos + 1)
+                continue
+
+            word = self._word()
+            if word == "FOR":
+                yield self._keyword(word)
+                yield self._punctuation("(")
+                yield from self._partial_statement(";")
+                yield self._punctuation(";")
+                yield self._opaque("CONDITION", ";")
+                yield self._punctuation(";")
+                yield from self._partial_statement(")")
+                yield self._punctuation(")")
+            elif word in ("WHILE", "IF"):
+                yield self._keyword(word)
+                yield from self._condition()
+            elif word in ("DO", "ELSE"):
+                yield self._keyword(word)
+            elif word in CoarseLexer.C_STATEMENTS:
+                yield self._token("C_STATEMENT", pos, self._c_statement_end())
+            else:
+                yield from self._partial_statement(";")
+
+LARK_GRAMMARS = {
+    ("basic", "earley"): PATH_LARK_BASIC_PARSER,
+    ("basic", "lalr"): PATH_LARK_BASIC_PARSER_LALR,
+    ("experimental", "earley"): PATH_LARK_EXPERIMENTAL_PARSER,
+    ("coarse", "lalr"): PATH_LARK_COARSE_PARSER,
+}
+
+# the grammars loaded by the parsing besides the grammar itself, the coarse grammar parses the GLOBAL 
+# declarations by the declaration rules of the basic grammar
+LARK_GRAMMAR_DEPENDENCIES = {
+    ("coarse", "lalr"): [PATH_LARK_BASIC_PARSER_LALR],
+}
+
+# the lexers match WORD, and look up the keyword table for the keywords of the grammar,
+# except the coarse lexer, which lexes the ordinary C/C++ code into opaque chunks
+LARK_LEXERS = {
+    ("basic", "earley"): "basic",
+    ("basic", "lalr"): "contextual",
+    ("experimental", "earley"): "basic",
+    ("coarse", "lalr"): CoarseLexer,
+}
+
+class TokenBounds():
+    """Tree builder of the lark parsers without propagated positions, which keeps the first and the last 
+    token of each tree as its `first_token` and `last_token`
+
+    `propagate_positions=True` computes the positions of every tree into its `meta`, although the 
+    statements only need the positions of a few trees. These positions are read from the first and the 
+    last token instead, so the other trees only reference two tokens. The tokens filtered out of the 
+    tree, e.g. the keywords and brackets, are only seen while the tree is built, so they are kept here.
+    """
+    __slots__ = ("node_builder",)
+
+    def __init__(self, node_builder):
+        self.node_builder = node_builder
+
+    def __call__(self, children:list) -> lark.Tree|lark.Token:
+        res = self.node_builder(children)
+        if isinstance(res, lark.Tree):
+            for child in children:
+                token = getattr(child, "first_token", None) if isinstance(child, lark.Tree) else child
+                if token is not None:
+                    res.first_token = token
+                    break
+            for child in reversed(children):
+                token = getattr(child, "last_token", None) if isinstance(child, lark.Tree) else child
+                if token is not None:
+                    res.last_token = token
+                    break
+        return res
+
+def keep_token_bounds(lark_parser:lark.Lark) -> lark.Lark:
+    """wrap the tree builders of the rules of `lark_parser` by `TokenBounds`, in place"""
+    callbacks = lark_parser.parser.parser_conf.callbacks
+    for rule, callback in callbacks.items():
+        callbacks[rule] = TokenBounds(callback)
+    return lark_parser
+
+_LARK_PARSERS: dict[tuple[str, str, str, bool], lark.Lark] = {}
+_LARK_PARSERS_LOCK = threading.Lock()
+
+def get_lark_parser(grammar:str="basic", parser:str="earley", start:str="fsm_func", propagate_positions:bool=True) -> lark.Lark:
+    """Get the lark parser of the given grammar, the parser is constructed on first use
+
+    Parameters
+    ----------
+    grammar : str, optional
+        "basic", "experimental" or "coarse", by default "basic"
+    parser : str, optional
+        parsing algorithm, "earley" or "lalr", by default "earley"  
+        "lalr" is only available for the basic and coarse grammars, and it is the only parser of the 
+        coarse grammar
+    start : str, optional
+        the start rule, by default "fsm_func"
+    propagate_positions : bool, optional
+        If the trees have their positions in `meta`, by default True  
+        Otherwise, the trees keep their first and last token, see `TokenBounds`, which makes the LALR(1) 
+        parser about a third faster.
+
+    Returns
+    -------
+    lark.Lark
+        the lark parser
+
+    Raises
+    ------
+    ValueError
+        if the combination of grammar and parsing algorithm is unknown
+    """
+    key = (grammar, parser, start, propagate_positions)
+    lark_parser = _LARK_PARSERS.get(key)
+    if lark_parser is not None:
+        return lark_parser
+    
+    grammar_path = get_grammar_path(grammar, parser)
+    with _LARK_PARSERS_LOCK:
+        if key not in _LARK_PARSERS:
+            lark_parser = cache.load_lark_parser(
+                grammar_path, start=start, parser=parser, lexer=LARK_LEXERS[grammar, parser], 
+                propagate_positions=propagate_positions
+            )
+            _LARK_PARSERS[key] = lark_parser if propagate_positions else keep_token_bounds(lark_parser)
+    
+    return _LARK_PARSERS[key]
+
+def get_grammar_path(grammar:str="basic", parser:str="earley") -> pathlib.Path:
+    """the grammar file of the given grammar and parsing algorithm, raise ValueError if the combination is unknown"""
+    key = (grammar, parser)
+    if key not in LARK_GRAMMARS:
+        raise ValueError("Unknown grammar and parser {!r}, expecting one of {}".format(key, list(LARK_GRAMMARS)))
+    return LARK_GRAMMARS[key]
+
+def get_grammar_paths(grammar:str="basic", parser:str="earley") -> list[pathlib.Path]:
+    """every grammar file loaded to parse with the given grammar and parsing algorithm, the grammar of the 
+    combination first, raise ValueError if the combination is unknown"""
+    return [get_grammar_path(grammar, parser), *LARK_GRAMMAR_DEPENDENCIES.get((grammar, parser), [])]
+
+# -------------------------------------------------- #
+#                    Parser Pool                     #
+# -------------------------------------------------- #
+
+class LarkParserPool():
+    """Pool of lark parsers, a checked out parser is used by one thread at a time
+
+    The parser returned by `get_lark_parser` is shared by every caller. The pool instead checks out a
+    private copy of it for the duration of a parse, so concurrent parses never share a lark parser
+    and its lexer and parser state. The copies are deserialized from the shared parser, which is a
+    lot cheaper than constructing the parser, and they are returned to the pool after the parse. So
+    the pool keeps as many parsers of a grammar as the most concurrent parses of that grammar.
+
+    `created` counts the parsers copied by this instance.
+    """
+    def __init__(self):
+        self.created = 0
+        self._idle: dict[tuple[str, str, str, bool], list[lark.Lark]] = {}
+        self._serialized: dict[tuple[str, str, str, bool], bytes] = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def checkout(
+        self, grammar:str="basic", parser:str="earley", start:str="fsm_func", propagate_positions:bool=True
+    ) -> Iterator[lark.Lark]:
+        """Check out a parser of the given grammar, see `get_lark_parser()` for the parameters
+
+        Yields
+        ------
+        lark.Lark
+            the lark parser, which is not used by any other thread until it is returned to the pool
+
+        Raises
+        ------
+        ValueError
+            if the combination of grammar and parsing algorithm is unknown
+        """
+        key = (grammar, parser, start, propagate_positions)
+        with self._lock:
+            idle = self._idle.get(key)
+            lark_parser = idle.pop() if idle else None
+        if lark_parser is None:
+            lark_parser = self._copy(key)
+
+        try:
+            yield lark_parser
+        finally:
+            with self._lock:
+                self._idle.setdefault(key, []).append(lark_parser)
+
+    def _copy(self, key:tuple[str, str, str, bool]) -> lark.Lark:
+        serialized = self._serialized.get(key)
+        if serialized is None:
+            serialized = cache.dump_lark_parser(get_lark_parser(*key))
+            with self._lock:
+                serialized = self._serialized.setdefault(key, serialized)
+
+        lark_parser = pickle.loads(serialized)
+        with self._lock:
+            self.created += 1
+        return lark_parser
+
+    def idle_count(self) -> int:
+        """the number of parsers which are not checked out"""
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+_LARK_PARSER_POOL = LarkParserPool()
+
+def get_lark_parser_pool() -> LarkParserPool:
+    """the pool of lark parsers used by `parse_to_AST`"""
+    return _LARK_PARSER_POOL
+
+def __getattr__(name:str):
+    # `LARK_BASIC_PARSER` and `LARK_EXPERIMENTAL_PARSER` are constructed on first access
+    if name == "LARK_BASIC_PARSER":
+        return get_lark_parser("basic")
+    if name == "LARK_EXPERIMENTAL_PARSER":
+        return get_lark_parser("experimental")
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    
+def generate_AST_from_code(
+    input_str:str, grammar:str="basic", parser:str="earley", lean:bool=False, parse_cache:cache.ParseResultCache|None=None, 
+    profile:"ParseProfile|None"=None, propagate_positions:bool|None=None
+) -> ParseResult|None:
     """Parse the given code as input string
     
-    This is an alias of `parse_to_AST(input_str:str) -> ParseResult|None`
+    This is an alias of `parse_to_AST(input_str, grammar, parser, lean, parse_cache, profile, propagate_positions) -> ParseResult|None`
 
     Parameters
     ----------
     input_str : str
         input C/C++ code starting at the FSM function
+    grammar : str, optional
+        "basic", "experimental" or "coarse", by default "basic"
+    parser : str, optional
+        parsing algorithm, "earley" or "lalr", by default "earley"
 
     Returns
     -------
@@ -43,15 +522,56 @@ def generate_AST_from_code(input_str:str) -> ParseResult|None:
         Return None, otherwise. 
     """
     
-    return parse_to_AST(input_str)
+    return parse_to_AST(input_str, grammar, parser, lean, parse_cache, profile, propagate_positions)
 
-def parse_to_AST(input_str:str) -> ParseResult|None:
+def parse_to_AST(
+    input_str:str, grammar:str="basic", parser:str="earley", lean:bool=False, parse_cache:cache.ParseResultCache|None=None, 
+    profile:"ParseProfile|None"=None, propagate_positions:bool|None=None
+) -> ParseResult|None:
     """Parse the given code as input string
+    
+    "lalr" parser is a lot faster than "earley" parser on long FSM functions. It uses the LALR(1) 
+    version of the basic grammar, which has operator precedence, and does not accept the `name WORD` 
+    juxtaposition in expressions, e.g. `a = new Foo()`.
+    
+    It is thread-safe. Each parse checks out a lark parser from `get_lark_parser_pool()`, so the 
+    concurrent parses do not share a lark parser, and the statements of each parse are built by 
+    its own `StatementBuilder`.
+    
+    "coarse" grammar, with "lalr" parser, is faster again on functions of mostly ordinary statements. 
+    It does not parse the ordinary C/C++ statements and expressions, which are opaque text to the 
+    statements anyway, but lexes them as chunks with balanced brackets. Only the GLOBAL declarations 
+    are parsed by the basic grammar. The statements are the same as the ones of the basic grammar, and 
+    it accepts any ordinary statement with balanced brackets, e.g. `/* comments */` and `p->x[i][j]`.
 
     Parameters
     ----------
     input_str : str
         input C/C++ code starting at the FSM function
+    grammar : str, optional
+        "basic", "experimental" or "coarse", by default "basic"
+    parser : str, optional
+        parsing algorithm, "earley" or "lalr", by default "earley"  
+        "lalr" is only available for the basic and coarse grammars, and it is the only parser of the 
+        coarse grammar
+    lean : bool, optional
+        If the statements keep only the source spans (`Statement.span`) instead of the lark AST 
+        (`Statement.lark_ast`), by default False  
+        The lark AST of a function is a lot larger than its statements, use lean mode when many 
+        parse results are kept alive, e.g. when compiling many FSM functions in one process.
+    parse_cache : cache.ParseResultCache | None, optional
+        persistent cache of the parse results, e.g. `cache.get_parse_result_cache()`, by default None  
+        The input code is not parsed if its parse result is cached. The cached parse results are lean, 
+        so `lean` is always True with the cache.
+    profile : ParseProfile | None, optional
+        opt-in profiling, by default None  
+        The given `ParseProfile` is filled with the time of each parse phase, the token and tree node 
+        counts, and the ambiguous derivations of the Earley parser. Profiling is slower than parsing.
+    propagate_positions : bool | None, optional
+        If the lark AST has the positions of every tree in its `meta`, by default None, i.e. only if 
+        the lark AST is kept (not lean, and no parse cache)  
+        Otherwise, the positions of the statements are read from the first and last token of their 
+        trees, which makes the LALR(1) parser about a third faster. The statements are the same.
 
     Returns
     -------
@@ -59,182 +579,410 @@ def parse_to_AST(input_str:str) -> ParseResult|None:
         Return ParseResult when parser successfully parsed the input code
         Return None, otherwise. 
     """
-    res_tree = parse_lark_ast(input_str)
+    if propagate_positions is None:
+        propagate_positions = not lean and parse_cache is None
     
-    return parse_fsm_function(input_str, res_tree)
+    if profile is not None:
+        return _parse_to_AST_profiled(input_str, grammar, parser, lean, parse_cache, profile, propagate_positions)
     
-def parse_lark_ast(input_str:str) -> lark.Tree|None:
-    return LARK_BASIC_PARSER.parse(input_str)
+    if parse_cache is not None:
+        key = parse_cache.key(input_str, get_grammar_paths(grammar, parser), parser)
+        parse_result = parse_cache.load(key)
+        if parse_result is None:
+            res_tree = parse_lark_ast(input_str, grammar, parser, propagate_positions)
+            parse_result = parse_fsm_function(input_str, res_tree, lean=True, propagate_positions=propagate_positions)
+            parse_cache.store(key, parse_result)
+        return parse_result
     
-def parse_fsm_function(input_str:str, partial_ast:lark.Tree) -> ParseResult|None:
-    assert(partial_ast.children[0].type == "WORD")
-    func_name = partial_ast.children[0].value
+    res_tree = parse_lark_ast(input_str, grammar, parser, propagate_positions)
     
-    res_statement = parse_statement(input_str, partial_ast.children[1])
-    res_statement = [] if res_statement is None else res_statement
+    return parse_fsm_function(input_str, res_tree, lean, propagate_positions)
     
-    return ParseResult(partial_ast, func_name, res_statement)
+def parse_lark_ast(input_str:str, grammar:str="basic", parser:str="earley", propagate_positions:bool=True) -> lark.Tree|None:
+    with get_lark_parser_pool().checkout(grammar, parser, propagate_positions=propagate_positions) as lark_parser:
+        return lark_parser.parse(input_str)
     
-def parse_statement(input_str:str, partial_ast:lark.Tree) -> Statement|None:
-    if partial_ast.data == "statement_ordinary":
-        return StatementOrdinary(partial_ast, input_str[partial_ast.meta.start_pos : partial_ast.meta.end_pos])
+def parse_fsm_function(input_str:str, partial_ast:lark.Tree, lean:bool=False, propagate_positions:bool=True) -> ParseResult|None:
+    """build the statements of the lark AST, `propagate_positions` is the one of the parser of the lark AST"""
+    return StatementBuilder(input_str, lean, propagate_positions).visit(partial_ast)
+
+# -------------------------------------------------- #
+#                     Profiling                      #
+# -------------------------------------------------- #
+
+@dataclass
+class ParseAmbiguity:
+    """a part of the source code which the Earley parser derived in more than one way"""
+    rule: str # the symbol of the ambiguous derivations, e.g. "expression"
+    alternatives: list[str] # the rules of the derivations, e.g. "expression : expression BIN_OPTR expression"
+    derivation_count: int # a rule derives the code in more than one way when its parts are split differently
+    start_pos: int
+    end_pos: int
+    line: int
+    column: int
+
+@dataclass
+class ParseProfile:
+    """Profile of one `parse_to_AST()` call, see its `profile` parameter
+
+    The phases, in seconds:
+
+    - "load_cache", looking up the parse result cache, only if the cache is used
+    - "lex", lexing the code alone, its tokens are counted by `token_count`
+    - "parse", parsing the code into the lark AST; lark lexes the code on demand, so it includes
+      lexing, and for the Earley parser it is the chart building up to the shared packed parse forest
+    - "resolve_ambiguity", choosing a derivation of each ambiguous node of the parse forest, and
+      building the lark AST, for the Earley parser only
+    - "build_statements", building the statements from the lark AST by the `StatementBuilder`
+    """
+    seconds: dict[str, float] = field(default_factory=dict)
+    token_count: int = 0
+    tree_node_count: int = 0 # the lark AST nodes
+    statement_count: int = 0
+    ambiguities: list[ParseAmbiguity] = field(default_factory=list)
+
+    def hotspots(self) -> list[tuple[str, int]]:
+        """the grammar rules of the most ambiguous nodes, and their number of ambiguous nodes"""
+        counts = {}
+        for ambiguity in self.ambiguities:
+            for alternative in ambiguity.alternatives:
+                counts[alternative] = counts.get(alternative, 0) + 1
+        return sorted(counts.items(), key=lambda item: item[1], reverse=True)
+
+    def report(self, input_str:str|None=None, limit:int=10) -> str:
+        """human readable summary, the source code of the ambiguities is quoted if `input_str` is given"""
+        lines = ["{:<20} {:>10.3f} ms".format(phase, seconds * 1000) for phase, seconds in self.seconds.items()]
+        lines.append("tokens {}, tree nodes {}, statements {}, ambiguities {}".format(
+            self.token_count, self.tree_node_count, self.statement_count, len(self.ambiguities)
+        ))
+        for rule, count in self.hotspots()[:limit]:
+            lines.append("  {:>6} ambiguous nodes: {}".format(count, rule))
+        for ambiguity in sorted(self.ambiguities, key=lambda ambiguity: ambiguity.start_pos)[:limit]:
+            text = "" if input_str is None else " " + repr(input_str[ambiguity.start_pos:ambiguity.end_pos])
+            lines.append("  line {} column {}: {} derivations of {}{}".format(
+                ambiguity.line, ambiguity.column, ambiguity.derivation_count, " | ".join(ambiguity.alternatives), text
+            ))
+        return "\n".join(lines)
+
+def _parse_to_AST_profiled(
+    input_str:str, grammar:str, parser:str, lean:bool, parse_cache:cache.ParseResultCache|None, profile:ParseProfile, 
+    propagate_positions:bool
+) -> ParseResult|None:
+    if parse_cache is not None:
+        time_start = time.perf_counter()
+        key = parse_cache.key(input_str, get_grammar_paths(grammar, parser), parser)
+        parse_result = parse_cache.load(key)
+        profile.seconds["load_cache"] = time.perf_counter() - time_start
+        if parse_result is not None:
+            profile.statement_count = _count_statements(parse_result)
+            return parse_result
+        lean = True
+
+    with get_lark_parser_pool().checkout(grammar, parser, propagate_positions=propagate_positions) as lark_parser:
+        time_start = time.perf_counter()
+        tokens = _lex(lark_parser, input_str)
+        profile.seconds["lex"] = time.perf_counter() - time_start
+        profile.token_count = len(tokens)
+
+        if isinstance(lark_parser.parser.parser, lark.parsers.earley.Parser):
+            tree = _parse_earley_profiled(lark_parser, input_str, tokens, profile)
+        else:
+            time_start = time.perf_counter()
+            tree = lark_parser.parse(input_str)
+            profile.seconds["parse"] = time.perf_counter() - time_start
+    profile.tree_node_count = sum(1 for _ in tree.iter_subtrees())
+
+    time_start = time.perf_counter()
+    parse_result = parse_fsm_function(input_str, tree, lean, propagate_positions)
+    profile.seconds["build_statements"] = time.perf_counter() - time_start
+    profile.statement_count = _count_statements(parse_result)
+
+    if parse_cache is not None:
+        parse_cache.store(key, parse_result)
+    return parse_result
+
+def _lex(lark_parser:lark.Lark, input_str:str) -> list[lark.Token]:
+    """the tokens of the lexer of the parser, the contextual lexer lexes with all the terminals"""
+    lexer = lark_parser.parser.lexer
+    lexer = getattr(lexer, "root_lexer", lexer)
+    return list(lark.lexer.LexerThread.from_text(lexer, input_str).lex(None))
+
+def _parse_earley_profiled(lark_parser:lark.Lark, input_str:str, tokens:list[lark.Token], profile:ParseProfile) -> lark.Tree:
+    """parse into the shared packed parse forest, then resolve the ambiguities of the forest into the lark AST
     
-    if partial_ast.data == "statement_partial":
-        return parse_statement_partial(input_str, partial_ast.children[0])
+    The parser is checked out of the pool, so it is not used by other threads while its tree class is 
+    unset to stop the Earley parser at the parse forest.
+    """
+    earley_parser = lark_parser.parser.parser
+    tree_class = earley_parser.Tree
+    earley_parser.Tree = None
+    try:
+        time_start = time.perf_counter()
+        forest = lark_parser.parse(input_str)
+        profile.seconds["parse"] = time.perf_counter() - time_start
+    finally:
+        earley_parser.Tree = tree_class
+
+    profile.ambiguities = _find_ambiguities(forest, tokens)
+
+    time_start = time.perf_counter()
+    transformer = lark.parsers.earley_forest.ForestToParseTree(
+        tree_class,
+        earley_parser.callbacks,
+        earley_parser.forest_sum_visitor and earley_parser.forest_sum_visitor(),
+        earley_parser.resolve_ambiguity,
+        not earley_parser.resolve_ambiguity,
+    )
+    tree = transformer.transform(forest)
+    profile.seconds["resolve_ambiguity"] = time.perf_counter() - time_start
+    return tree
+
+def _find_ambiguities(forest, tokens:list[lark.Token]) -> list[ParseAmbiguity]:
+    """the symbol nodes of the parse forest with more than one derivation
     
-    if partial_ast.data == "statement_block":
-        return parse_statement_block(input_str, partial_ast)
+    The lexer is not dynamic, so the start and end of a symbol node are the indices of its tokens.
+    """
+    ambiguities = []
+    visited = set()
+    stack = [forest]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, lark.parsers.earley_forest.PackedNode):
+            stack.extend(child for child in (node.left, node.right) if child is not None)
+            continue
+        if not isinstance(node, lark.parsers.earley_forest.SymbolNode) or id(node) in visited:
+            continue
+        visited.add(id(node))
+
+        derivations = node.children
+        stack.extend(derivations)
+        if len(derivations) < 2 or node.end <= node.start:
+            continue
+
+        rule = node.s[0] if node.is_intermediate else None
+        symbol = rule.origin.name if rule is not None else node.s.name
+        first_token, last_token = tokens[node.start], tokens[node.end - 1]
+        ambiguities.append(ParseAmbiguity(
+            symbol,
+            sorted({_rule_name(derivation.rule) for derivation in derivations}),
+            len(derivations),
+            first_token.start_pos,
+            last_token.end_pos,
+            first_token.line,
+            first_token.column,
+        ))
+    return ambiguities
+
+def _rule_name(rule:lark.grammar.Rule) -> str:
+    name = "{} : {}".format(rule.origin.name, " ".join(symbol.name for symbol in rule.expansion))
+    return name if not rule.alias else "{} -> {}".format(name, rule.alias)
+
+def _count_statements(parse_result:ParseResult) -> int:
+    count = 0
+    stack = [parse_result]
+    while stack:
+        statement = stack.pop()
+        count += 1
+        stack.extend(statement.sub_statements())
+    return count
+
+# -------------------------------------------------- #
+#                 Statement Builder                  #
+# -------------------------------------------------- #
+
+class StatementBuilder(lark.visitors.Interpreter):
+    """Build the statements from the lark AST
     
-    if partial_ast.data == "statement_for":
-        return parse_statement_for(input_str, partial_ast)
+    Each rule of the grammar is dispatched to the method of the same name. The builder visits the 
+    statements top-down, and it never visits the expressions, since they are represented by their 
+    source code.
     
-    if partial_ast.data == "statement_while":
-        return parse_statement_while(input_str, partial_ast)
+    In lean mode, the statements keep the source spans only, and do not reference the lark AST, 
+    so the lark AST is released after the statements are built.
     
-    if partial_ast.data == "statement_do_while":
-        return parse_statement_do_while(input_str, partial_ast)
+    The positions of the statements are read from the `meta` of the trees, or from their first and last 
+    token if the lark parser does not propagate the positions, see `TokenBounds`.
     
-    if partial_ast.data == "statement_if" or partial_ast.data == "statement_if_else":
-        return parse_statement_if_else(input_str, partial_ast)
+    The nested statements are built with an explicit stack before the statements containing them, 
+    so the nesting depth is not limited by the recursion limit.
+    """
+    # the rules which never visit their children
+    LEAF_RULES = frozenset({
+        "statement_ordinary", "partialstmt", "partialstmt_yield", "partialstmt_wait", "partialstmt_wait_until",
+        "partialstmt_break", "partialstmt_continue", "partialstmt_return", "partialstmt_global",
+        "declaration", "declaration_initialization", "declaration_class_init",
+        "declaration_global", "declaration_initialization_global",
+    })
+    
+    def __init__(self, input_str:str, lean:bool=False, propagate_positions:bool=True):
+        super().__init__()
+        self.input_str = input_str
+        self.lean = lean
+        self.propagate_positions = propagate_positions
+        self._built = {}
+    
+    def visit(self, tree:lark.Tree) -> Statement:
+        """return the statement of `tree`, the nested statements are built first if it is not built yet"""
+        if id(tree) in self._built:
+            return self._built.pop(id(tree))
+        
+        # pre-order of the rules, every rule comes before its children
+        order = []
+        stack = [tree]
+        while stack:
+            partial_ast = stack.pop()
+            order.append(partial_ast)
+            if partial_ast.data not in self.LEAF_RULES:
+                stack.extend(
+                    child for child in partial_ast.children 
+                    if isinstance(child, lark.Tree) and hasattr(type(self), child.data)
+                )
+        
+        for partial_ast in reversed(order[1:]):
+            self._built[id(partial_ast)] = self._visit_tree(partial_ast)
+        return self._visit_tree(tree)
+    
+    def _bounds(self, partial_ast:lark.Tree) -> tuple[lark.tree.Meta|lark.Token, lark.tree.Meta|lark.Token]:
+        """the start and the end positions of the tree, i.e. its meta, or its first and last token"""
+        if self.propagate_positions:
+            return partial_ast.meta, partial_ast.meta
+        return partial_ast.first_token, partial_ast.last_token
+    
+    def _source(self, partial_ast:lark.Tree) -> SourceText:
+        start, end = self._bounds(partial_ast)
+        return SourceText(self.input_str, start.start_pos, end.end_pos)
+    
+    def _statement(self, statement_type:type, partial_ast:lark.Tree, *args) -> Statement:
+        start, end = self._bounds(partial_ast)
+        return statement_type(
+            None if self.lean else partial_ast,
+            *args,
+            span=SourceSpan(start.start_pos, end.end_pos, start.line, start.column, end.end_line, end.end_column)
+        )
     
+    def fsm_func(self, partial_ast:lark.Tree) -> ParseResult:
+        func_name, statement = partial_ast.children
+        assert(func_name.type == "WORD")
+        
+        res_statement = self.visit(statement)
+        res_statement = [] if res_statement is None else res_statement
+        
+        return self._statement(ParseResult, partial_ast, func_name.value, res_statement)
     
-def parse_statement_partial(input_str:str, partial_ast:lark.Tree) -> Statement|None:
-    # print(partial_ast.pretty())
-    if partial_ast.data == "partialstmt":
-        return StatementLine(partial_ast, input_str[partial_ast.meta.start_pos : partial_ast.meta.end_pos])
+    # ----- statement ----- #
     
-    if partial_ast.data == "partialstmt_declaration":
-        return parse_statement_declaration(input_str, partial_ast.children[0])
+    def statement_ordinary(self, partial_ast:lark.Tree) -> StatementOrdinary:
+        return self._statement(StatementOrdinary, partial_ast, self._source(partial_ast))
     
-    if partial_ast.data == "partialstmt_yield":
-        return StatementWait(partial_ast, "")
+    def statement_partial(self, partial_ast:lark.Tree) -> Statement:
+        return self.visit(partial_ast.children[0])
     
-    if partial_ast.data == "partialstmt_wait":
-        expr = partial_ast.children[0]
-        return StatementWait(partial_ast, input_str[expr.meta.start_pos : expr.meta.end_pos])
+    def statement_block(self, partial_ast:lark.Tree) -> StatementBlock:
+        return self._statement(StatementBlock, partial_ast, [self.visit(statement) for statement in partial_ast.children])
     
-    if partial_ast.data == "partialstmt_wait_until":
-        condition = partial_ast.children[0]
-        return StatementWaitUnless(partial_ast, input_str[condition.meta.start_pos : condition.meta.end_pos])
+    def statement_for(self, partial_ast:lark.Tree) -> StatementFor:
+        initialization, condition, update, statement = partial_ast.children
+        
+        return self._statement(
+            StatementFor,
+            partial_ast,
+            self.visit(initialization),
+            self._source(condition),
+            self.visit(update),
+            self.visit(statement)
+        )
     
-    if partial_ast.data == "partialstmt_break":
-        return StatementBreak(partial_ast)
-
-    if partial_ast.data == "partialstmt_continue":
-        return StatementContinue(partial_ast)
-
-    if partial_ast.data == "partialstmt_return":
-        return StatementReturn(partial_ast)
-  
-  
-def parse_statement_if_else(input_str:str, partial_ast:lark.Tree) -> Statement|None:
-    if partial_ast.data == "statement_if":
+    def statement_while(self, partial_ast:lark.Tree) -> StatementWhile:
         condition, statement = partial_ast.children
-        return StatementIf(
+        return self._statement(StatementWhile, partial_ast, self._source(condition), self.visit(statement))
+    
+    def statement_do_while(self, partial_ast:lark.Tree) -> StatementDoWhile:
+        statement, condition = partial_ast.children
+        return self._statement(StatementDoWhile, partial_ast, self._source(condition), self.visit(statement))
+    
+    def statement_if(self, partial_ast:lark.Tree) -> StatementIf:
+        condition, statement = partial_ast.children
+        return self._statement(
+            StatementIf,
             partial_ast,
             [
-                IfCase(
-                    input_str[condition.meta.start_pos : condition.meta.end_pos],
-                    parse_statement(input_str, statement)
-                )
+                IfCase(self._source(condition), self.visit(statement))
             ]
         )
-        
-    elif partial_ast.data == "statement_if_else":
+    
+    def statement_if_else(self, partial_ast:lark.Tree) -> StatementIf:
         condition, statement, else_statement = partial_ast.children
-        return StatementIf(
-            partial_ast, 
+        return self._statement(
+            StatementIf,
+            partial_ast,
             [
-                IfCase(
-                    input_str[condition.meta.start_pos : condition.meta.end_pos],
-                    parse_statement(input_str, statement)
-                ),
-                IfCase(
-                    "",
-                    parse_statement(input_str, else_statement)
-                )
+                IfCase(self._source(condition), self.visit(statement)),
+                IfCase("", self.visit(else_statement))
             ]
         )
     
-def parse_statement_for(input_str:str, partial_ast:lark.Tree) -> Statement|None:
-    initialization, condition, update, statement = partial_ast.children
+    # ----- partial statement ----- #
     
-    return StatementFor(
-        partial_ast,
-        parse_statement_partial(input_str, initialization),
-        input_str[condition.meta.start_pos : condition.meta.end_pos],
-        parse_statement_partial(input_str, update),
-        parse_statement(input_str, statement)
-    )
+    def partialstmt(self, partial_ast:lark.Tree) -> StatementLine:
+        return self._statement(StatementLine, partial_ast, self._source(partial_ast))
     
-def parse_statement_while(input_str:str, partial_ast:lark.Tree) -> Statement|None:
-    condition, statement = partial_ast.children
+    def partialstmt_declaration(self, partial_ast:lark.Tree) -> Statement:
+        return self.visit(partial_ast.children[0])
     
-    return StatementWhile(
-        partial_ast,
-        input_str[condition.meta.start_pos : condition.meta.end_pos],
-        parse_statement(input_str, statement)
-    )
+    def partialstmt_global(self, partial_ast:lark.Tree) -> Statement:
+        # the coarse grammar keeps the GLOBAL declaration as one token, it is parsed in place by the 
+        # declaration rules of the basic grammar, so the positions are the positions in the input code
+        start, end = self._bounds(partial_ast)
+        with get_lark_parser_pool().checkout("basic", "lalr", "declaration", self.propagate_positions) as lark_parser:
+            declaration = lark_parser.parse(lark.utils.TextSlice(self.input_str, start.start_pos, end.end_pos))
+        return self.visit(declaration)
     
-def parse_statement_do_while(input_str:str, partial_ast:lark.Tree) -> Statement|None:
-    statement, condition = partial_ast.children
+    def partialstmt_yield(self, partial_ast:lark.Tree) -> StatementWait:
+        return self._statement(StatementWait, partial_ast, "")
     
-    return StatementDoWhile(
-        partial_ast,
-        input_str[condition.meta.start_pos : condition.meta.end_pos],
-        parse_statement(input_str, statement)
-    )
+    def partialstmt_wait(self, partial_ast:lark.Tree) -> StatementWait:
+        return self._statement(StatementWait, partial_ast, self._source(partial_ast.children[0]))
     
-def parse_statement_block(input_str:str, partial_ast:lark.Tree) -> StatementLine|None:
-    statements = partial_ast.children
+    def partialstmt_wait_until(self, partial_ast:lark.Tree) -> StatementWaitUnless:
+        return self._statement(StatementWaitUnless, partial_ast, self._source(partial_ast.children[0]))
     
-    ret_val = []
+    def partialstmt_break(self, partial_ast:lark.Tree) -> StatementBreak:
+        return self._statement(StatementBreak, partial_ast)
     
-    for statement in statements:
-        ret_stmt = parse_statement(input_str, statement)
-        if ret_stmt is not None:
-            ret_val.append(ret_stmt)
-        else:
-            # something wrong
-            pass
-        
-    return StatementBlock(partial_ast, ret_val)
-
-def parse_statement_declaration(input_str:str, partial_ast:lark.Tree) -> StatementDeclaration|None:
-    if partial_ast.data == "declaration":
-        return StatementLine(
-            partial_ast,
-            input_str[partial_ast.meta.start_pos : partial_ast.meta.end_pos]
-        )
-        
-    elif partial_ast.data == "declaration_global":
+    def partialstmt_continue(self, partial_ast:lark.Tree) -> StatementContinue:
+        return self._statement(StatementContinue, partial_ast)
+    
+    def partialstmt_return(self, partial_ast:lark.Tree) -> StatementReturn:
+        return self._statement(StatementReturn, partial_ast)
+    
+    # ----- declaration ----- #
+    
+    def declaration(self, partial_ast:lark.Tree) -> StatementLine:
+        return self._statement(StatementLine, partial_ast, self._source(partial_ast))
+    
+    def declaration_initialization(self, partial_ast:lark.Tree) -> StatementLine:
+        return self._statement(StatementLine, partial_ast, self._source(partial_ast))
+    
+    def declaration_class_init(self, partial_ast:lark.Tree) -> StatementLine:
+        return self._statement(StatementLine, partial_ast, self._source(partial_ast))
+    
+    def declaration_global(self, partial_ast:lark.Tree) -> StatementDeclaration:
         datatype, variable = partial_ast.children
-        return StatementDeclaration(
+        return self._statement(
+            StatementDeclaration,
             partial_ast,
-            input_str[datatype.meta.start_pos : datatype.meta.end_pos],
-            input_str[variable.meta.start_pos : variable.meta.end_pos],
+            self._source(datatype),
+            self._source(variable),
             True
         )
     
-    elif partial_ast.data == "declaration_initialization":
-        return StatementLine(
-            partial_ast,
-            input_str[partial_ast.meta.start_pos : partial_ast.meta.end_pos]
-        )
-        
-    elif partial_ast.data == "declaration_initialization_global":
+    def declaration_initialization_global(self, partial_ast:lark.Tree) -> StatementDeclarationInit:
         datatype, variable, expression = partial_ast.children
-        return StatementDeclarationInit(
+        return self._statement(
+            StatementDeclarationInit,
             partial_ast,
-            input_str[datatype.meta.start_pos : datatype.meta.end_pos],
-            input_str[variable.meta.start_pos : variable.meta.end_pos],
-            input_str[expression.meta.start_pos : expression.meta.end_pos],
+            self._source(datatype),
+            self._source(variable),
+            self._source(expression),
             True
         )
-        
-    elif partial_ast.data == "declaration_class_init":
-        return StatementLine(
-            partial_ast,
-            input_str[partial_ast.meta.start_pos : partial_ast.meta.end_pos]
-        )
-        
\ No newline at end of file
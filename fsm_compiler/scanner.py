@@ -0,0 +1,301 @@
+import os
+import re
+import mmap
+import hashlib
+import pathlib
+import logging
+logger = logging.getLogger(__name__)
+
+from dataclasses import dataclass
+from typing import Iterator
+
+from .ast_types import *
+from .parser import CHARACTERS, parse_to_AST
+from .cache import ParseResultCache
+from .assembler import generate_FSM_from_AST
+
+# -------------------------------------------------- #
+#                      Scanner                       #
+# -------------------------------------------------- #
+
+def _token_pattern(brackets:bool) -> str:
+    """tokens of the C/C++ code which hide or delimit an FSM function, built from `CHARACTERS`
+    
+    The brackets are only tokens inside the FSM functions, the code between the functions is 
+    skipped until the next comment, literal or `FSM` keyword.  
+    Each match skips the characters which cannot start a token, so the regular expression engine 
+    instead of python iterates over the ordinary code. The characters which start no token are 
+    matched as `other`.
+    """
+    escape = re.escape(CHARACTERS.ESCAPE)
+
+    def quoted(quotation_mark:str) -> str:
+        quotation_mark = re.escape(quotation_mark)
+        return r"{0}(?:{1}.|[^{0}{1}\n])*{0}".format(quotation_mark, escape)
+
+    tokens = [
+        r"(?P<comment>//[^\n]*|/\*.*?\*/)",
+        r"(?P<literal>{}|{})".format(quoted(CHARACTERS.DOUBLE_QUOTATION_MARK), quoted(CHARACTERS.SINGLE_QUOTATION_MARK)),
+        r"(?P<fsm>\bFSM\s+(?P<name>[a-zA-Z0-9_]+)\s*(?={}))".format(re.escape(CHARACTERS.OPEN_BRACKETS[0])),
+    ]
+    first_characters = ["/", CHARACTERS.DOUBLE_QUOTATION_MARK, CHARACTERS.SINGLE_QUOTATION_MARK, "F"]
+    if brackets:
+        tokens += [
+            r"(?P<open>[{}])".format(re.escape("".join(CHARACTERS.OPEN_BRACKETS))),
+            r"(?P<close>[{}])".format(re.escape("".join(CHARACTERS.CLOSING_BRACKETS))),
+        ]
+        first_characters += CHARACTERS.OPEN_BRACKETS + CHARACTERS.CLOSING_BRACKETS
+    tokens.append(r"(?P<other>.)")
+    return r"[^{}]*+(?:{})".format(re.escape("".join(first_characters)), "|".join(tokens))
+
+class _Syntax():
+    """the token patterns and characters, for either str or bytes source"""
+    def __init__(self, encode):
+        self.pattern = re.compile(encode(_token_pattern(brackets=False)), re.DOTALL)
+        self.pattern_brackets = re.compile(encode(_token_pattern(brackets=True)), re.DOTALL)
+        self.matching_brackets = {
+            encode(open_bracket): encode(closing_bracket)
+            for open_bracket, closing_bracket in zip(CHARACTERS.OPEN_BRACKETS, CHARACTERS.CLOSING_BRACKETS)
+        }
+        self.body_closing_bracket = encode("}")
+        self.newline = encode("\n")
+        self.newline_pattern = re.compile(re.escape(self.newline))
+
+_SYNTAX = _Syntax(lambda text: text)
+_SYNTAX_BYTES = _Syntax(lambda text: text.encode("utf-8"))
+
+@dataclass
+class FSMFunctionSource:
+    """source code of an FSM function found in a C/C++ source"""
+    function_name: str
+    code: str # starts at the `FSM` keyword, and ends at the closing bracket of the function body
+    start_pos: int # offset in the scanned source, it is the byte offset when the source is bytes or a file
+    end_pos: int
+    line: int # 1-based line number of the `FSM` keyword
+
+def find_fsm_functions(source:str|bytes|mmap.mmap, encoding:str="utf-8") -> Iterator[FSMFunctionSource]:
+    """Find every FSM function, `FSM name() { ... }`, in the C/C++ source
+
+    The source is scanned once. Comments, string literals and char literals are skipped, so the
+    brackets and `FSM` inside them are ignored. An FSM function ends at the bracket matching the
+    opening bracket of its body.
+
+    Parameters
+    ----------
+    source : str | bytes | mmap.mmap
+        the C/C++ source, e.g. a whole translation unit
+    encoding : str, optional
+        encoding of the bytes source, by default "utf-8"
+
+    Yields
+    ------
+    FSMFunctionSource
+        the FSM functions, in the order of the source
+    """
+    syntax = _SYNTAX if isinstance(source, str) else _SYNTAX_BYTES
+
+    line, line_pos = 1, 0
+    pos = 0
+    while (token := syntax.pattern.match(source, pos)) is not None:
+        pos = token.end()
+        if token.lastgroup != "fsm":
+            continue
+
+        start_pos = token.start("fsm")
+        function_name = token.group("name")
+        end_pos = _find_function_end(source, pos, syntax)
+        if end_pos is None:
+            logger.warning("Skip the FSM function %r at offset %d, its body is not found", function_name, start_pos)
+            continue
+        pos = end_pos
+
+        line += _count_newlines(source, line_pos, start_pos, syntax)
+        line_pos = start_pos
+
+        code = source[start_pos:end_pos]
+        if not isinstance(source, str):
+            function_name = function_name.decode(encoding)
+            code = code.decode(encoding)
+        yield FSMFunctionSource(function_name, code, start_pos, end_pos, line)
+
+def _count_newlines(source:str|bytes|mmap.mmap, start_pos:int, end_pos:int, syntax:_Syntax) -> int:
+    """the number of newlines between the offsets, the source is not copied"""
+    if isinstance(source, mmap.mmap):
+        # mmap has no `count()`, the newlines are matched in place
+        return len(syntax.newline_pattern.findall(source, start_pos, end_pos))
+    return source.count(syntax.newline, start_pos, end_pos)
+
+def _find_function_end(source:str|bytes|mmap.mmap, pos:int, syntax:_Syntax) -> int|None:
+    """match the brackets of the parameters and the body of an FSM function, return the end offset of the body
+    
+    Return None if the brackets do not match, or the body does not follow the parameters.
+    """
+    expected_brackets = []
+    parameters_end = None
+    while (token := syntax.pattern_brackets.match(source, pos)) is not None:
+        pos = token.end()
+        kind = token.lastgroup
+        if parameters_end is not None and len(expected_brackets) == 0:
+            # only spaces and comments are between the parameters and the body
+            if source[parameters_end:token.start(kind)].strip() or kind not in ("comment", "open"):
+                return None
+            parameters_end = pos
+            
+        if kind == "open":
+            expected_brackets.append(syntax.matching_brackets[token.group(kind)])
+            if parameters_end is not None and len(expected_brackets) == 1 and expected_brackets[0] != syntax.body_closing_bracket:
+                return None
+        elif kind == "close":
+            if len(expected_brackets) == 0 or expected_brackets.pop() != token.group(kind):
+                return None
+            if len(expected_brackets) == 0:
+                if parameters_end is not None:
+                    return pos
+                parameters_end = pos
+    return None
+
+def scan_fsm_file(path:str|pathlib.Path, encoding:str="utf-8") -> Iterator[FSMFunctionSource]:
+    """Find every FSM function in the C/C++ source file
+
+    The file is memory-mapped instead of read, so only the code of the FSM functions is copied.
+
+    Parameters
+    ----------
+    path : str | pathlib.Path
+        path of the C/C++ source file
+    encoding : str, optional
+        encoding of the source file, by default "utf-8"
+
+    Yields
+    ------
+    FSMFunctionSource
+        the FSM functions, in the order of the file, the offsets are byte offsets
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return # an empty file cannot be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            yield from find_fsm_functions(source, encoding)
+
+# -------------------------------------------------- #
+#                 Compile All Functions              #
+# -------------------------------------------------- #
+
+@dataclass
+class FSMCompileResult:
+    source: FSMFunctionSource
+    parse_result: ParseResult
+    fsm: FSMMachine
+
+def compile_fsm_functions(
+    functions:Iterator[FSMFunctionSource], grammar:str="basic", parser:str="earley", optimization_level:int=5,
+    parse_cache:ParseResultCache|None=None
+) -> Iterator[FSMCompileResult]:
+    """Parse the FSM functions and generate their FSMs, one function at a time
+
+    The functions are parsed in lean mode, so only the current function's lark AST is alive.
+
+    Parameters
+    ----------
+    functions : Iterator[FSMFunctionSource]
+        the FSM functions, e.g. `find_fsm_functions(source)` or `scan_fsm_file(path)`
+    grammar : str, optional
+        "basic", "experimental" or "coarse", by default "basic"  
+        "coarse" with the "lalr" parser is the fastest on functions of mostly ordinary statements, see `parse_to_AST()`
+    parser : str, optional
+        parsing algorithm, "earley" or "lalr", by default "earley"
+    optimization_level : int, optional
+        optimization level of the FSM, by default 5
+    parse_cache : ParseResultCache | None, optional
+        persistent cache of the parse results, the unchanged functions are not parsed again, by default None
+
+    Yields
+    ------
+    FSMCompileResult
+        the source, AST and FSM of each function, as soon as it is compiled
+    """
+    for function in functions:
+        parse_result = parse_to_AST(function.code, grammar, parser, lean=True, parse_cache=parse_cache)
+        yield FSMCompileResult(function, parse_result, generate_FSM_from_AST(parse_result, optimization_level))
+
+def compile_fsm_file(
+    path:str|pathlib.Path, grammar:str="basic", parser:str="earley", optimization_level:int=5, encoding:str="utf-8",
+    parse_cache:ParseResultCache|None=None
+) -> Iterator[FSMCompileResult]:
+    """Compile every FSM function in the C/C++ source file, see `scan_fsm_file()` and `compile_fsm_functions()`"""
+    return compile_fsm_functions(scan_fsm_file(path, encoding), grammar, parser, optimization_level, parse_cache)
+
+# -------------------------------------------------- #
+#                Incremental Compile                 #
+# -------------------------------------------------- #
+
+@dataclass
+class IncrementalCompileReport:
+    results: list[FSMCompileResult] # in the order of the source
+    reused: list[str] # names of the functions whose results are reused from the previous run
+    rebuilt: list[str] # names of the functions which are parsed and converted to FSM again
+    removed: list[str] # names of the functions of the previous run which are not in the source anymore
+
+class IncrementalCompiler():
+    """Compile the FSM functions of a source again and again, e.g. on every edit of the file
+    
+    The compiler remembers the hash of each function's code and its compile result from the previous 
+    run. Only the new and changed functions are parsed and converted to FSM, the results of the 
+    unchanged functions are reused, with their current positions in the source.
+    """
+    def __init__(
+        self, grammar:str="basic", parser:str="earley", optimization_level:int=5, 
+        parse_cache:ParseResultCache|None=None
+    ):
+        self.grammar = grammar
+        self.parser = parser
+        self.optimization_level = optimization_level
+        self.parse_cache = parse_cache
+        
+        self._results: dict[bytes, FSMCompileResult] = {} # keyed by the hash of the code
+    
+    def compile_functions(self, functions:Iterator[FSMFunctionSource]) -> IncrementalCompileReport:
+        """Compile the FSM functions, reuse the results of the functions whose code is unchanged
+
+        Parameters
+        ----------
+        functions : Iterator[FSMFunctionSource]
+            all the FSM functions of the source, e.g. `find_fsm_functions(source)` or `scan_fsm_file(path)`
+
+        Returns
+        -------
+        IncrementalCompileReport
+            the compile results, and the names of the reused, rebuilt and removed functions
+        """
+        report = IncrementalCompileReport([], [], [], [])
+        results = {}
+        for function in functions:
+            digest = hashlib.sha256(function.code.encode("utf-8")).digest()
+            
+            previous = results.get(digest, self._results.get(digest))
+            if previous is None:
+                parse_result = parse_to_AST(function.code, self.grammar, self.parser, lean=True, parse_cache=self.parse_cache)
+                result = FSMCompileResult(function, parse_result, generate_FSM_from_AST(parse_result, self.optimization_level))
+                report.rebuilt.append(function.function_name)
+            else:
+                result = FSMCompileResult(function, previous.parse_result, previous.fsm)
+                report.reused.append(function.function_name)
+            
+            results[digest] = result
+            report.results.append(result)
+        
+        function_names = {result.source.function_name for result in report.results}
+        report.removed = [
+            result.source.function_name for result in self._results.values() 
+            if result.source.function_name not in function_names
+        ]
+        self._results = results
+        return report
+    
+    def compile_source(self, source:str|bytes, encoding:str="utf-8") -> IncrementalCompileReport:
+        """Compile the FSM functions in the C/C++ source, see `compile_functions()`"""
+        return self.compile_functions(find_fsm_functions(source, encoding))
+    
+    def compile_file(self, path:str|pathlib.Path, encoding:str="utf-8") -> IncrementalCompileReport:
+        """Compile the FSM functions in the C/C++ source file, see `compile_functions()`"""
+        return self.compile_functions(scan_fsm_file(path, encoding))
@@ -0,0 +1,172 @@
+import os
+import json
+import socket
+import pathlib
+import hashlib
+import threading
+import socketserver
+import collections
+import logging
+logger = logging.getLogger(__name__)
+
+from .ast_types import FSMMachine
+from .parser import parse_to_AST
+from .assembler import generate_FSM_from_AST
+from .code_gen import generate_code_from_FSM, generate_graphviz_dot_visualization_from_FSM, generate_mermaid_visualization_from_FSM
+from .scanner import FSMFunctionSource, find_fsm_functions
+from .client import OUTPUT_KINDS
+from . import cache
+
+MEMO_SIZE = 4096 # compiled functions
+
+OUTPUT_GENERATORS = {
+    "cpp": generate_code_from_FSM,
+    "graphviz": generate_graphviz_dot_visualization_from_FSM,
+    "mermaid": generate_mermaid_visualization_from_FSM,
+}
+assert tuple(OUTPUT_GENERATORS) == OUTPUT_KINDS
+
+def generate_outputs(fsm:FSMMachine, outputs:list[str]) -> dict[str, str]:
+    """the generated code of each output kind, "cpp", "graphviz" or "mermaid", raise ValueError if a kind is unknown"""
+    for kind in outputs:
+        if kind not in OUTPUT_GENERATORS:
+            raise ValueError("Unknown output {!r}, expecting one of {}".format(kind, list(OUTPUT_GENERATORS)))
+    return {kind: OUTPUT_GENERATORS[kind](fsm) for kind in outputs}
+
+# -------------------------------------------------- #
+#                   Compile Server                   #
+# -------------------------------------------------- #
+
+class _MemoEntry():
+    __slots__ = ("fsm", "outputs")
+
+    def __init__(self, fsm:FSMMachine):
+        self.fsm = fsm
+        self.outputs: dict[str, str] = {}
+
+class CompileServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Compile server listening on a Unix domain socket, see `client.CompileClient` for the requests
+
+    Every build step which compiles an FSM file in a new process pays the Python startup, importing
+    lark, and loading the parsers. The server pays them once, and keeps the parsers, the parse result
+    cache and the generated code warm between the requests. The generated code of each function is
+    memoized by the hash of the function's code and the compile options, so only the new and changed
+    functions of a file are compiled again, and the least recently used `memo_size` functions are kept.
+
+    Each connection is served by its own thread, the parses are thread-safe, see `parse_to_AST()`.
+    """
+    daemon_threads = True
+
+    def __init__(
+        self, socket_path:str|pathlib.Path, parse_cache:cache.ParseResultCache|None=None, memo_size:int=MEMO_SIZE
+    ):
+        self.parse_cache = parse_cache
+        self.memo_size = memo_size
+        self.counters = collections.Counter({"requests": 0, "functions": 0, "compiled": 0, "memoized": 0, "errors": 0})
+        self._memo: collections.OrderedDict[tuple, _MemoEntry] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        super().__init__(str(socket_path), _CompileRequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+    def warm_up(self, parsers:tuple[tuple[str, str], ...]):
+        """construct the lark parsers of the (grammar, parser) pairs before the first request"""
+        for grammar, parser in parsers:
+            parse_to_AST("FSM warm_up() { YIELD; }", grammar, parser, lean=True)
+
+    def compile_function(
+        self, function:FSMFunctionSource, grammar:str, parser:str, optimization_level:int, outputs:list[str]
+    ) -> dict[str, str]:
+        """the generated code of the function, it is memoized"""
+        key = (hashlib.sha256(function.code.encode("utf-8")).digest(), grammar, parser, optimization_level)
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry is not None:
+                self._memo.move_to_end(key)
+
+        if entry is None:
+            parse_result = parse_to_AST(function.code, grammar, parser, lean=True, parse_cache=self.parse_cache)
+            entry = _MemoEntry(generate_FSM_from_AST(parse_result, optimization_level))
+            with self._lock:
+                self.counters["compiled"] += 1
+                self._memo[key] = entry
+                while len(self._memo) > self.memo_size:
+                    self._memo.popitem(last=False)
+        else:
+            with self._lock:
+                self.counters["memoized"] += 1
+
+        missing = [kind for kind in outputs if kind not in entry.outputs]
+        entry.outputs.update(generate_outputs(entry.fsm, missing))
+        return {kind: entry.outputs[kind] for kind in outputs}
+
+    def respond(self, request:dict) -> dict:
+        """the response to the request, an exception is the error of the request"""
+        command = request.get("command")
+        if command == "compile":
+            functions = []
+            for function in find_fsm_functions(request["source"]):
+                functions.append({
+                    "function_name": function.function_name,
+                    "line": function.line,
+                    "outputs": self.compile_function(
+                        function, request.get("grammar", "basic"), request.get("parser", "earley"),
+                        request.get("optimization_level", 5), request.get("outputs", ["cpp"])
+                    ),
+                })
+            with self._lock:
+                self.counters["functions"] += len(functions)
+            return {"functions": functions}
+        if command == "stats":
+            with self._lock:
+                return {"stats": dict(self.counters, memo_size=len(self._memo))}
+        if command == "shutdown":
+            # `shutdown()` waits for `serve_forever()`, which waits for this request, so it is called by another thread
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {}
+        raise ValueError("Unknown command {!r}".format(command))
+
+class _CompileRequestHandler(socketserver.StreamRequestHandler):
+    server: CompileServer
+
+    def handle(self):
+        # a connection sends any number of requests, one JSON object per line
+        for line in self.rfile:
+            try:
+                response = self.server.respond(json.loads(line))
+            except Exception as e:
+                logger.warning("Compile request failed: %s: %s", type(e).__name__, e)
+                response = {"error": "{}: {}".format(type(e).__name__, e)}
+                with self.server._lock:
+                    self.server.counters["errors"] += 1
+            with self.server._lock:
+                self.server.counters["requests"] += 1
+
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+def serve(
+    socket_path:str|pathlib.Path, parsers:tuple[tuple[str, str], ...]=(("basic", "earley"),),
+    parse_cache:cache.ParseResultCache|None=None, memo_size:int=MEMO_SIZE
+):
+    """Serve the compile requests on the Unix domain socket until a shutdown request
+
+    A socket file of a server which is not running anymore is removed. The lark parsers of `parsers`
+    are constructed before the first request.
+    """
+    socket_path = pathlib.Path(socket_path)
+    if socket_path.exists():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            if probe.connect_ex(str(socket_path)) == 0:
+                raise OSError("A compile server is already listening on {}".format(socket_path))
+        socket_path.unlink()
+
+    with CompileServer(socket_path, parse_cache, memo_size) as server:
+        server.warm_up(parsers)
+        logger.info("Compile server listening on %s", socket_path)
+        server.serve_forever()
@@ -11,6 +11,12 @@ import test_parser
 import test_assembler
 import test_ast_types
 import test_code_gen
+import test_cache
+import test_stress
+import test_scanner
+import test_import
+import test_server
+import test_graph
 
 if __name__ == "__main__":
     loader = unittest.TestLoader()
@@ -21,6 +27,12 @@ if __name__ == "__main__":
     suite.addTests(loader.loadTestsFromModule(test_assembler))
     suite.addTests(loader.loadTestsFromModule(test_ast_types))
     suite.addTests(loader.loadTestsFromModule(test_code_gen))
+    suite.addTests(loader.loadTestsFromModule(test_cache))
+    suite.addTests(loader.loadTestsFromModule(test_stress))
+    suite.addTests(loader.loadTestsFromModule(test_scanner))
+    suite.addTests(loader.loadTestsFromModule(test_import))
+    suite.addTests(loader.loadTestsFromModule(test_server))
+    suite.addTests(loader.loadTestsFromModule(test_graph))
 
     # initialize a runner, pass it your suite and run it
     runner = unittest.TextTestRunner(verbosity=1)
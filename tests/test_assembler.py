@@ -164,6 +164,19 @@ class TestOptimizedFSMAssemblerLevel1(unittest.TestCase):
         # print(code_gen.fsm_to_mermaid(fsm.starting_node))
         set_return = assembler.traverse_FSM(fsm.starting_node)
         self.assertEqual(len(set_return), 4)
+
+    def test_to_fsm_consecutive_code_blocks(self):
+        # the collapsed code blocks are concatenated, the blocks of the absorbed nodes are not modified
+        node_d = FSMNode(["d;"], [])
+        node_c = FSMNode(["c;"], [FSMTransition([], "", node_d)])
+        node_b = FSMNode(["b;"], [FSMTransition([], "", node_c)])
+        node_a = FSMNode([], [FSMTransition([], "", node_b)])
+        assembler.optimize_FSM_consecutive_states(node_a)
+
+        self.assertEqual(len(assembler.traverse_FSM(node_a)), 1)
+        self.assertEqual(list(node_a.code_block), ["b;", "c;", "d;"])
+        self.assertEqual(list(node_b.code_block), ["b;"])
+        self.assertEqual(list(node_c.code_block), ["c;"])
         
         
 class TestOptimizedFSMAssemblerLevel2(unittest.TestCase):
@@ -1993,6 +2006,146 @@ class TestAssembler_FORLoopStructualControl(unittest.TestCase):
         # print(code_gen.fsm_to_graphviz_dot(fsm.starting_node))
         set_return = assembler.traverse_FSM(fsm.starting_node)
         self.assertEqual(len(set_return), 2)
+
+
+class TestPredecessorIndex(unittest.TestCase):
+    FSM_FUNCTIONS = [
+        """
+        FSM function_name_opt9() { 
+            DO {
+                IF (a == 0) {
+                    b++;
+                    WAIT(100);
+                } ELSE IF (b == 0) {
+                    b--;
+                    WAIT(200);
+                } ELSE {
+                    BREAK;
+                }
+            } WHILE(true);
+            c = 1;
+        }
+        """,
+        """
+        FSM function_name_opt9() { 
+            FOR (GLOBAL int i = 0; i < 10; i++) {
+                IF (i == 5) { CONTINUE; }
+                WHILE (a) { a--; YIELD; }
+                x += i;
+            }
+            IF (x) { RETURN; }
+            y = 1;
+        }
+        """,
+    ]
+    
+    def assert_index(self, predecessors:assembler.PredecessorIndex, fsm_starting_node:FSMNode):
+        """the index has the transitions of `trace_back_transition()` scanning the whole fsm"""
+        for node in assembler.traverse_FSM(fsm_starting_node):
+            self.assertCountEqual(
+                map(id, predecessors.transitions_to(node)), 
+                map(id, assembler.trace_back_transition(node, fsm_starting_node))
+            )
+            self.assertEqual(predecessors.in_degree(node), len(assembler.trace_back_transition(node, fsm_starting_node)))
+    
+    def test_predecessor_index(self):
+        node_end = FSMNode([], [])
+        node_b = FSMNode(["b"], [FSMTransition([], "", node_end)])
+        node_a = FSMNode(["a"], [FSMTransition([], "x", node_b), FSMTransition([], "", node_end)])
+        node_start = FSMNode([], [FSMTransition([], "", node_a)])
+        predecessors = assembler.PredecessorIndex(node_start)
+        self.assert_index(predecessors, node_start)
+        self.assertEqual(predecessors.transitions_to(node_start), [])
+        self.assertEqual(predecessors.in_degree(node_end), 2)
+        
+        # bypass node_a, it is not reachable anymore, and its transitions are removed
+        predecessors.retarget(node_start.transitions[0], node_b)
+        self.assertIs(node_start.transitions[0].target_node, node_b)
+        self.assert_index(predecessors, node_start)
+        self.assertEqual(predecessors.in_degree(node_a), 0)
+        self.assertEqual(predecessors.in_degree(node_end), 1)
+        
+        # node_start takes the transitions of node_b
+        node_start.transitions = node_b.transitions
+        predecessors.update_transitions(node_start)
+        self.assert_index(predecessors, node_start)
+        self.assertEqual(predecessors.in_degree(node_b), 0)
+        self.assertEqual(predecessors.transitions_to(node_end), [node_b.transitions[0]])
+        
+        # changed in place, node_a and node_b are reachable again, node_b shares the list of node_start
+        node_start.transitions.insert(0, FSMTransition([], "y", node_a))
+        predecessors.update_transitions(node_start)
+        self.assert_index(predecessors, node_start)
+        self.assertEqual(predecessors.in_degree(node_b), 1)
+        self.assertEqual(predecessors.in_degree(node_end), 3)
+    
+    def test_predecessor_index_shared_transitions(self):
+        node_end = FSMNode([], [])
+        node_b = FSMNode(["b"], [FSMTransition([], "", node_end)])
+        node_a = FSMNode(["a"], [FSMTransition([], "x", node_b), FSMTransition([], "", node_end)])
+        node_start = FSMNode([], [FSMTransition([], "x", node_a), FSMTransition([], "", node_b)])
+        predecessors = assembler.PredecessorIndex(node_start)
+        
+        # node_a shares the list of node_b, which is still reachable, its transitions count twice
+        node_a.transitions = node_b.transitions
+        predecessors.update_transitions(node_a)
+        self.assert_index(predecessors, node_start)
+        self.assertEqual(predecessors.in_degree(node_end), 2)
+        self.assertEqual(predecessors.in_degree(node_b), 1)
+        
+        node_b.transitions.append(FSMTransition([], "", node_a))
+        predecessors.update_transitions(node_b)
+        self.assert_index(predecessors, node_start)
+        self.assertEqual(predecessors.in_degree(node_a), 3)
+    
+    def test_predecessor_index_optimizations(self):
+        for s in self.FSM_FUNCTIONS:
+            fsm = assembler.convert_to_raw_state_machine(parser.parse_to_AST(s))
+            predecessors = assembler.PredecessorIndex(fsm.starting_node)
+            
+            # the optimizations keep the index up to date
+            for level in (1, 2, 3, 4, 5, 1, 2, 3, 4, 5, 10):
+                assembler.OPTIMIZATION_STRATEGIES[level](fsm.starting_node, predecessors)
+                self.assert_index(predecessors, fsm.starting_node)
+    
+    def test_predecessor_index_large_fsm(self):
+        lines = []
+        for i in range(30):
+            lines.append("IF (a{0} == 1) {{ x = {0}; }} ELSE {{ x++; }}".format(i))
+            lines.append("WHILE (a{0} < 10) {{ a{0} += 1; YIELD; }}".format(i))
+            lines.append("b = {};".format(i))
+        s = "FSM function_large() {{ {} }}".format(" ".join(lines))
+        parse_result = parser.parse_to_AST(s, "basic", "lalr", lean=True)
+        
+        # the optimizations with the index never scan the whole fsm for the transitions to a node 
+        class ScanningPredecessorIndex(assembler.PredecessorIndex):
+            scans = 0
+            def transitions_to(self, fsm_node:FSMNode) -> list[FSMTransition]:
+                ScanningPredecessorIndex.scans += 1
+                return assembler.trace_back_transition(fsm_node, self.starting_node)
+        
+        traverse_FSM = assembler.traverse_FSM
+        traversals = 0
+        def counting_traverse_FSM(fsm_starting_node:FSMNode) -> set[FSMNode]:
+            nonlocal traversals
+            traversals += 1
+            return traverse_FSM(fsm_starting_node)
+        
+        fsm = assembler.convert_to_raw_state_machine(parse_result)
+        node_count = len(assembler.traverse_FSM(fsm.starting_node))
+        assembler.traverse_FSM = counting_traverse_FSM
+        try:
+            assembler.optimize_FSM(fsm.starting_node, 10)
+        finally:
+            assembler.traverse_FSM = traverse_FSM
+        self.assertEqual(traversals, 0)
+        
+        fsm_scanning = assembler.convert_to_raw_state_machine(parse_result)
+        predecessors = ScanningPredecessorIndex(fsm_scanning.starting_node)
+        for level in (1, 2, 3, 4, 5, 10):
+            assembler.OPTIMIZATION_STRATEGIES[level](fsm_scanning.starting_node, predecessors)
+        self.assertGreater(ScanningPredecessorIndex.scans, node_count)
+        self.assertEqual(code_gen.generate_code_from_FSM(fsm), code_gen.generate_code_from_FSM(fsm_scanning))
     
 if __name__ == "__main__":
     logging.basicConfig(level=logging.CRITICAL)
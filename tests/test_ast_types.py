@@ -10,8 +10,25 @@ import unittest
 
 import fsm_compiler.parser as parser
 import fsm_compiler.assembler as assembler
+import fsm_compiler.code_gen as code_gen
 from fsm_compiler.ast_types import *
 
+# `generate_FSM_from_AST(parse_to_AST(FSM_PREVIOUS_RELEASE_CODE), 1)` pickled by the release before the slotted
+# FSMNode and FSMTransition, the objects are pickled with their `__dict__`, without node ids and code blocks
+FSM_PREVIOUS_RELEASE_CODE = "FSM f() { GLOBAL int a = 0; WHILE (a < 3) { a++; WAIT(10); } x = 1; }"
+FSM_PREVIOUS_RELEASE_PICKLE = (
+    "gASVrQIAAAAAAACMFmZzbV9jb21waWxlci5hc3RfdHlwZXOUjApGU01NYWNoaW5llJOUKYGUfZQojBBnbG9iYWxfdmFyaWFibGVz"
+    "lF2UaACMDEZTTUdsb2JhbFZhcpSTlCmBlH2UKIwIdmFyX3R5cGWUjANpbnSUjAh2YXJfbmFtZZSMAWGUdWJhjBFnbG9iYWxfY29k"
+    "ZV9ibG9ja5RdlIwbX19ERUNMQVJFX1RJTUVfVkFSSUFCTEUoZik7lGGMDXN0YXJ0aW5nX25vZGWUaACMB0ZTTU5vZGWUk5QpgZR9"
+    "lCiMCmNvZGVfYmxvY2uUXZSMBmEgPSAwO5RhjAt0cmFuc2l0aW9uc5RdlGgAjA1GU01UcmFuc2l0aW9ulJOUKYGUfZQoaBddlIwJ"
+    "Y29uZGl0aW9ulIwAlIwLdGFyZ2V0X25vZGWUaBQpgZR9lChoF12UaBpdlChoHSmBlH2UKGgXXZRoIYwFYSA8IDOUaCNoFCmBlH2U"
+    "KGgXXZQojARhKys7lIwbX19SRUdJU1RFUl9DVVJSRU5UX1RJTUUoZik7lGVoGl2UaB0pgZR9lChoF12UaCFoImgjaBQpgZR9lCho"
+    "F12UaBpdlGgdKYGUfZQoaBddlGghaCJoI2gkdWJhjAtjb2xsYXBzaWJsZZSJjA9lbnRyeV9jb25kaXRpb26UjBdfX0lTX1RJTUVf"
+    "UEFTU0VEKGYsIDEwKZR1YnViYWg8iGg9aCJ1YnViaB0pgZR9lChoF12UaCFoImgjaBQpgZR9lChoF12UjAZ4ID0gMTuUYWgaXZRo"
+    "HSmBlH2UKGgXXZRoIWgiaCNoFCmBlH2UKGgXXZRoGl2UaDyJaD1oInVidWJhaDyIaD1oInVidWJlaDyJaD1oInVidWJhaDyJaD1o"
+    "InVijAhmc21fbmFtZZSMAWaUdWIu"
+)
+
 class TestASTTypes(unittest.TestCase):
     def test_copy_by_reference(self):
         s = StatementLine(None, "123")
@@ -19,6 +36,198 @@ class TestASTTypes(unittest.TestCase):
         self.assertEqual(id(res.starting_node), id(res.ending_node))
         self.assertEqual(res.global_variables, [])
 
+    def test_fsm_node_identity(self):
+        node = FSMNode(["x++;"], [])
+        node_equal = FSMNode(["x++;"], [])
+        transition = FSMTransition([], "a", node)
+        node.transitions.append(transition)
+
+        # the nodes and transitions are compared and hashed by identity, even if their fields are equal
+        self.assertEqual(node, node)
+        self.assertNotEqual(node, node_equal)
+        self.assertNotEqual(transition, FSMTransition([], "a", node))
+        self.assertEqual(len({node, node_equal, node}), 2)
+        self.assertIn(transition, {transition: 1})
+
+        # slotted, without `__dict__`
+        self.assertFalse(hasattr(node, "__dict__"))
+        self.assertFalse(hasattr(transition, "__dict__"))
+        with self.assertRaises(AttributeError):
+            node.state_number = 2
+
+    def test_fsm_node_pickle(self):
+        import pickle
+        parse_result = parser.parse_to_AST("FSM f() { WHILE (a) { x++; YIELD; } }", "basic", "lalr")
+        fsm = assembler.convert_to_raw_state_machine(parse_result)
+
+        fsm_copy = pickle.loads(pickle.dumps(fsm))
+        nodes = assembler.traverse_FSM(fsm.starting_node)
+        nodes_copy = assembler.traverse_FSM(fsm_copy.starting_node)
+        self.assertEqual(len(nodes), len(nodes_copy))
+        self.assertTrue(nodes.isdisjoint(nodes_copy))
+        self.assertEqual(
+            sorted(code for node in nodes for code in node.code_block),
+            sorted(code for node in nodes_copy for code in node.code_block)
+        )
+        self.assertEqual(sorted(node.node_id for node in nodes), sorted(node.node_id for node in nodes_copy))
+
+    def test_fsm_node_pickle_previous_release(self):
+        import base64
+        import pickle
+        fsm = pickle.loads(base64.b64decode(FSM_PREVIOUS_RELEASE_PICKLE))
+        fsm_expected = assembler.generate_FSM_from_AST(parser.parse_to_AST(FSM_PREVIOUS_RELEASE_CODE, "basic", "lalr"), 1)
+
+        nodes = assembler.traverse_FSM(fsm.starting_node)
+        nodes_expected = assembler.traverse_FSM(fsm_expected.starting_node)
+        self.assertEqual(len(nodes), len(nodes_expected))
+        self.assertEqual(len({node.node_id for node in nodes}), len(nodes)) # new unique ids
+        for node in nodes:
+            self.assertIsInstance(node.code_block, CodeBlock)
+            for transition in node.transitions:
+                self.assertIsInstance(transition.code_block, CodeBlock)
+        self.assertEqual(
+            sorted((tuple(node.code_block), node.entry_condition, len(node.transitions)) for node in nodes),
+            sorted((tuple(node.code_block), node.entry_condition, len(node.transitions)) for node in nodes_expected)
+        )
+        self.assertEqual(fsm.global_variables, fsm_expected.global_variables)
+        self.assertIn("void f() {", code_gen.generate_code_from_FSM(fsm))
+
+    def test_fsm_node_ids(self):
+        code = "FSM f() { WHILE (a) { IF (b) { BREAK; } x++; YIELD; } RETURN; y++; }"
+        fsm_return = parser.parse_to_AST(code, "basic", "lalr").to_fsm()
+        nodes = assembler.traverse_FSM(fsm_return.starting_node)
+
+        # numbered from 0 in the order of the lowering, the same source gets the same ids
+        self.assertEqual(sorted(node.node_id for node in nodes), list(range(len(nodes))))
+        FSMNode([], []) # takes a serial number
+        fsm_return_again = parser.parse_to_AST(code, "basic", "lalr").to_fsm()
+        self.assertEqual(fsm_return_again.starting_node.node_id, fsm_return.starting_node.node_id)
+        self.assertEqual(fsm_return_again.ending_node.node_id, fsm_return.ending_node.node_id)
+        self.assertEqual(
+            sorted((node.node_id, tuple(node.code_block)) for node in nodes),
+            sorted((node.node_id, tuple(node.code_block)) for node in assembler.traverse_FSM(fsm_return_again.starting_node))
+        )
+
+        # a node created outside of the lowering gets a unique serial number
+        self.assertNotEqual(FSMNode([], []).node_id, FSMNode([], []).node_id)
+
+    def test_code_block(self):
+        block_a = CodeBlock(["a;", "b;"])
+        block_c = CodeBlock(["c;"])
+        block = block_a + block_c + ["d;"]
+
+        self.assertEqual(len(block), 4)
+        self.assertEqual(list(block), ["a;", "b;", "c;", "d;"])
+        self.assertEqual(block[-1], "d;")
+        self.assertEqual(block, CodeBlock(["a;", "b;", "c;", "d;"]))
+        self.assertEqual(hash(block), hash(CodeBlock(["a;", "b;", "c;", "d;"])))
+        self.assertEqual(["z;"] + block_c, CodeBlock(["z;", "c;"]))
+        self.assertEqual(list(block_a), ["a;", "b;"]) # not modified
+
+        # the empty block is the neutral element
+        self.assertIs(block_a + CodeBlock(), block_a)
+        self.assertIs(CodeBlock() + block_a, block_a)
+
+        # the nodes and transitions convert a list
+        node = FSMNode(["x++;"], [FSMTransition([], "", FSMNode([], []))])
+        self.assertIsInstance(node.code_block, CodeBlock)
+        self.assertIsInstance(node.transitions[0].code_block, CodeBlock)
+
+    def test_code_block_assigned_list(self):
+        parse_result = parser.parse_to_AST("FSM f() { x++; YIELD; y++; }", "basic", "lalr")
+        fsm = assembler.convert_to_raw_state_machine(parse_result)
+        fsm_expected = assembler.convert_to_raw_state_machine(parse_result)
+        for fsm_machine in [fsm, fsm_expected]:
+            fsm_machine.starting_node.code_block = CodeBlock(["x = 1;"])
+
+        # a list assigned after the construction, like before `CodeBlock`
+        fsm.starting_node.code_block = ["x = 1;"]
+        fsm.starting_node.transitions[0].code_block = []
+        self.assertEqual(code_gen.generate_code_from_FSM(fsm), code_gen.generate_code_from_FSM(fsm_expected))
+        self.assertEqual(
+            code_gen.generate_mermaid_visualization_from_FSM(fsm), code_gen.generate_mermaid_visualization_from_FSM(fsm_expected)
+        )
+
+        assembler.optimize_FSM(fsm.starting_node, 10)
+        assembler.optimize_FSM(fsm_expected.starting_node, 10)
+        self.assertEqual(code_gen.generate_code_from_FSM(fsm), code_gen.generate_code_from_FSM(fsm_expected))
+
+    def test_code_block_long_chain(self):
+        import pickle
+        # the concatenation of a long chain, in both orders, is flattened without recursion
+        block_forward = CodeBlock()
+        block_backward = CodeBlock()
+        for i in range(100000):
+            block_forward += CodeBlock(["x{};".format(i)])
+            block_backward = CodeBlock(["x{};".format(99999 - i)]) + block_backward
+
+        self.assertEqual(len(block_forward), 100000)
+        self.assertEqual(block_forward, block_backward)
+        self.assertEqual(block_forward[0], "x0;")
+        self.assertEqual(block_forward[-1], "x99999;")
+        self.assertEqual(pickle.loads(pickle.dumps(block_backward)), block_backward)
+
+class TestSourceText(unittest.TestCase):
+    def test_source_text(self):
+        source = "FSM f() { x = \"a\"; }"
+        text = SourceText(source, 10, 17)
+
+        self.assertEqual(text, "x = \"a\"")
+        self.assertEqual("x = \"a\"", text)
+        self.assertNotEqual(text, "x = \"a")
+        self.assertNotEqual(text, "x = \"b\"")
+        self.assertEqual(text, SourceText("{x = \"a\"}", 1, 8))
+        self.assertEqual(hash(text), hash("x = \"a\""))
+
+        self.assertEqual(str(text), "x = \"a\"")
+        self.assertEqual("{};".format(text), "x = \"a\";")
+        self.assertEqual(len(text), 7)
+        self.assertIn("\"a\"", text)
+        self.assertNotIn("}", text)
+        self.assertTrue(text)
+        self.assertFalse(SourceText(source, 3, 3))
+        self.assertEqual(SourceText(source, 3, 3), "")
+
+    def test_source_text_zero_copy(self):
+        s = "FSM f() { WHILE (a < 1) { x = 1; } }"
+        res = parser.parse_to_AST(s)
+
+        loop = res.statements.lines[0]
+        self.assertIsInstance(loop.condition, SourceText)
+        self.assertIs(loop.condition.source, s)
+        self.assertIs(loop.statements.lines[0].block.source, s)
+
+        # the text is converted to str when it is lowered to FSM
+        fsm = loop.to_fsm("f")
+        self.assertIs(type(fsm.starting_node.transitions[0].condition), str)
+        self.assertEqual(fsm.starting_node.transitions[0].condition, "a < 1")
+
+class TestInternText(unittest.TestCase):
+    def test_intern_text(self):
+        source = "a == 0; a == 0"
+        text = intern_text(SourceText(source, 0, 6))
+        self.assertIs(type(text), str)
+        self.assertEqual(text, "a == 0")
+        self.assertIs(intern_text(SourceText(source, 8, 14)), text)
+        self.assertIs(intern_text("".join(["a == ", "0"])), text)
+
+    def test_intern_lowered_text(self):
+        s1 = "FSM f() { IF (a == 0) { x++; } WHILE (a == 0) { x++; WAIT(100); } WAIT(100); }"
+        s2 = "FSM g() { WAIT_UNLESS(a == 0); x++; }"
+        fsm1 = assembler.generate_FSM_from_AST(parser.parse_to_AST(s1, parser="lalr"))
+        fsm2 = assembler.generate_FSM_from_AST(parser.parse_to_AST(s2, parser="lalr"))
+
+        texts = {}
+        for fsm in [fsm1, fsm2]:
+            for node in assembler.traverse_FSM(fsm.starting_node):
+                for text in node.code_block + [node.entry_condition] + [transition.condition for transition in node.transitions]:
+                    texts.setdefault(text, set()).add(id(text))
+
+        # identical text of all the FSMs is one object
+        self.assertGreater(len(texts), 3)
+        for text, ids in texts.items():
+            self.assertEqual(len(ids), 1, text)
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.CRITICAL)
     # logging.basicConfig(level=logging.WARNING)
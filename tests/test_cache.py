@@ -0,0 +1,235 @@
+import sys
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import pickle
+import tempfile
+import unittest
+import unittest.mock
+
+import fsm_compiler.cache as cache
+import fsm_compiler.parser as parser
+
+
+class UnpicklingMarker():
+    def __init__(self, path:str):
+        self.path = path
+    
+    def __reduce__(self):
+        return (pathlib.Path.touch, (pathlib.Path(self.path),))
+
+class TestGrammarCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache_path = pathlib.Path(self.cache_dir.name)
+        
+    def tearDown(self):
+        self.cache_dir.cleanup()
+    
+    def cached_files(self) -> list[pathlib.Path]:
+        return list((self.cache_path / cache.GRAMMAR_CACHE_SUBDIR).glob("*.pickle"))
+    
+    def test_cache_cold_and_warm(self):
+        s = "FSM function_name1() { IF (a == 1) { print(\"hello\"); } }"
+        
+        cold_parser = cache.load_lark_parser(parser.PATH_LARK_BASIC_PARSER, self.cache_path, start="fsm_func", propagate_positions=True)
+        self.assertEqual(len(self.cached_files()), 1)
+        
+        warm_parser = cache.load_lark_parser(parser.PATH_LARK_BASIC_PARSER, self.cache_path, start="fsm_func", propagate_positions=True)
+        self.assertEqual(len(self.cached_files()), 1)
+        
+        self.assertEqual(cold_parser.parse(s), warm_parser.parse(s))
+        
+    def test_cache_lalr(self):
+        s = "FSM function_name1() { IF (a == 1) { print(\"hello\"); } ELSE { a = b + c * d; } }"
+        
+        cold_parser = cache.load_lark_parser(parser.PATH_LARK_BASIC_PARSER_LALR, self.cache_path, start="fsm_func", parser="lalr", propagate_positions=True)
+        warm_parser = cache.load_lark_parser(parser.PATH_LARK_BASIC_PARSER_LALR, self.cache_path, start="fsm_func", parser="lalr", propagate_positions=True)
+        self.assertIsNot(cold_parser, warm_parser)
+        
+        self.assertEqual(cold_parser.parse(s), warm_parser.parse(s))
+        
+    def test_cache_key_by_options(self):
+        cache.load_lark_parser(parser.PATH_LARK_BASIC_PARSER, self.cache_path, start="fsm_func", propagate_positions=True)
+        cache.load_lark_parser(parser.PATH_LARK_BASIC_PARSER, self.cache_path, start="fsm_func", propagate_positions=False)
+        cache.load_lark_parser(parser.PATH_LARK_EXPERIMENTAL_PARSER, self.cache_path, start="fsm_func", propagate_positions=True)
+        self.assertEqual(len(self.cached_files()), 3)
+        
+    def test_cache_key_by_grammar(self):
+        key1 = cache.grammar_cache_key("start: WORD", start="start")
+        key2 = cache.grammar_cache_key("start: WORD WORD", start="start")
+        key3 = cache.grammar_cache_key("start: WORD", start="start")
+        self.assertNotEqual(key1, key2)
+        self.assertEqual(key1, key3)
+        
+    def test_corrupted_cache(self):
+        s = "FSM function_name1() { something; }"
+        cache.load_lark_parser(parser.PATH_LARK_BASIC_PARSER, self.cache_path, start="fsm_func")
+        
+        for cached_file in self.cached_files():
+            cached_file.write_bytes(b"corrupted")
+        
+        lark_parser = cache.load_lark_parser(parser.PATH_LARK_BASIC_PARSER, self.cache_path, start="fsm_func")
+        self.assertEqual(lark_parser.parse(s).children[0].value, "function_name1")
+        
+        # the corrupted cache is replaced
+        self.assertNotEqual(self.cached_files()[0].read_bytes(), b"corrupted")
+        
+    def test_cache_dir_private(self):
+        cache_path = self.cache_path / "nested" / "cache"
+        cache.load_lark_parser(parser.PATH_LARK_BASIC_PARSER, cache_path, start="fsm_func")
+        
+        for directory in [self.cache_path / "nested", cache_path, cache_path / cache.GRAMMAR_CACHE_SUBDIR]:
+            self.assertEqual(directory.stat().st_mode & 0o777, 0o700)
+        
+    def test_untrusted_cache(self):
+        cache.load_lark_parser(parser.PATH_LARK_BASIC_PARSER, self.cache_path, start="fsm_func")
+        
+        # unpickling the file would create the marker file
+        marker = self.cache_path / "marker"
+        cached_file, = self.cached_files()
+        cached_file.write_bytes(pickle.dumps(UnpicklingMarker(str(marker))))
+        
+        # the file is not owned by the current user, it is never unpickled
+        with unittest.mock.patch.object(cache.os, "getuid", return_value=os.getuid() + 1):
+            with self.assertRaises(PermissionError):
+                cache.read_cache_file(cached_file)
+            lark_parser = cache.load_lark_parser(parser.PATH_LARK_BASIC_PARSER, self.cache_path, start="fsm_func")
+        self.assertFalse(marker.exists())
+        self.assertEqual(lark_parser.parse("FSM f() { x; }").children[0].value, "f")
+        
+    def test_cache_dir_from_environment(self):
+        environ = dict(os.environ)
+        try:
+            os.environ[cache.ENV_CACHE_DIR] = self.cache_dir.name
+            os.environ.pop(cache.ENV_DISABLE_CACHE, None)
+            self.assertEqual(cache.get_cache_dir(), self.cache_path)
+            
+            os.environ[cache.ENV_DISABLE_CACHE] = "1"
+            self.assertIsNone(cache.get_cache_dir())
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+class TestParseResultCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache_path = pathlib.Path(self.cache_dir.name)
+        self.parse_cache = cache.ParseResultCache(self.cache_path)
+        
+    def tearDown(self):
+        self.cache_dir.cleanup()
+    
+    def cached_files(self) -> list[pathlib.Path]:
+        return list((self.cache_path / cache.PARSE_CACHE_SUBDIR).glob("*.pickle"))
+    
+    def test_cache_miss_and_hit(self):
+        s = "FSM function_name1() { IF (a == 1) { print(\"hello\"); } GLOBAL int b = 2; WAIT(10); }"
+        
+        cold = parser.parse_to_AST(s, parser="lalr", parse_cache=self.parse_cache)
+        self.assertEqual(self.parse_cache.stats(), {"hits": 0, "misses": 1, "evictions": 0})
+        self.assertEqual(len(self.cached_files()), 1)
+        
+        warm = parser.parse_to_AST(s, parser="lalr", parse_cache=self.parse_cache)
+        self.assertEqual(self.parse_cache.stats(), {"hits": 1, "misses": 1, "evictions": 0})
+        
+        self.assertIsNot(cold, warm)
+        self.assertEqual(cold, warm)
+        self.assertEqual(warm, parser.parse_to_AST(s, parser="lalr"))
+        self.assertIsNone(warm.lark_ast)
+        self.assertEqual(warm.statements.lines[1].span, cold.statements.lines[1].span)
+        
+    def test_cache_key(self):
+        s = "FSM function_name1() { something; }"
+        key = self.parse_cache.key(s, parser.PATH_LARK_BASIC_PARSER, "earley")
+        
+        self.assertEqual(key, self.parse_cache.key(s, parser.PATH_LARK_BASIC_PARSER, "earley"))
+        self.assertNotEqual(key, self.parse_cache.key(s + " ", parser.PATH_LARK_BASIC_PARSER, "earley"))
+        self.assertNotEqual(key, self.parse_cache.key(s, parser.PATH_LARK_EXPERIMENTAL_PARSER, "earley"))
+        self.assertNotEqual(key, self.parse_cache.key(s, parser.PATH_LARK_BASIC_PARSER, "lalr"))
+        
+    def test_cache_key_grammar_dependencies(self):
+        s = "FSM function_name1() { GLOBAL int a = 0; something; }"
+        self.assertEqual(
+            parser.get_grammar_paths("coarse", "lalr"), [parser.PATH_LARK_COARSE_PARSER, parser.PATH_LARK_BASIC_PARSER_LALR]
+        )
+        self.assertEqual(parser.get_grammar_paths("basic", "lalr"), [parser.PATH_LARK_BASIC_PARSER_LALR])
+        
+        # an edit of the basic grammar, which parses the GLOBAL declarations of the coarse grammar, changes the key
+        basic_grammar = parser.PATH_LARK_BASIC_PARSER_LALR.read_text()
+        edited_grammar = self.cache_path / "edited.lark"
+        edited_grammar.write_text(basic_grammar + "\n// edited\n")
+        self.assertNotEqual(
+            self.parse_cache.key(s, [parser.PATH_LARK_COARSE_PARSER, parser.PATH_LARK_BASIC_PARSER_LALR], "lalr"),
+            self.parse_cache.key(s, [parser.PATH_LARK_COARSE_PARSER, edited_grammar], "lalr")
+        )
+        
+    def test_cache_eviction(self):
+        sources = ["FSM function_name{0}() {{ a{0} = {0}; YIELD; }}".format(i) for i in range(4)]
+        
+        parser.parse_to_AST(sources[0], parse_cache=self.parse_cache)
+        size = self.cached_files()[0].stat().st_size
+        self.parse_cache.max_size = size * 5 // 2 # room for 2 results
+        
+        for i, s in enumerate(sources[1:], 1):
+            # the modification time orders the files
+            for path in self.cached_files():
+                os.utime(path, (i, i))
+            parser.parse_to_AST(s, parse_cache=self.parse_cache)
+        
+        self.assertEqual(self.parse_cache.evictions, 2)
+        self.assertEqual(len(self.cached_files()), 2)
+        
+        # the most recent ones are kept
+        parser.parse_to_AST(sources[3], parse_cache=self.parse_cache)
+        parser.parse_to_AST(sources[0], parse_cache=self.parse_cache)
+        self.assertEqual(self.parse_cache.stats(), {"hits": 1, "misses": 5, "evictions": 3})
+        
+    def test_cache_eviction_scans(self):
+        sources = ["FSM function_name{0}() {{ a{0} = {0}; YIELD; }}".format(i) for i in range(20)]
+        scans = []
+        evict = self.parse_cache.evict
+        self.parse_cache.evict = lambda: scans.append(1) or evict()
+        
+        # the directory is scanned by the first store only, while the cache is not full
+        for s in sources:
+            parser.parse_to_AST(s, parser="lalr", parse_cache=self.parse_cache)
+        self.assertEqual(len(scans), 1)
+        self.assertEqual(self.parse_cache._size, sum(path.stat().st_size for path in self.cached_files()))
+        
+        # storing the same key again replaces the size of the file
+        key = self.parse_cache.key(sources[0], parser.PATH_LARK_BASIC_PARSER_LALR, "lalr")
+        self.parse_cache.store(key, parser.parse_to_AST(sources[0], parser="lalr", lean=True))
+        self.assertEqual(len(scans), 1)
+        self.assertEqual(self.parse_cache._size, sum(path.stat().st_size for path in self.cached_files()))
+        
+        # a store beyond the total size scans the directory, and evicts
+        self.parse_cache.max_size = self.parse_cache._size
+        parser.parse_to_AST("FSM function_name() { b = 1; }", parser="lalr", parse_cache=self.parse_cache)
+        self.assertEqual(len(scans), 2)
+        self.assertEqual(self.parse_cache.evictions, 1)
+        self.assertLessEqual(self.parse_cache._size, self.parse_cache.max_size)
+        
+    def test_corrupted_cache(self):
+        s = "FSM function_name1() { something; }"
+        parser.parse_to_AST(s, parse_cache=self.parse_cache)
+        
+        for cached_file in self.cached_files():
+            cached_file.write_bytes(b"corrupted")
+        
+        res = parser.parse_to_AST(s, parse_cache=self.parse_cache)
+        self.assertEqual(res.function_name, "function_name1")
+        self.assertEqual(self.parse_cache.stats(), {"hits": 0, "misses": 2, "evictions": 0})
+        
+        # the corrupted cache is replaced
+        self.assertEqual(parser.parse_to_AST(s, parse_cache=self.parse_cache), res)
+        self.assertEqual(self.parse_cache.hits, 1)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.CRITICAL)
+    # logging.basicConfig(level=logging.WARNING)
+    unittest.main()
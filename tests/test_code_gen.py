@@ -5,7 +5,9 @@ sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
 import logging
 logger = logging.getLogger(__name__)
 
+import os
 import unittest
+import subprocess
 
 import fsm_compiler.parser as parser
 import fsm_compiler.assembler as assembler
@@ -92,7 +94,7 @@ class TestCodeGenMermaid(unittest.TestCase):
         fsm = assembler.generate_FSM_from_AST(parser.generate_AST_from_code(s))
         # print(code_gen.generate_code_from_FSM(fsm))
         # print(code_gen.fsm_to_mermaid(fsm.starting_node))
-        self.assertEqual(len(code_gen.generate_mermaid_visualization_from_FSM(fsm)), 766)
+        self.assertEqual(len(code_gen.generate_mermaid_visualization_from_FSM(fsm)), 530)
         
     def test_code_gen_2(self):
         s = """
@@ -114,7 +116,7 @@ class TestCodeGenMermaid(unittest.TestCase):
         fsm = assembler.generate_FSM_from_AST(parser.generate_AST_from_code(s))
         # print(code_gen.generate_code_from_FSM(fsm))
         # print(code_gen.generate_mermaid_visualization_from_FSM(fsm))
-        self.assertEqual(len(code_gen.generate_mermaid_visualization_from_FSM(fsm)), 822)
+        self.assertEqual(len(code_gen.generate_mermaid_visualization_from_FSM(fsm)), 589)
         
 class TestCodeGenGraphvizDot(unittest.TestCase):
     def test_code_gen_1(self):
@@ -135,7 +137,7 @@ class TestCodeGenGraphvizDot(unittest.TestCase):
         fsm = assembler.generate_FSM_from_AST(parser.generate_AST_from_code(s))
         # print(code_gen.generate_code_from_FSM(fsm))
         # print(code_gen.generate_graphviz_dot_visualization_from_FSM(fsm))
-        self.assertEqual(len(code_gen.generate_graphviz_dot_visualization_from_FSM(fsm)), 959)
+        self.assertEqual(len(code_gen.generate_graphviz_dot_visualization_from_FSM(fsm)), 723)
         
     def test_code_gen_2(self):
         s = """
@@ -157,7 +159,57 @@ class TestCodeGenGraphvizDot(unittest.TestCase):
         fsm = assembler.generate_FSM_from_AST(parser.generate_AST_from_code(s))
         # print(code_gen.generate_code_from_FSM(fsm))
         # print(code_gen.generate_graphviz_dot_visualization_from_FSM(fsm))
-        self.assertEqual(len(code_gen.generate_graphviz_dot_visualization_from_FSM(fsm)), 1003)
+        self.assertEqual(len(code_gen.generate_graphviz_dot_visualization_from_FSM(fsm)), 770)
+
+CODE_DETERMINISTIC = """
+FSM function_deterministic() { 
+    GLOBAL int a = 0;
+    DO {
+        IF (a == 0) {
+            b++;
+            WAIT(100);
+        } ELSE IF (b == 0) {
+            b--;
+            YIELD;
+        } ELSE {
+            BREAK;
+        }
+    } WHILE(a != 0);
+    RETURN;
+}
+"""
+
+def generate_all_outputs(code:str, optimization_level:int) -> str:
+    fsm = assembler.generate_FSM_from_AST(parser.generate_AST_from_code(code), optimization_level)
+    return "\n".join([
+        code_gen.generate_code_from_FSM(fsm), 
+        code_gen.generate_mermaid_visualization_from_FSM(fsm), 
+        code_gen.generate_graphviz_dot_visualization_from_FSM(fsm),
+        code_gen.fsm_to_mermaid(fsm.starting_node, debug=True),
+    ])
+
+class TestCodeGenDeterministic(unittest.TestCase):
+    def test_same_output_in_process(self):
+        for optimization_level in [0, 1, 5, 10]:
+            output = generate_all_outputs(CODE_DETERMINISTIC, optimization_level)
+            generate_all_outputs("FSM other() { x++; YIELD; }", optimization_level)
+            self.assertEqual(generate_all_outputs(CODE_DETERMINISTIC, optimization_level), output)
+        
+    def test_same_output_across_processes(self):
+        # the node ids do not depend on the memory addresses or the string hashes of the process
+        code = (
+            "import sys, test_code_gen; "
+            "sys.stdout.write(test_code_gen.generate_all_outputs(test_code_gen.CODE_DETERMINISTIC, 10))"
+        )
+        outputs = [
+            subprocess.run(
+                [sys.executable, "-c", code], cwd=pathlib.Path(__file__).parent, capture_output=True, check=True,
+                env={**os.environ, "PYTHONHASHSEED": str(hash_seed)}
+            ).stdout
+            for hash_seed in [1, 2]
+        ]
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0].decode(), generate_all_outputs(CODE_DETERMINISTIC, 10))
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.CRITICAL)
@@ -0,0 +1,166 @@
+import sys
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import unittest
+
+import fsm_compiler.parser as parser
+import fsm_compiler.assembler as assembler
+import fsm_compiler.code_gen as code_gen
+from fsm_compiler.graph import FSMGraph
+from fsm_compiler.ast_types import *
+
+FSM_FUNCTIONS = [
+    """
+    FSM function_while() {
+        GLOBAL int a = 0;
+        WHILE(a == 0) {
+            print(\"work 0\");
+            YIELD;
+        }
+        print(\"done\");
+    }
+    """,
+    """
+    FSM function_branches() {
+        DO {
+            IF (a == 0) {
+                b++;
+                WAIT(100);
+            } ELSE IF (b == 0) {
+                b--;
+                WAIT(200);
+            } ELSE {
+                BREAK;
+            }
+        } WHILE(true);
+        c = 1;
+    }
+    """,
+    """
+    FSM function_for() {
+        FOR (int i = 0; i < 10; i++) {
+            IF (i == 5) { CONTINUE; }
+            x += i;
+            YIELD;
+        }
+        RETURN;
+    }
+    """,
+]
+
+def raw_fsm(code:str) -> FSMMachine:
+    return assembler.convert_to_raw_state_machine(parser.parse_to_AST(code, "basic", "lalr", lean=True))
+
+class TestFSMGraph(unittest.TestCase):
+    def test_graph_round_trip(self):
+        for code in FSM_FUNCTIONS:
+            fsm = raw_fsm(code)
+            graph = FSMGraph.from_fsm(fsm)
+            nodes = assembler.traverse_FSM(fsm.starting_node)
+
+            self.assertEqual(graph.node_count, len(nodes))
+            self.assertEqual(graph.transition_count, sum(len(node.transitions) for node in nodes))
+            self.assertEqual(graph.conditions[0], "")
+            self.assertEqual(graph.code_blocks[0], ())
+            self.assertEqual(graph.fsm_name, fsm.fsm_name)
+            self.assertEqual(graph.global_variables, fsm.global_variables)
+            self.assertEqual(graph.global_code_block, fsm.global_code_block)
+
+            # the conversion is lossless, the node ids only depend on the structure
+            fsm_copy = graph.to_fsm()
+            self.assertEqual(FSMGraph.from_fsm(fsm_copy), graph)
+            self.assertEqual(code_gen.generate_code_from_FSM(fsm_copy), code_gen.generate_code_from_FSM(fsm))
+            self.assertTrue(assembler.traverse_FSM(fsm_copy.starting_node).isdisjoint(nodes))
+
+    def test_graph_transitions(self):
+        fsm = raw_fsm(FSM_FUNCTIONS[0])
+        graph = FSMGraph.from_fsm(fsm)
+
+        # the transitions of each node are in the order of their priority
+        nodes = [fsm.starting_node]
+        for node in nodes:
+            for transition in node.transitions:
+                if transition.target_node not in nodes:
+                    nodes.append(transition.target_node)
+        node_ids = {node: node_id for node_id, node in enumerate(nodes)}
+        for node, node_id in node_ids.items():
+            self.assertEqual(list(graph.successors(node_id)), [node_ids[transition.target_node] for transition in node.transitions])
+            self.assertEqual(
+                [graph.conditions[graph.transition_condition[transition]] for transition in graph.transitions(node_id)],
+                [transition.condition for transition in node.transitions]
+            )
+            self.assertEqual(graph.conditions[graph.node_entry_condition[node_id]], node.entry_condition)
+            self.assertEqual(graph.code_blocks[graph.node_code_block[node_id]], node.code_block.lines)
+            self.assertEqual(bool(graph.node_collapsible[node_id]), node.collapsible)
+
+    def test_graph_analyses(self):
+        for code in FSM_FUNCTIONS:
+            fsm = raw_fsm(code)
+            graph = FSMGraph.from_fsm(fsm)
+            fsm_copy = graph.to_fsm()
+            nodes = [fsm_copy.starting_node]
+            for node in nodes:
+                for transition in node.transitions:
+                    if transition.target_node not in nodes:
+                        nodes.append(transition.target_node)
+
+            self.assertEqual(list(graph.reachable()), [1] * graph.node_count)
+            self.assertEqual(graph.uses_wait(), assembler.check_wait_statement_usage(fsm.starting_node))
+            self.assertIs(nodes[graph.ending_node()], assembler.get_ending_node_of_FSM(fsm_copy.starting_node))
+
+            sources = graph.transition_sources()
+            offsets, transitions = graph.predecessors()
+            in_degrees = graph.in_degrees()
+            for node_id, node in enumerate(nodes):
+                traced_back = assembler.trace_back_transition(node, fsm_copy.starting_node)
+                predecessors = transitions[offsets[node_id]:offsets[node_id + 1]]
+                self.assertEqual(in_degrees[node_id], len(traced_back))
+                self.assertEqual(len(predecessors), len(traced_back))
+                self.assertEqual(
+                    sorted(graph.conditions[graph.transition_condition[transition]] for transition in predecessors),
+                    sorted(transition.condition for transition in traced_back)
+                )
+                for transition in predecessors:
+                    self.assertEqual(graph.transition_target[transition], node_id)
+                    self.assertIn(transition, graph.transitions(sources[transition]))
+
+    def test_graph_state_numbers(self):
+        graph = FSMGraph.from_fsm(raw_fsm(FSM_FUNCTIONS[0]))
+        state_numbers = graph.state_numbers()
+        ending_node = graph.ending_node()
+
+        self.assertEqual(state_numbers[0], 0)
+        self.assertEqual(state_numbers[ending_node], 1)
+        # the other nodes are numbered in the order of `FSMNode.node_id`
+        node_ids = sorted(range(graph.node_count), key=lambda node_id: graph.node_ids[node_id])
+        self.assertEqual(
+            [state_numbers[node_id] for node_id in node_ids if node_id not in (0, ending_node)],
+            list(range(10, 10 + graph.node_count - 2))
+        )
+
+    def test_graph_collapse_consecutive_states(self):
+        for code in FSM_FUNCTIONS:
+            fsm = raw_fsm(code)
+            graph = FSMGraph.from_fsm(fsm)
+            collapsed = graph.collapse_consecutive_states()
+
+            assembler.optimize_FSM_consecutive_states(fsm.starting_node)
+            self.assertEqual(collapsed, FSMGraph.from_fsm(fsm))
+            self.assertLess(collapsed.node_count, graph.node_count)
+            self.assertEqual(graph, FSMGraph.from_fsm(raw_fsm(code))) # not modified
+
+    def test_graph_optimized(self):
+        for code in FSM_FUNCTIONS:
+            fsm = assembler.generate_FSM_from_AST(parser.parse_to_AST(code, "basic", "lalr", lean=True), 10)
+            graph = FSMGraph.from_fsm(fsm)
+            self.assertEqual(FSMGraph.from_fsm(graph.to_fsm()), graph)
+            self.assertEqual(code_gen.generate_code_from_graph(graph), code_gen.generate_code_from_FSM(fsm))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.CRITICAL)
+    # logging.basicConfig(level=logging.WARNING)
+    unittest.main()
@@ -0,0 +1,86 @@
+import sys
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import pickle
+import unittest
+import subprocess
+
+import fsm_compiler.parser as parser
+import fsm_compiler.assembler as assembler
+
+PROJECT_ROOT = pathlib.Path(__file__).parent.parent
+
+# `import lark` raises ImportError when the module is None in `sys.modules`
+CODE_BLOCK_LARK = "import sys; sys.modules['lark'] = None; "
+
+def run_python(code:str, input:bytes|None=None) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, input=input, capture_output=True, check=True)
+
+class TestImport(unittest.TestCase):
+    def test_import_without_lark(self):
+        code = CODE_BLOCK_LARK + "import fsm_compiler, fsm_compiler.ast_types, fsm_compiler.assembler, fsm_compiler.code_gen"
+        run_python(code)
+
+    def test_generate_code_without_lark(self):
+        s = "FSM function_name1() { GLOBAL int a = 0; WHILE (a < 10) { a++; WAIT(100); } }"
+        fsm = assembler.generate_FSM_from_AST(parser.parse_to_AST(s, parser="lalr", lean=True))
+
+        code = CODE_BLOCK_LARK + (
+            "import pickle, fsm_compiler; "
+            "print(fsm_compiler.generate_code_from_FSM(pickle.loads(sys.stdin.buffer.read())))"
+        )
+        res = run_python(code, input=pickle.dumps(fsm))
+        self.assertIn(b"void function_name1() {", res.stdout)
+
+    def test_parser_imported_on_first_access(self):
+        code = CODE_BLOCK_LARK + "import fsm_compiler; fsm_compiler.parse_to_AST"
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            run_python(code)
+        self.assertIn(b"import of lark halted", context.exception.stderr)
+
+    def test_star_import(self):
+        code = (
+            "from fsm_compiler import *; "
+            "print(parse_to_AST.__name__, generate_FSM_from_AST.__name__, generate_code_from_FSM.__name__, "
+            "generate_mermaid_visualization_from_FSM.__name__, CompileClient.__name__)"
+        )
+        res = run_python(code)
+        self.assertEqual(
+            res.stdout.split(), 
+            [b"parse_to_AST", b"generate_FSM_from_AST", b"generate_code_from_FSM", b"generate_mermaid_visualization_from_FSM", b"CompileClient"]
+        )
+
+    def test_submodule_attributes(self):
+        code = (
+            "import fsm_compiler; "
+            "print(*[module.__name__ for module in [fsm_compiler.ast_types, fsm_compiler.assembler, fsm_compiler.code_gen, "
+            "fsm_compiler.parser, fsm_compiler.graph, fsm_compiler.scanner, fsm_compiler.client]])"
+        )
+        res = run_python(code)
+        self.assertEqual(
+            res.stdout.split(),
+            [b"fsm_compiler.ast_types", b"fsm_compiler.assembler", b"fsm_compiler.code_gen", b"fsm_compiler.parser",
+            b"fsm_compiler.graph", b"fsm_compiler.scanner", b"fsm_compiler.client"]
+        )
+        self.assertIn(b"ast_types", run_python("import fsm_compiler; print(dir(fsm_compiler))").stdout)
+
+    def test_import_time(self):
+        # `-X importtime` lists every module imported by the compile client, the listing is deterministic,
+        # unlike the import time itself
+        res = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import fsm_compiler.client"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        )
+        modules = [line.rsplit("|", 1)[-1].strip() for line in res.stderr.splitlines() if "|" in line]
+
+        self.assertIn("fsm_compiler.client", modules)
+        for module in ["lark", "fsm_compiler.parser", "fsm_compiler.cache", "fsm_compiler.scanner", "fsm_compiler.ast_types"]:
+            self.assertNotIn(module, modules)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.CRITICAL)
+    # logging.basicConfig(level=logging.WARNING)
+    unittest.main()
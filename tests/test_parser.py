@@ -5,24 +5,32 @@ sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
 import logging
 logger = logging.getLogger(__name__)
 
+import tempfile
 import unittest
+import subprocess
+
+import lark
 
 import fsm_compiler.parser as parser
+import fsm_compiler.cache as cache
 import fsm_compiler.ast_types as ast_types
 
 
 class TestParserBasic(unittest.TestCase):
     
+    def parse(self, s:str) -> ast_types.ParseResult:
+        return parser.parse_to_AST(s)
+    
     def test_parser_basic(self):
         s = "FSM function_name1() {}"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
         
         self.assertEqual(res.function_name, "function_name1")
         self.assertEqual(res.statements.lines, [])
         
     def test_parser_single_statement(self):
         s = "FSM function_name2() { something;    something_else; }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
         
         self.assertEqual(res.function_name, "function_name2")
         self.assertEqual(res.statements.lines[0].block, "something")
@@ -30,7 +38,7 @@ class TestParserBasic(unittest.TestCase):
         
     def test_parser_declaration_and_string(self):
         s = "FSM function_name3() { str something.this = \";\" ; regular.statement = \"regular\\\" escaped \\\"\"; }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
         
         self.assertEqual(res.function_name, "function_name3")
         self.assertEqual(res.statements.lines[0].block, "str something.this = \";\"")
@@ -38,7 +46,7 @@ class TestParserBasic(unittest.TestCase):
         
     def test_parser_name_scope(self):
         s = "FSM function_name4() { std::string hello.world = 2; std::printf(\"hello\"); }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
         
         self.assertEqual(res.function_name, "function_name4")
         self.assertEqual(res.statements.lines[0].block, "std::string hello.world = 2")
@@ -46,7 +54,7 @@ class TestParserBasic(unittest.TestCase):
         
     def test_parser_declaration(self):
         s = "FSM function_name5() { std::vector a(0, 0); GLOBAL float f; int i = 5+5; int j; GLOBAL std::string s = \"123\"; unsigned int x=0; }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
         
         self.assertEqual(res.function_name, "function_name5")
         self.assertEqual(res.statements.lines[0].block, "std::vector a(0, 0)")
@@ -70,7 +78,7 @@ class TestParserBasic(unittest.TestCase):
         
     def test_parser_for_loop(self):
         s = "FSM function_name6() { FOR(GLOBAL int i = 0; i < 1000; i++ ) FOR(GLOBAL int i = 0; i < 1000; i++ ) { printf(\"Hello, world!\"); } }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
 
         self.assertEqual(res.function_name, "function_name6")
         
@@ -107,7 +115,7 @@ class TestParserBasic(unittest.TestCase):
     
     def test_parser_while_loop(self):
         s = "FSM function_name7() { WHILE(true) {WHILE(false) {}} }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
         
         self.assertEqual(res.function_name, "function_name7")
         
@@ -123,7 +131,7 @@ class TestParserBasic(unittest.TestCase):
     
     def test_parser_do_while_loop(self):
         s = "FSM function_name8() { DO{WHILE(false) {}} WHILE(true); }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
     
         self.assertEqual(res.function_name, "function_name8")
         
@@ -139,7 +147,7 @@ class TestParserBasic(unittest.TestCase):
     
     def test_parser_if(self):
         s = "FSM function_name9() { IF(a==1) { print (\"hello, world!\"); } }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
         
         self.assertEqual(res.function_name, "function_name9")
         
@@ -150,7 +158,7 @@ class TestParserBasic(unittest.TestCase):
     
     def test_parser_if_else(self):
         s = "FSM function_name10() { IF(a==1) { print (\"hello, world!\"); } ELSE { print(\"hello, alt world!\"); } }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
 
         self.assertEqual(res.function_name, "function_name10")
         
@@ -163,7 +171,7 @@ class TestParserBasic(unittest.TestCase):
        
     def test_parser_if_else_chained(self):
         s = "FSM function_name10a() { IF(a==1) { print (\"hello, world!\"); } ELSE IF (a==2) { print(\"hello, alt world!\"); } }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
 
         self.assertEqual(res.function_name, "function_name10a")
         
@@ -180,7 +188,7 @@ class TestParserBasic(unittest.TestCase):
         
     def test_parser_if_else_2(self):
         s = "FSM function_name10a() { cin >> n; IF(a==1) print (\"hello, world!\"); ELSE print(\"hello, alt world!\"); }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
 
         self.assertEqual(res.function_name, "function_name10a")
         
@@ -194,7 +202,7 @@ class TestParserBasic(unittest.TestCase):
         
     def test_parser_if_else_chained_3(self):
         s = "FSM function_name10a() { cin >> n; IF(a==1) { print (\"hello, world!\"); } ELSE IF (a==2) { print(\"hello, alt world!\"); }  }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
 
         self.assertEqual(res.function_name, "function_name10a")
         
@@ -211,7 +219,7 @@ class TestParserBasic(unittest.TestCase):
         
     def test_parser_yield_wait_waitunless(self):
         s = "FSM function_name11() { YIELD; WAIT(1000/2); WAIT_UNLESS(false); }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
         
         self.assertEqual(res.function_name, "function_name11")
         
@@ -253,7 +261,7 @@ class TestParserBasic(unittest.TestCase):
             return 0;
         }
         """
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
         
         self.assertEqual(res.function_name, "func_cpp_test_code")
         self.assertEqual(len(res.statements.lines), 11)
@@ -264,7 +272,7 @@ class TestParserBasic(unittest.TestCase):
             cin >> n; IF ( n % 2 == 0) cout << n << " is even."; ELSE cout << n << " is odd.";
         }
         """
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
         self.assertEqual(len(res.statements.lines), 2)
         
     def test_parser_cpp_comment(self):
@@ -296,20 +304,328 @@ class TestParserBasic(unittest.TestCase):
             return 0;   //  safe exit
         }
         """
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
         
         self.assertEqual(res.function_name, "func_cpp_test_code")
         self.assertEqual(len(res.statements.lines), 11)
         
     def test_parser_break_continue_return(self):
         s = "FSM function_name_cbr() { BREAK; CONTINUE; RETURN; }"
-        res = parser.parse_to_AST(s)
+        res = self.parse(s)
         
         self.assertEqual(res.function_name, "function_name_cbr")
         self.assertIsInstance(res.statements.lines[0], ast_types.StatementBreak)
         self.assertIsInstance(res.statements.lines[1], ast_types.StatementContinue)
         self.assertIsInstance(res.statements.lines[2], ast_types.StatementReturn)
+
+    def test_parser_string_and_char_literal(self):
+        s = "FSM function_name_literal() { print(\"IF (a) { WAIT(b); } // not a comment\", '\\'', '\"'); s = \"\\\\\"; c = ';'; }"
+        res = self.parse(s)
+
+        self.assertEqual(res.function_name, "function_name_literal")
+        self.assertEqual(len(res.statements.lines), 3)
+        self.assertEqual(res.statements.lines[0].block, "print(\"IF (a) { WAIT(b); } // not a comment\", '\\'', '\"')")
+        self.assertEqual(res.statements.lines[1].block, "s = \"\\\\\"")
+        self.assertEqual(res.statements.lines[2].block, "c = ';'")
+
+        # a literal is a single token
+        tokens = list(res.statements.lines[0].lark_ast.scan_values(lambda v: isinstance(v, lark.Token)))
+        self.assertIn("\"IF (a) { WAIT(b); } // not a comment\"", tokens)
+        self.assertIn("'\\''", tokens)
+
+
+class TestParserBasicLALR(TestParserBasic):
+    """run all basic parser tests with the LALR parser, and compare to the result of the Earley parser"""
+    
+    def parse(self, s:str) -> ast_types.ParseResult:
+        res = parser.parse_to_AST(s, parser="lalr")
+        self.assertEqual(res, parser.parse_to_AST(s, parser="earley"))
+        return res
+    
+    def test_parser_lalr_operator_precedence(self):
+        s = "FSM function_name1() { a = b + c * -d; IF (a == 1 && b || c != d << 2) { x >>= 1; } }"
+        res = self.parse(s)
+        
+        self.assertEqual(res.statements.lines[0].block, "a = b + c * -d")
+        self.assertEqual(res.statements.lines[1].cases[0].condition, "a == 1 && b || c != d << 2")
+        self.assertEqual(res.statements.lines[1].cases[0].statements.lines[0].block, "x >>= 1")
+        
+    def test_parser_lalr_multiword_datatype(self):
+        s = "FSM function_name1() { GLOBAL unsigned long int x = 0; }"
+        res = parser.parse_to_AST(s, parser="lalr")
+        
+        line0: parser.StatementDeclarationInit = res.statements.lines[0]
+        self.assertEqual(line0.datatype, "unsigned long int")
+        self.assertEqual(line0.variable, "x")
+        self.assertEqual(line0.expression, "0")
+        
+    def test_parser_lalr_block_before_declaration(self):
+        # the expected divergence: the declaration type of the Earley grammar is an expression, so Earley
+        # parses a block followed by a declaration as a single statement, LALR parses the block on its own
+        s = "FSM f() { { } x0 = 4; }"
+        res = parser.parse_to_AST(s, parser="lalr")
+        res_earley = parser.parse_to_AST(s, parser="earley")
+
+        self.assertEqual(len(res.statements.lines), 2)
+        self.assertIsInstance(res.statements.lines[0], ast_types.StatementBlock)
+        self.assertEqual(res.statements.lines[0].lines, [])
+        self.assertEqual(res.statements.lines[1].block, "x0 = 4")
+        self.assertEqual(len(res_earley.statements.lines), 1)
+        self.assertEqual(res_earley.statements.lines[0].block, "{ } x0 = 4")
+        
+    def test_parser_lalr_unavailable(self):
+        with self.assertRaises(ValueError):
+            parser.parse_to_AST("FSM function_name1() {}", grammar="experimental", parser="lalr")
+    
+
+class TestParserCoarse(TestParserBasic):
+    """run all basic parser tests with the coarse grammar, and compare to the result of the LALR parser"""
     
+    def parse(self, s:str) -> ast_types.ParseResult:
+        res = parser.parse_to_AST(s, grammar="coarse", parser="lalr")
+        self.assertEqual(res, parser.parse_to_AST(s, parser="lalr"))
+        return res
+    
+    def test_parser_string_and_char_literal(self):
+        s = "FSM function_name_literal() { print(\"IF (a) { WAIT(b); } // not a comment\", '\\'', '\"'); s = \"\\\\\"; c = ';'; }"
+        res = self.parse(s)
+
+        self.assertEqual(len(res.statements.lines), 3)
+        self.assertEqual(res.statements.lines[0].block, "print(\"IF (a) { WAIT(b); } // not a comment\", '\\'', '\"')")
+        self.assertEqual(res.statements.lines[2].block, "c = ';'")
+
+        # an ordinary statement is a single token
+        tokens = list(res.statements.lines[0].lark_ast.scan_values(lambda v: isinstance(v, lark.Token)))
+        self.assertEqual(tokens, [res.statements.lines[0].block])
+    
+    def test_parser_coarse_span(self):
+        s = "FSM function_name1() {\n  IF ( a ) { WAIT(b); } // wait\n  x = \"text\" ;\n  GLOBAL unsigned long int i = 0;\n}"
+        res = parser.parse_to_AST(s, grammar="coarse", parser="lalr", lean=True)
+        res_lalr = parser.parse_to_AST(s, parser="lalr", lean=True)
+
+        self.assertEqual(res.span, res_lalr.span)
+        for line, line_lalr in zip(res.statements.lines, res_lalr.statements.lines):
+            self.assertEqual(line.span, line_lalr.span)
+        wait = res.statements.lines[0].cases[0].statements.lines[0]
+        self.assertEqual(wait.span, res_lalr.statements.lines[0].cases[0].statements.lines[0].span)
+        
+        line2: parser.StatementDeclarationInit = res.statements.lines[2]
+        self.assertEqual(line2.datatype, "unsigned long int")
+        self.assertEqual(line2.variable, "i")
+        self.assertEqual(line2.expression, "0")
+        
+    def test_parser_coarse_opaque_statements(self):
+        s = """FSM function_name1() {
+            table[i][j] = p->x; /* not parsed by the basic grammar */
+            do { x++; } while (x < 10);
+            if (a) b; else if (c) { d; } else e;
+            switch (x) { case 1: y; break; }
+            FOR (int i = 0; i < n; i++) { WAIT(ready(i)); }
+        }"""
+        res = parser.parse_to_AST(s, grammar="coarse", parser="lalr")
+        
+        lines = res.statements.lines
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[0].block, "table[i][j] = p->x")
+        self.assertEqual(lines[1].block, "do { x++; } while (x < 10);")
+        self.assertEqual(lines[2].block, "if (a) b; else if (c) { d; } else e;")
+        self.assertEqual(lines[3].block, "switch (x) { case 1: y; break; }")
+        self.assertEqual(lines[4].initialization.block, "int i = 0")
+        self.assertEqual(lines[4].condition, "i < n")
+        self.assertEqual(lines[4].statements.lines[0].wait_time_ms, "ready(i)")
+        
+    def test_parser_coarse_invalid(self):
+        for s in ["FSM f() { x = (1; }", "FSM f() { x = 1 }", "FSM f() { IF (a { x; } }", "FSM f() { WAIT; }"]:
+            with self.subTest(s=s), self.assertRaises(lark.exceptions.UnexpectedInput):
+                parser.parse_to_AST(s, grammar="coarse", parser="lalr")
+    
+    def test_parser_coarse_unavailable(self):
+        with self.assertRaises(ValueError):
+            parser.parse_to_AST("FSM function_name1() {}", grammar="coarse", parser="earley")
+
+
+class TestParserGrammarSelection(unittest.TestCase):
+    
+    def test_parser_lazy_construction(self):
+        code = "import fsm_compiler.parser as parser; print(len(parser._LARK_PARSERS))"
+        res = subprocess.run([sys.executable, "-c", code], cwd=pathlib.Path(__file__).parent.parent, capture_output=True, text=True, check=True)
+        self.assertEqual(res.stdout.strip(), "0")
+        
+    def test_parser_basic_grammar(self):
+        s = "FSM function_name1() { something; }"
+        res = parser.parse_to_AST(s, grammar="basic")
+        
+        self.assertEqual(res.function_name, "function_name1")
+        self.assertEqual(res.statements.lines[0].block, "something")
+        self.assertIs(parser.LARK_BASIC_PARSER, parser.get_lark_parser("basic"))
+        
+    def test_parser_experimental_grammar(self):
+        s = "FSM function_name1() { std::vector<int> a; GLOBAL std::vector<int> b; }"
+        res = parser.generate_AST_from_code(s, grammar="experimental")
+        
+        self.assertEqual(res.function_name, "function_name1")
+        self.assertEqual(res.statements.lines[0].block, "std::vector<int> a")
+        
+        line1: parser.StatementDeclaration = res.statements.lines[1]
+        self.assertEqual(line1.datatype, "std::vector<int>")
+        self.assertEqual(line1.variable, "b")
+        self.assertIs(parser.LARK_EXPERIMENTAL_PARSER, parser.get_lark_parser("experimental"))
+        
+    def test_parser_keyword_not_identifier(self):
+        # a keyword is never the name of a declaration, the Earley parser used to take `{  } BREAK` for the
+        # declaration of a variable `BREAK` of type `{  }`
+        res = parser.parse_to_AST("FSM f() { {  } BREAK; }", grammar="basic", parser="earley")
+        self.assertEqual(len(res.statements.lines), 2)
+        self.assertIsInstance(res.statements.lines[0], ast_types.StatementBlock)
+        self.assertEqual(res.statements.lines[0].lines, [])
+        self.assertIsInstance(res.statements.lines[1], ast_types.StatementBreak)
+
+        # an identifier still is
+        res = parser.parse_to_AST("FSM f() { { } x = 1; }", grammar="basic", parser="earley")
+        self.assertEqual(len(res.statements.lines), 1)
+        self.assertIsInstance(res.statements.lines[0], ast_types.StatementLine)
+        self.assertEqual(res.statements.lines[0].block, "{ } x = 1")
+
+    def test_parser_unknown_grammar(self):
+        with self.assertRaises(ValueError):
+            parser.parse_to_AST("FSM function_name1() {}", grammar="unknown")
+
+
+class TestParserLean(unittest.TestCase):
+
+    def iter_statements(self, statement):
+        yield statement
+        for child in vars(statement).values():
+            if isinstance(child, ast_types.Statement):
+                yield from self.iter_statements(child)
+            elif isinstance(child, list):
+                for item in child:
+                    yield from self.iter_statements(item.statements if isinstance(item, ast_types.IfCase) else item)
+
+    def test_parser_lean(self):
+        s = "FSM function_name1() {\n  IF (a) { WAIT(b); }\n  FOR (GLOBAL int i = 0; i < 3; i++) x = \"text\";\n}"
+        res_lean = parser.parse_to_AST(s, lean=True)
+        res_full = parser.parse_to_AST(s)
+
+        self.assertEqual(res_lean, res_full)
+
+        statements = list(self.iter_statements(res_lean))
+        self.assertEqual(len(statements), 9)
+        for statement in statements:
+            self.assertIsNone(statement.lark_ast)
+            self.assertIsInstance(statement.span, ast_types.SourceSpan)
+
+    def test_parser_span(self):
+        s = "FSM function_name1() {\n  IF (a) { WAIT(b); }\n  x = \"text\";\n}"
+        res = parser.parse_to_AST(s, lean=True)
+
+        self.assertEqual(res.span, ast_types.SourceSpan(0, len(s), 1, 1, 4, 2))
+
+        line1 = res.statements.lines[1]
+        self.assertEqual(s[line1.span.start_pos : line1.span.end_pos], "x = \"text\"")
+        self.assertEqual((line1.span.line, line1.span.column, line1.span.end_line, line1.span.end_column), (3, 3, 3, 13))
+
+        wait = res.statements.lines[0].cases[0].statements.lines[0]
+        self.assertEqual(s[wait.span.start_pos : wait.span.end_pos], "WAIT(b)")
+
+    def test_parser_token_bounds(self):
+        s = (
+            "FSM function_name1() {\n  IF ((a)) { WAIT(f(b)); } ELSE x++;\n  DO { y = !c; } WHILE (-d);\n"
+            "  FOR (GLOBAL int i = 0; i < 3; i++) x = \"text\";\n  WAIT_UNLESS(e[1]); return;\n}"
+        )
+        for grammar, algorithm in [("basic", "earley"), ("basic", "lalr"), ("coarse", "lalr")]:
+            with self.subTest(grammar=grammar, parser=algorithm):
+                res_meta = parser.parse_to_AST(s, grammar, algorithm, propagate_positions=True)
+                res_tokens = parser.parse_to_AST(s, grammar, algorithm, propagate_positions=False)
+
+                self.assertEqual(res_meta, res_tokens)
+                statements_meta = list(self.iter_statements(res_meta))
+                statements_tokens = list(self.iter_statements(res_tokens))
+                self.assertEqual(len(statements_meta), len(statements_tokens))
+                for statement_meta, statement_tokens in zip(statements_meta, statements_tokens):
+                    self.assertEqual(statement_meta.span, statement_tokens.span)
+
+                # the trees keep their first and last token instead of the positions
+                self.assertTrue(res_tokens.lark_ast.meta.empty)
+                self.assertEqual(res_tokens.lark_ast.first_token, "FSM")
+                self.assertEqual(res_tokens.lark_ast.last_token, "}")
+
+    def test_parser_lean_token_bounds(self):
+        s = "FSM function_name1() { x = 1; }"
+        self.assertIsNot(parser.get_lark_parser("basic", "lalr"), parser.get_lark_parser("basic", "lalr", propagate_positions=False))
+
+        # the lark AST is kept, so it has the positions by default
+        res = parser.parse_to_AST(s, parser="lalr")
+        self.assertFalse(res.lark_ast.meta.empty)
+        self.assertFalse(hasattr(res.lark_ast, "first_token"))
+
+        self.assertTrue(parser.parse_lark_ast(s, "basic", "lalr", propagate_positions=False).meta.empty)
+        self.assertEqual(parser.parse_to_AST(s, parser="lalr", lean=True), res)
+
+
+
+class TestParserProfile(unittest.TestCase):
+
+    def test_parser_profile_earley(self):
+        s = "FSM function_name1() {\n  a = b + c * d;\n  IF (x) { YIELD; }\n}"
+        profile = parser.ParseProfile()
+        res = parser.parse_to_AST(s, profile=profile)
+
+        self.assertEqual(res, parser.parse_to_AST(s))
+        self.assertEqual(list(profile.seconds), ["lex", "parse", "resolve_ambiguity", "build_statements"])
+        self.assertEqual(profile.token_count, 22)
+        self.assertGreater(profile.tree_node_count, profile.statement_count)
+        self.assertEqual(profile.statement_count, 6)
+
+        # `b + c * d` is derived as `(b + c) * d` and `b + (c * d)`
+        self.assertEqual(len(profile.ambiguities), 1)
+        ambiguity = profile.ambiguities[0]
+        self.assertEqual(s[ambiguity.start_pos:ambiguity.end_pos], "b + c * d")
+        self.assertEqual((ambiguity.line, ambiguity.column), (2, 7))
+        self.assertEqual(ambiguity.rule, "expression")
+        self.assertEqual(ambiguity.derivation_count, 2)
+        self.assertEqual(profile.hotspots(), [(ambiguity.alternatives[0], 1)])
+        self.assertIn("_bin_optr", ambiguity.alternatives[0])
+        self.assertIn("'b + c * d'", profile.report(s))
+
+        # the pooled parser builds the lark AST again
+        self.assertIsInstance(parser.parse_lark_ast(s), lark.Tree)
+
+    def test_parser_profile_experimental_template(self):
+        s = "FSM function_name1() { IF (x < y && z > w) { YIELD; } }"
+        profile = parser.ParseProfile()
+        parser.parse_to_AST(s, grammar="experimental", profile=profile)
+
+        # `x < y && z > w` is also a template name, `x<y && z>` followed by `w`
+        hotspots = dict(profile.hotspots())
+        self.assertTrue(any("expression_literal" in rule for rule in hotspots))
+
+    def test_parser_profile_lalr(self):
+        s = "FSM function_name1() { a = b + c * d; GLOBAL int x = 1; }"
+        for grammar in ["basic", "coarse"]:
+            profile = parser.ParseProfile()
+            res = parser.parse_to_AST(s, grammar=grammar, parser="lalr", profile=profile)
+
+            self.assertEqual(res, parser.parse_to_AST(s, parser="lalr"))
+            self.assertEqual(list(profile.seconds), ["lex", "parse", "build_statements"])
+            self.assertEqual(profile.ambiguities, [])
+            self.assertEqual(profile.statement_count, 4)
+        self.assertEqual(profile.token_count, 10) # FSM function_name1 ( ) { CHUNK ; GLOBAL_DECLARATION ; }
+
+    def test_parser_profile_cache(self):
+        s = "FSM function_name1() { a = 1; }"
+        with tempfile.TemporaryDirectory() as temp_dir:
+            parse_cache = cache.ParseResultCache(pathlib.Path(temp_dir))
+            profile_miss, profile_hit = parser.ParseProfile(), parser.ParseProfile()
+            res_miss = parser.parse_to_AST(s, parse_cache=parse_cache, profile=profile_miss)
+            res_hit = parser.parse_to_AST(s, parse_cache=parse_cache, profile=profile_hit)
+
+        self.assertEqual(res_miss, res_hit)
+        self.assertIsNone(res_miss.lark_ast)
+        self.assertIn("parse", profile_miss.seconds)
+        self.assertEqual(list(profile_hit.seconds), ["load_cache"])
+        self.assertEqual(profile_hit.statement_count, profile_miss.statement_count)
+
 
 class TestParserPrettyPrint(unittest.TestCase):
     
@@ -0,0 +1,121 @@
+import sys
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import tempfile
+import unittest
+
+import fsm_compiler.scanner as scanner
+from fsm_compiler.ast_types import *
+
+TRANSLATION_UNIT = """#include <stdio.h>
+// FSM commented() { x = 1; }
+/* FSM block_commented() {
+    x = 1;
+} */
+const char *text = "FSM quoted() { x = 1; }";
+const char brace = '}';
+
+FSM first() {
+    print("} { \\" )");
+    IF (a == '{') { YIELD; }
+}
+
+int ordinary(int a) { return a + 1; }
+
+FSM second() // the body follows a comment
+{
+    WHILE (b) { b--; WAIT(10); }
+}
+"""
+
+class TestScanner(unittest.TestCase):
+    def test_find_fsm_functions(self):
+        functions = list(scanner.find_fsm_functions(TRANSLATION_UNIT))
+
+        self.assertEqual([function.function_name for function in functions], ["first", "second"])
+        self.assertEqual([function.line for function in functions], [9, 16])
+        for function in functions:
+            self.assertEqual(function.code, TRANSLATION_UNIT[function.start_pos:function.end_pos])
+            self.assertTrue(function.code.startswith("FSM {}()".format(function.function_name)))
+            self.assertTrue(function.code.endswith("}"))
+        self.assertTrue(functions[0].code.endswith("YIELD; }\n}"))
+
+    def test_find_fsm_functions_bytes(self):
+        functions = list(scanner.find_fsm_functions(TRANSLATION_UNIT))
+        functions_bytes = list(scanner.find_fsm_functions(TRANSLATION_UNIT.encode("utf-8")))
+        self.assertEqual(functions, functions_bytes)
+
+    def test_find_fsm_functions_invalid(self):
+        s = "FSM unbalanced() { x = (1; }\nFSM no_body() x = 1;\nFSM valid() { x = 1; }"
+        self.assertEqual([function.function_name for function in scanner.find_fsm_functions(s)], ["valid"])
+
+    def test_scan_fsm_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir) / "fsm.cpp"
+            path.write_text(TRANSLATION_UNIT)
+            functions = list(scanner.scan_fsm_file(path))
+            self.assertEqual(functions, list(scanner.find_fsm_functions(TRANSLATION_UNIT)))
+
+            path.write_text("")
+            self.assertEqual(list(scanner.scan_fsm_file(path)), [])
+
+    def test_compile_fsm_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir) / "fsm.cpp"
+            path.write_text(TRANSLATION_UNIT)
+
+            results = scanner.compile_fsm_file(path, parser="lalr")
+            first = next(results)
+            self.assertEqual(first.parse_result.function_name, "first")
+            self.assertEqual(first.fsm.fsm_name, "first")
+
+            second = next(results)
+            self.assertEqual(second.source.line, 16)
+            self.assertEqual(second.fsm.fsm_name, "second")
+            self.assertEqual(len(second.fsm.global_code_block), 1) # the timer of WAIT
+            self.assertIsNone(next(results, None))
+
+class TestIncrementalCompiler(unittest.TestCase):
+    def test_incremental_compile(self):
+        compiler = scanner.IncrementalCompiler(parser="lalr")
+        
+        report = compiler.compile_source(TRANSLATION_UNIT)
+        self.assertEqual(report.rebuilt, ["first", "second"])
+        self.assertEqual(report.reused, [])
+        first, second = report.results
+        
+        # edit the second function, and insert a line before the first function
+        edited = TRANSLATION_UNIT.replace("WAIT(10);", "WAIT(20);").replace("#include <stdio.h>", "#include <stdio.h>\n")
+        report = compiler.compile_source(edited)
+        self.assertEqual(report.reused, ["first"])
+        self.assertEqual(report.rebuilt, ["second"])
+        self.assertEqual(report.removed, [])
+        
+        self.assertIs(report.results[0].fsm, first.fsm)
+        self.assertIs(report.results[0].parse_result, first.parse_result)
+        self.assertEqual(report.results[0].source.line, first.source.line + 1)
+        self.assertIsNot(report.results[1].fsm, second.fsm)
+        
+        report = compiler.compile_source(edited.replace("FSM first()", "FSM renamed()"))
+        self.assertEqual(report.reused, ["second"])
+        self.assertEqual(report.rebuilt, ["renamed"])
+        self.assertEqual(report.removed, ["first"])
+        
+    def test_incremental_compile_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir) / "fsm.cpp"
+            path.write_text(TRANSLATION_UNIT)
+            
+            compiler = scanner.IncrementalCompiler(parser="lalr")
+            self.assertEqual(compiler.compile_file(path).rebuilt, ["first", "second"])
+            self.assertEqual(compiler.compile_file(path).reused, ["first", "second"])
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.CRITICAL)
+    # logging.basicConfig(level=logging.WARNING)
+    unittest.main()
@@ -0,0 +1,159 @@
+import sys
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import io
+import argparse
+import socket
+import tempfile
+import unittest
+import threading
+import contextlib
+
+import fsm_compiler.server as server
+import fsm_compiler.__main__ as cli
+from fsm_compiler.client import CompileClient, CompileServerError
+
+SOURCE = """#include "fsm.h"
+
+FSM first() {
+    IF (a == 0) { x++; }
+    WAIT(10);
+}
+
+int ordinary(int a) { return a + 1; }
+
+FSM second() {
+    WHILE (b) { b--; YIELD; }
+}
+"""
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix domain sockets are not available")
+class TestCompileServer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path = pathlib.Path(self.directory.name) / "server.sock"
+        self.server = server.CompileServer(self.socket_path, memo_size=2)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.directory.cleanup()
+
+    def test_compile(self):
+        with CompileClient(self.socket_path) as client:
+            functions = client.compile(SOURCE, outputs=["cpp", "mermaid"], parser="lalr")
+
+        self.assertEqual([function["function_name"] for function in functions], ["first", "second"])
+        self.assertEqual([function["line"] for function in functions], [3, 10])
+        self.assertIn("void first() {", functions[0]["outputs"]["cpp"])
+        self.assertIn("__IS_TIME_PASSED(first, 10)", functions[0]["outputs"]["cpp"])
+        self.assertIn("flowchart", functions[1]["outputs"]["mermaid"])
+
+    def test_compile_memoized(self):
+        with CompileClient(self.socket_path) as client:
+            functions = client.compile(SOURCE)
+            self.assertEqual(client.compile(SOURCE), functions)
+            self.assertEqual(client.stats()["compiled"], 2)
+            self.assertEqual(client.stats()["memoized"], 2)
+
+            # the edited function is compiled again, the memo keeps the recently used functions only
+            edited = client.compile(SOURCE.replace("WAIT(10)", "WAIT(20)"))
+            self.assertEqual(edited[1], functions[1])
+            self.assertIn("__IS_TIME_PASSED(first, 20)", edited[0]["outputs"]["cpp"])
+            stats = client.stats()
+            self.assertEqual(stats["compiled"], 3)
+            self.assertEqual(stats["memo_size"], 2)
+
+            # the other optimization levels are compiled separately
+            client.compile(SOURCE, optimization_level=0)
+            self.assertEqual(client.stats()["compiled"], 5)
+
+    def test_compile_error(self):
+        with CompileClient(self.socket_path) as client:
+            with self.assertRaises(CompileServerError):
+                client.compile("FSM invalid() { IF }")
+            with self.assertRaises(CompileServerError):
+                client.compile(SOURCE, outputs=["html"])
+            with self.assertRaises(CompileServerError):
+                client.request({"command": "unknown"})
+
+            # the connection is usable after the errors
+            self.assertEqual(len(client.compile(SOURCE)), 2)
+            self.assertEqual(client.stats()["errors"], 3)
+
+    def test_concurrent_clients(self):
+        def compile(_) -> list[dict]:
+            with CompileClient(self.socket_path) as client:
+                return client.compile(SOURCE, parser="lalr")
+
+        results = [None] * 8
+        threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, compile(i))) for i in range(len(results))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for functions in results:
+            self.assertEqual([function["function_name"] for function in functions], ["first", "second"])
+
+    def test_cli(self):
+        source_path = pathlib.Path(self.directory.name) / "fsm.cpp"
+        source_path.write_text(SOURCE)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(cli.main(["compile", "--server", str(self.socket_path), str(source_path)]), 0)
+        self.assertIn("void first() {", output.getvalue())
+        self.assertIn("void second() {", output.getvalue())
+
+        output_local = io.StringIO()
+        with contextlib.redirect_stdout(output_local):
+            self.assertEqual(cli.main(["compile", "--parser", "lalr", str(source_path)]), 0)
+        self.assertEqual(output_local.getvalue().count("void first() {"), 1)
+
+    def test_cli_parsers(self):
+        self.assertEqual(cli.grammar_parser_pair("coarse:lalr"), ("coarse", "lalr"))
+        for pair in ["basic", "basic:lalr:earley", "basic:cyk", "coarse:earley", "unknown:lalr"]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                cli.grammar_parser_pair(pair)
+
+        # argparse prints the error and exits, before the server is started
+        with contextlib.redirect_stderr(io.StringIO()) as error, self.assertRaises(SystemExit):
+            cli.main(["serve", str(self.socket_path) + ".unused", "--parsers", "basic"])
+        self.assertIn("expecting grammar:parser", error.getvalue())
+
+    def test_cli_errors(self):
+        source_path = pathlib.Path(self.directory.name) / "fsm.cpp"
+        source_path.write_text("FSM f() { x = ; }")
+
+        # the unparsable file is reported, locally and on the server
+        for arguments in [[], ["--server", str(self.socket_path)]]:
+            with contextlib.redirect_stderr(io.StringIO()) as error:
+                self.assertEqual(cli.main(["compile", *arguments, str(source_path)]), 1)
+            self.assertIn("Unexpected token", error.getvalue())
+
+        for arguments, message in [
+            (["--grammar", "nope"], "unknown grammar and parser nope:earley"),
+            (["--grammar", "coarse"], "unknown grammar and parser coarse:earley"),
+            (["--parser", "cyk"], "invalid choice: 'cyk'"),
+        ]:
+            with contextlib.redirect_stderr(io.StringIO()) as error, self.assertRaises(SystemExit):
+                cli.main(["compile", *arguments, str(source_path)])
+            self.assertIn(message, error.getvalue())
+
+    def test_shutdown(self):
+        with CompileClient(self.socket_path) as client:
+            client.shutdown()
+        self.thread.join(timeout=10)
+        self.assertFalse(self.thread.is_alive())
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.CRITICAL)
+    # logging.basicConfig(level=logging.WARNING)
+    unittest.main()
@@ -0,0 +1,158 @@
+import sys
+import pathlib
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute()))
+
+import logging
+logger = logging.getLogger(__name__)
+
+import threading
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+import fsm_compiler.parser as parser
+import fsm_compiler.assembler as assembler
+from fsm_compiler.ast_types import *
+
+import test_parser
+
+NESTING_DEPTH = 10000
+OPTIMIZED_NESTING_DEPTH = 200
+THREAD_COUNT = 16
+PARSERS = [("basic", "earley"), ("basic", "lalr"), ("coarse", "lalr")]
+
+def parser_test_programs() -> list[str]:
+    """the FSM functions parsed by the tests of `test_parser.TestParserBasic`, in their order"""
+    programs = []
+
+    class ProgramRecorder(test_parser.TestParserBasic):
+        def parse(self, s:str) -> ParseResult:
+            programs.append(s)
+            return parser.parse_to_AST(s)
+
+    unittest.TestLoader().loadTestsFromTestCase(ProgramRecorder).run(unittest.TestResult())
+    return list(dict.fromkeys(programs))
+
+def generate_nested_fsm_function(depth:int) -> str:
+    """FSM function with `depth` levels of nested IF, WHILE, FOR and DO WHILE statements"""
+    openings = [
+        "IF (a < {0}) {{ GLOBAL int g{0};",
+        "WHILE (b < {0}) {{ x += {0};",
+        "FOR (int i{0} = 0; i{0} < n; ++i{0}) {{ x += {0};",
+        "DO {{ x += {0};",
+    ]
+    lines = [openings[level % 4].format(level) for level in range(depth)]
+    lines.append("YIELD; BREAK;")
+    lines += ["} WHILE (c);" if level % 4 == 3 else "}" for level in reversed(range(depth))]
+    return "FSM deep() {\n" + "\n".join(lines) + "\n}\n"
+
+def generate_nested_statements(depth:int) -> ParseResult:
+    """AST of `depth` levels of nested WHILE statements, built without the parser"""
+    statements = StatementBlock(None, [StatementBreak(None)])
+    for level in range(depth):
+        statements = StatementBlock(None, [
+            StatementLine(None, "x += {}".format(level)),
+            StatementWhile(None, "b < {}".format(level), statements)
+        ])
+    return ParseResult(None, "deep", statements)
+
+def iter_spans(statement:Statement):
+    """spans of the statement and all its nested statements"""
+    stack = [statement]
+    while stack:
+        statement = stack.pop()
+        yield statement.span
+        stack.extend(statement.sub_statements())
+
+class TestStressNesting(unittest.TestCase):
+    def test_deep_nesting(self):
+        s = generate_nested_fsm_function(NESTING_DEPTH)
+        res = parser.parse_to_AST(s, parser="lalr", lean=True)
+
+        # walk down the nesting without recursion
+        depth = 0
+        statement = res.statements.lines[0]
+        while not isinstance(statement, StatementWait):
+            depth += 1
+            if isinstance(statement, StatementIf):
+                statement = statement.cases[0].statements.lines[1]
+            else:
+                statement = statement.statements.lines[1]
+        self.assertEqual(depth, NESTING_DEPTH)
+
+        fsm = assembler.generate_FSM_from_AST(res, optimization_level=0)
+        self.assertEqual(fsm.global_variables[0], FSMGlobalVar("int", "g0"))
+        self.assertEqual(fsm.global_variables[-1], FSMGlobalVar("int", "g{}".format(NESTING_DEPTH - 4)))
+        self.assertEqual(len(fsm.global_variables), NESTING_DEPTH // 4)
+        self.assertIsNotNone(assembler.get_ending_node_of_FSM(fsm.starting_node))
+
+    def test_deep_nesting_lowering(self):
+        # lowered without recursion, each level (a line and a WHILE) adds 4 nodes and 5 transitions
+        fsm_return = generate_nested_statements(NESTING_DEPTH).to_fsm()
+        nodes = assembler.traverse_FSM(fsm_return.starting_node)
+        self.assertEqual(len(nodes), 4 * NESTING_DEPTH + 4)
+        self.assertEqual(sum(len(node.transitions) for node in nodes), 5 * NESTING_DEPTH + 4)
+        self.assertIs(assembler.get_ending_node_of_FSM(fsm_return.starting_node), fsm_return.ending_node)
+
+    def test_deep_nesting_optimized(self):
+        # The optimizations restart their search after every change of the FSM, so their cost is superlinear 
+        # in the nesting depth (about 6 s at depth 1000), the deep nesting is only covered up to level 0. 
+        # The default optimization level is covered at a small depth.
+        res = parser.parse_to_AST(generate_nested_fsm_function(OPTIMIZED_NESTING_DEPTH), parser="lalr", lean=True)
+        raw_nodes = assembler.traverse_FSM(assembler.convert_to_raw_state_machine(res).starting_node)
+
+        fsm = assembler.generate_FSM_from_AST(res)
+        nodes = assembler.traverse_FSM(fsm.starting_node)
+        self.assertLess(len(nodes), len(raw_nodes))
+        self.assertEqual(len(fsm.global_variables), OPTIMIZED_NESTING_DEPTH // 4)
+        self.assertIsNotNone(assembler.get_ending_node_of_FSM(fsm.starting_node))
+
+class TestStressThreads(unittest.TestCase):
+    def test_concurrent_parse(self):
+        programs = parser_test_programs()
+        self.assertGreater(len(programs), 10)
+        jobs = [(s, grammar, algorithm) for s in programs for grammar, algorithm in PARSERS]
+        expected = {job: parser.parse_to_AST(*job, lean=True) for job in jobs}
+        barrier = threading.Barrier(THREAD_COUNT)
+
+        def parse_corpus(thread_index:int) -> list[tuple[tuple, ParseResult]]:
+            barrier.wait()
+            # the threads start at different jobs, so different grammars are parsed at the same time
+            shifted = jobs[thread_index:] + jobs[:thread_index]
+            return [(job, parser.parse_to_AST(*job, lean=True)) for job in shifted]
+
+        with ThreadPoolExecutor(THREAD_COUNT) as executor:
+            results = list(executor.map(parse_corpus, range(THREAD_COUNT)))
+
+        for thread_results in results:
+            self.assertEqual(len(thread_results), len(jobs))
+            for job, res in thread_results:
+                self.assertEqual(res, expected[job])
+                self.assertEqual(list(iter_spans(res)), list(iter_spans(expected[job])))
+
+    def test_parser_pool_checkout(self):
+        pool = parser.LarkParserPool()
+        barrier = threading.Barrier(THREAD_COUNT)
+
+        def checkout(_) -> int:
+            with pool.checkout("basic", "lalr") as lark_parser:
+                barrier.wait() # every thread holds a parser at the same time
+                return id(lark_parser)
+
+        with ThreadPoolExecutor(THREAD_COUNT) as executor:
+            parser_ids = list(executor.map(checkout, range(THREAD_COUNT)))
+
+        self.assertEqual(len(set(parser_ids)), THREAD_COUNT)
+        self.assertNotIn(id(parser.get_lark_parser("basic", "lalr")), parser_ids)
+        self.assertEqual(pool.created, THREAD_COUNT)
+        self.assertEqual(pool.idle_count(), THREAD_COUNT)
+
+        # the returned parsers are reused
+        with pool.checkout("basic", "lalr") as lark_parser:
+            self.assertIn(id(lark_parser), parser_ids)
+        self.assertEqual(pool.created, THREAD_COUNT)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.CRITICAL)
+    # logging.basicConfig(level=logging.WARNING)
+    unittest.main()